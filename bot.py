@@ -1,6 +1,7 @@
 """Точка входа — запуск бота."""
 import asyncio
 import logging
+import time
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
@@ -8,13 +9,29 @@ from aiogram.enums import ParseMode
 from aiogram.types import BotCommand
 
 from config import config
-from database import Database
+from database import Database, collect_pool_metrics, check_database_ready
 from handlers import client, support, admin
-from handlers.command import statistik, referals
+from handlers.command import statistik, referals, search
 from middlewares.menu_middleware import MenuMiddleware
+from middlewares.query_budget_middleware import QueryScopeMiddleware, HandlerNameMiddleware
+from middlewares.metrics_middleware import (
+    UpdateMetricsMiddleware,
+    HandlerMetricsMiddleware,
+    ApiMetricsMiddleware,
+)
 
 from services.auto_escalation import escalation_watcher
 from services.reminders import reminder_worker
+from services.menu import keyboard_migration_worker
+from services.crm import crm_outbox_worker, close_http_session, collect_outbox_metrics
+from services.partitions import partition_worker
+from services.warmup import warm_up
+from services.metrics import (
+    start_metrics_server,
+    register_collector,
+    register_readiness_check,
+    set_ready,
+)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -23,29 +40,75 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def build_dispatcher() -> Dispatcher:
+    """Диспетчер со всеми роутерами и middleware (используется и бенчмарками)."""
+    dp = Dispatcher()
+
+    if config.metrics_enabled:
+        dp.update.outer_middleware(UpdateMetricsMiddleware())
+        dp.message.middleware(HandlerMetricsMiddleware("message"))
+        dp.callback_query.middleware(HandlerMetricsMiddleware("callback_query"))
+
+    dp.include_router(statistik.router)
+    dp.include_router(referals.router)
+    dp.include_router(search.router)
+    dp.include_router(admin.router)   # admin первым — broadcast, set_role
+    dp.include_router(support.router)  # support group
+    dp.include_router(client.router)   # клиенты
+
+    dp.message.middleware(MenuMiddleware())
+
+    if config.db_instrumentation_enabled:
+        dp.update.outer_middleware(QueryScopeMiddleware())
+        dp.message.middleware(HandlerNameMiddleware())
+        dp.callback_query.middleware(HandlerNameMiddleware())
+    return dp
+
+
 async def main():
     """Запуск бота."""
     if not config.bot_token:
         logger.error("BOT_TOKEN не задан. Создайте .env файл.")
         return
 
+    boot_started = time.perf_counter()
     await Database.connect()
+    logger.info("БД подключена, миграции применены за %.0f мс", (time.perf_counter() - boot_started) * 1000)
     bot = Bot(
         token=config.bot_token,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
-    dp = Dispatcher()
+    dp = build_dispatcher()
 
-    dp.include_router(statistik.router)
-    dp.include_router(referals.router)
-    dp.include_router(admin.router)   # admin первым — broadcast, set_role
-    dp.include_router(support.router)  # support group
-    dp.include_router(client.router)   # клиенты
+    metrics_runner = None
+    if config.metrics_enabled:
+        bot.session.middleware(ApiMetricsMiddleware())
+        register_collector(collect_pool_metrics)
+        register_collector(collect_outbox_metrics)
+        register_readiness_check("database", check_database_ready)
+        metrics_runner = await start_metrics_server(config.metrics_host, config.metrics_port)
 
-    dp.message.middleware(MenuMiddleware())
+        async def mark_ready():
+            set_ready(True)
+
+        async def mark_not_ready():
+            set_ready(False)
+
+        dp.startup.register(mark_ready)
+        dp.shutdown.register(mark_not_ready)
+
+    # До конца прогрева /readyz отвечает 503, воркеры и поллинг не запущены
+    await warm_up(bot)
 
-    asyncio.create_task(escalation_watcher(bot))
-    asyncio.create_task(reminder_worker(bot))
+    # Синглтон-воркеры работают только на реплике-лидере
+    asyncio.create_task(Database.run_as_leader("escalation_watcher", lambda: escalation_watcher(bot)))
+    asyncio.create_task(Database.run_as_leader("reminder_worker", lambda: reminder_worker(bot)))
+    asyncio.create_task(Database.run_as_leader("crm_outbox", crm_outbox_worker))
+    asyncio.create_task(Database.run_as_leader("partitions", partition_worker))
+    if config.keyboard_migration_enabled:
+        asyncio.create_task(
+            Database.run_as_leader("keyboard_migration", lambda: keyboard_migration_worker(bot))
+        )
 
     # Команды бота (видны при вводе / в поле сообщения)
     await bot.set_my_commands([
@@ -54,11 +117,14 @@ async def main():
     ])
 
 
-    logger.info("Бот запущен")
+    logger.info("Бот запущен за %.0f мс", (time.perf_counter() - boot_started) * 1000)
     try:
         await dp.start_polling(bot)
     finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
         await Database.disconnect()
+        await close_http_session()
         await bot.session.close()
 
 
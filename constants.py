@@ -24,6 +24,10 @@ class LeadStatus(str, Enum):
     NEW_LEAD = "NEW_LEAD"
 
 
+# tickets.ticket_id — SERIAL (int4): номер больше не существует, а asyncpg отказывается его передать
+MAX_TICKET_ID = 2**31 - 1
+
+
 # Тексты онбординга
 ONBOARDING_QUESTIONS = [
     "Укажите ссылку на ваш YouTube-канал",
@@ -57,9 +61,11 @@ MSG_TICKET_RECEIVED = """Мы получили ваше обращение ✅
 MSG_OFFLINE = """Мы сейчас оффлайн.
 Сообщение получено — ответим после 10:00 МСК."""
 
+MSG_KEYBOARD_UPDATED = "Меню бота обновлено 👇"
+
 MSG_REPLY_PROMPT = (
-    "Режим ответа клиенту включён. Пишите сообщения в эту тему — они уйдут клиенту в бота. "
-    "Чтобы выйти из режима, нажмите любую другую кнопку (История, Статус и т.д.)."
+    "Пишите ответ в эту тему — каждое сообщение уйдёт клиенту в бота. "
+    "Команды (начинаются с /) клиенту не отправляются."
 )
 
 
@@ -89,6 +95,11 @@ ADMIN_COMMANDS_HELP = """
 
 /statistik - Статистика.
 /stats 01.02.2026 10.02.2026 — Статистика за период
+/profile [секунды] — Профилировать бота N секунд (по умолчанию 10), файл collapsed stacks.
+/tasks — Дамп asyncio-задач со стеками, состояние пула БД и очередей.
+/ref_stats [top N | id &lt;tg_id&gt; | @username] — Реферальная статистика: топ-N ссылок или ссылки владельца.
+/search &lt;запрос&gt; — Поиск по сообщениям тикетов, от самых релевантных.
+/online, /offline — Получать новые тикеты автоматически (AUTO_ASSIGN_ENABLED) / перестать.
 
 /cancel — Отменить текущую рассылку (если вы в процессе /broadcast).
 """
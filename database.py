@@ -1,37 +1,226 @@
 """Подключение к PostgreSQL и работа с БД."""
+import asyncio
+import contextlib
+import logging
 import asyncpg
-from typing import Optional
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timezone
+from typing import Awaitable, Callable, Optional
 
 from config import config
+from services.db.instrumentation import InstrumentedPool
+from services.db.queries import CatalogConnection, init_connection
+from services.db.records import MESSAGE_COLUMNS
+from services.metrics import DB_POOL_SIZE, DB_POOL_IDLE, DB_POOL_MAX, DB_REPLICA_LAG
+
+logger = logging.getLogger(__name__)
+
+# Пулы по характеру нагрузки: длинный запрос статистики или проход воркера
+# не занимает соединения, которые ждут обработчики апдейтов
+INTERACTIVE_POOL = "interactive"
+BACKGROUND_POOL = "background"
+ANALYTICS_POOL = "analytics"
+POOL_NAMES = (INTERACTIVE_POOL, BACKGROUND_POOL, ANALYTICS_POOL)
+# Чтения, которым допустима ограниченная задержка: read-реплика, если она
+# настроена и не отстаёт, иначе ANALYTICS_POOL на primary
+REPLICA_POOL = "replica"
+
+# Отставание реплики в секундах; 0, если WAL применён полностью или сервер не реплика
+_REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
 
 
 class Database:
-    """Пул подключений к PostgreSQL."""
+    """Пулы подключений к PostgreSQL."""
 
+    # Пул обработчиков апдейтов; get_pool() без имени
     pool: Optional[asyncpg.Pool] = None
+    pools: dict[str, asyncpg.Pool] = {}
+    # Последнее измеренное отставание реплики; None — реплика недоступна
+    replica_lag: Optional[float] = None
+    _replica_task: Optional[asyncio.Task] = None
+    # Воркеры, которыми сейчас руководит эта реплика: {name: True}
+    leadership: dict[str, bool] = {}
 
     @classmethod
     async def connect(cls) -> None:
-        """Создать пул подключений."""
-        cls.pool = await asyncpg.create_pool(
-            config.database_url,
-            min_size=2,
-            max_size=10,
-            command_timeout=60,
-        )
+        """Применить миграции и создать пулы подключений (размеры и таймауты — из Config)."""
+        # Миграции — до пула: запросы каталога готовятся уже по итоговой схеме
         await cls._init_tables()
+        for name in POOL_NAMES:
+            statement_timeout_ms = getattr(config, f"db_{name}_statement_timeout_ms")
+            pool = await cls.create_pool(
+                config.database_url,
+                min_size=getattr(config, f"db_{name}_pool_min"),
+                max_size=getattr(config, f"db_{name}_pool_max"),
+                statement_timeout_ms=statement_timeout_ms,
+            )
+            cls.pools[name] = InstrumentedPool(
+                pool,
+                name,
+                acquire_timeout=getattr(config, f"db_{name}_acquire_timeout"),
+                count_queries=config.db_instrumentation_enabled,
+            )
+        cls.pool = cls.pools[INTERACTIVE_POOL]
+        if config.database_replica_url:
+            await cls._check_replica()
+            if cls.replica_lag is None:
+                logger.warning("Реплика недоступна при запуске, чтения идут на primary")
+            cls._replica_task = asyncio.create_task(cls._watch_replica())
+
+    @classmethod
+    async def _check_replica(cls) -> None:
+        """Подключиться к реплике (если ещё нет) и измерить отставание."""
+        try:
+            pool = cls.pools.get(REPLICA_POOL)
+            if pool is None:
+                pool = await cls.create_pool(
+                    config.database_replica_url,
+                    min_size=config.db_analytics_pool_min,
+                    max_size=config.db_analytics_pool_max,
+                    statement_timeout_ms=config.db_analytics_statement_timeout_ms,
+                )
+                cls.pools[REPLICA_POOL] = InstrumentedPool(
+                    pool,
+                    REPLICA_POOL,
+                    acquire_timeout=config.db_analytics_acquire_timeout,
+                    count_queries=config.db_instrumentation_enabled,
+                )
+            lag = await asyncio.wait_for(
+                cls.pools[REPLICA_POOL].fetchval(_REPLICA_LAG_SQL),
+                timeout=config.db_replica_check_seconds,
+            )
+            cls.replica_lag = float(lag)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if cls.replica_lag is not None:
+                logger.warning("Реплика недоступна, чтения идут на primary: %s", e)
+            cls.replica_lag = None
+        DB_REPLICA_LAG.set(cls.replica_lag if cls.replica_lag is not None else -1)
+
+    @classmethod
+    async def _watch_replica(cls) -> None:
+        while True:
+            await asyncio.sleep(config.db_replica_check_seconds)
+            await cls._check_replica()
+
+    @classmethod
+    def replica_available(cls) -> bool:
+        """Реплика подключена и отстаёт не больше DB_REPLICA_MAX_LAG_SECONDS."""
+        return (
+            REPLICA_POOL in cls.pools
+            and cls.replica_lag is not None
+            and cls.replica_lag <= config.db_replica_max_lag_seconds
+        )
+
+    @staticmethod
+    async def create_pool(
+        dsn: str,
+        *,
+        min_size: int,
+        max_size: int,
+        statement_timeout_ms: int | None = None,
+    ) -> asyncpg.Pool:
+        """Пул, на каждом соединении которого подготовлен каталог запросов (services/db/queries.py)."""
+        server_settings = {}
+        command_timeout = 60
+        if statement_timeout_ms:
+            # Сервер отменяет запрос сам; клиентский таймаут — страховка чуть позже
+            server_settings["statement_timeout"] = str(statement_timeout_ms)
+            command_timeout = statement_timeout_ms / 1000 + 5
+        return await asyncpg.create_pool(
+            dsn,
+            min_size=min_size,
+            max_size=max_size,
+            command_timeout=command_timeout,
+            server_settings=server_settings,
+            connection_class=CatalogConnection,
+            init=init_connection,
+        )
 
     @classmethod
     async def disconnect(cls) -> None:
-        """Закрыть пул."""
-        if cls.pool:
-            await cls.pool.close()
-            cls.pool = None
+        """Закрыть пулы."""
+        if cls._replica_task is not None:
+            cls._replica_task.cancel()
+            cls._replica_task = None
+        for pool in cls.pools.values():
+            await pool.close()
+        cls.pools.clear()
+        cls.pool = None
+        cls.replica_lag = None
+
+    @classmethod
+    async def run_as_leader(
+        cls,
+        name: str,
+        worker_factory: Callable[[], Awaitable[None]],
+    ) -> None:
+        """
+        Запускать синглтон-воркер только на одной реплике.
+
+        Лидерство — session-level advisory lock на отдельном соединении (не из пула).
+        Пока соединение живо, лок держится; heartbeat проверяет соединение, и при его
+        потере воркер останавливается. Остальные реплики периодически пытаются
+        взять лок и подхватывают работу, когда лидер пропадает.
+        """
+        lock_key = f"greenlight:{name}"
+        while True:
+            conn = None
+            task = None
+            try:
+                conn = await asyncpg.connect(config.database_url)
+                while not await conn.fetchval(
+                    "SELECT pg_try_advisory_lock(hashtext($1))", lock_key
+                ):
+                    await asyncio.sleep(config.leader_retry_seconds)
+
+                cls.leadership[name] = True
+                logger.info("Реплика стала лидером для %s", name)
+                task = asyncio.create_task(worker_factory())
+
+                while not task.done():
+                    await asyncio.wait({task}, timeout=config.leader_heartbeat_seconds)
+                    if task.done():
+                        break
+                    await asyncio.wait_for(
+                        conn.fetchval("SELECT 1"),
+                        timeout=config.leader_heartbeat_seconds,
+                    )
+
+                # Воркер завершился сам — пробрасываем его ошибку в лог
+                task.result()
+                logger.warning("Воркер %s завершился, освобождаем лидерство", name)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Лидерство %s потеряно: %s", name, e)
+            finally:
+                cls.leadership.pop(name, None)
+                if task and not task.done():
+                    task.cancel()
+                    # Воркер должен остановиться до снятия лока — иначе его подхватит
+                    # другая реплика, пока этот ещё работает
+                    with contextlib.suppress(asyncio.CancelledError, Exception):
+                        await task
+                if conn is not None:
+                    try:
+                        await conn.close(timeout=5)
+                    except Exception:
+                        conn.terminate()
+
+            await asyncio.sleep(config.leader_retry_seconds)
 
     @classmethod
     async def _init_tables(cls) -> None:
         """Создание таблиц при старте."""
-        async with cls.pool.acquire() as conn:
+        async with _direct_connection(config.database_url) as conn:
             await conn.execute("""
                 CREATE TABLE IF NOT EXISTS users (
                     tg_id BIGINT PRIMARY KEY,
@@ -61,7 +250,7 @@ class Database:
                     client_user_id BIGINT NOT NULL REFERENCES users(tg_id),
                     status TEXT NOT NULL DEFAULT 'OPEN',
                     assigned_to_support_id BIGINT,
-                    created_at TIMESTAMPTZ DEFAULT NOW(),
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
                     taken_at TIMESTAMPTZ,
                     first_reply_at TIMESTAMPTZ,
                     closed_at TIMESTAMPTZ,
@@ -99,17 +288,30 @@ class Database:
                 """)
             except Exception:
                 pass
+            # messages секционирована по месяцам created_at
+            await _partition_messages(conn)
+            await _index_messages(conn)
+            await _create_working_seconds_function(conn)
+            # Постраничные списки /tickets и /my_tickets: ключ (created_at, ticket_id).
+            # Строка с NULL created_at выпала бы из keyset-страниц — колонка NOT NULL,
+            # старые строки получают самую раннюю известную отметку тикета
+            if await conn.fetchval("""
+                SELECT is_nullable = 'YES' FROM information_schema.columns
+                WHERE table_name = 'tickets' AND column_name = 'created_at'
+            """):
+                await conn.execute("""
+                    UPDATE tickets
+                    SET created_at = COALESCE(LEAST(taken_at, first_reply_at, closed_at), 'epoch')
+                    WHERE created_at IS NULL
+                """)
+                await conn.execute("ALTER TABLE tickets ALTER COLUMN created_at SET NOT NULL")
             await conn.execute("""
-                CREATE TABLE IF NOT EXISTS messages (
-                    message_id SERIAL PRIMARY KEY,
-                    ticket_id INTEGER REFERENCES tickets(ticket_id) ON DELETE CASCADE,
-                    direction TEXT NOT NULL,
-                    author_user_id BIGINT,
-                    text TEXT,
-                    media_type TEXT,
-                    media_file_id TEXT,
-                    created_at TIMESTAMPTZ DEFAULT NOW()
-                )
+                CREATE INDEX IF NOT EXISTS tickets_status_created_idx
+                ON tickets (status, created_at, ticket_id)
+            """)
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS tickets_support_status_created_idx
+                ON tickets (assigned_to_support_id, status, created_at, ticket_id)
             """)
             await conn.execute("""
                            CREATE TABLE IF NOT EXISTS referrals (
@@ -130,6 +332,91 @@ class Database:
                                converted BOOLEAN DEFAULT FALSE                  -- стал ли посетитель клиентом
                            )
                        """)
+            # Реферальный код выводится из referral_id без коллизий: id умножается
+            # на взаимно простое с 62^8 число по модулю 62^8 (биекция) и кодируется в base62.
+            await conn.execute("""
+                CREATE OR REPLACE FUNCTION referral_code(n BIGINT) RETURNS TEXT
+                LANGUAGE plpgsql IMMUTABLE AS $$
+                DECLARE
+                    alphabet CONSTANT TEXT :=
+                        '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz';
+                    x NUMERIC := (n::numeric * 2654435761) % 218340105584896;  -- 62^8
+                    code TEXT := '';
+                BEGIN
+                    FOR i IN 1..8 LOOP
+                        code := substr(alphabet, (x % 62)::int + 1, 1) || code;
+                        x := div(x, 62);
+                    END LOOP;
+                    RETURN code;
+                END
+                $$
+            """)
+            await _ensure_referral_owner_unique(conn)
+            # Агрегаты по реферальным ссылкам обновляются при каждом переходе,
+            # referral_visitors — множество уникальных посетителей ссылки
+            stats_existed = await conn.fetchval("SELECT to_regclass('referral_stats') IS NOT NULL")
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS referral_visitors (
+                    referral_id INT NOT NULL REFERENCES referrals(referral_id) ON DELETE CASCADE,
+                    visitor_client_id BIGINT NOT NULL,
+                    converted BOOLEAN NOT NULL DEFAULT FALSE,
+                    paid BOOLEAN NOT NULL DEFAULT FALSE,
+                    first_visit_at TIMESTAMPTZ DEFAULT NOW(),
+                    PRIMARY KEY (referral_id, visitor_client_id)
+                )
+            """)
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS referral_visitors_visitor_idx
+                ON referral_visitors (visitor_client_id)
+            """)
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS referral_stats (
+                    referral_id INT PRIMARY KEY REFERENCES referrals(referral_id) ON DELETE CASCADE,
+                    owner_client_id BIGINT NOT NULL,
+                    visits BIGINT NOT NULL DEFAULT 0,
+                    unique_visitors BIGINT NOT NULL DEFAULT 0,
+                    conversions BIGINT NOT NULL DEFAULT 0,
+                    paid_conversions BIGINT NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMPTZ DEFAULT NOW()
+                )
+            """)
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS referral_stats_top_idx
+                ON referral_stats (conversions DESC, visits DESC)
+            """)
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS referral_stats_owner_idx
+                ON referral_stats (owner_client_id)
+            """)
+            if not stats_existed:
+                # Однократно пересчитываем агрегаты из накопленной истории переходов
+                await conn.execute("""
+                    INSERT INTO referral_visitors (referral_id, visitor_client_id, converted, paid, first_visit_at)
+                    SELECT ru.referral_id,
+                           ru.visitor_client_id,
+                           bool_or(ru.converted),
+                           COALESCE(bool_or(u.is_paid), FALSE),
+                           MIN(ru.visited_at)
+                    FROM referral_usage ru
+                    LEFT JOIN users u ON u.tg_id = ru.visitor_client_id
+                    WHERE ru.visitor_client_id IS NOT NULL
+                    GROUP BY ru.referral_id, ru.visitor_client_id
+                    ON CONFLICT DO NOTHING
+                """)
+                await conn.execute("""
+                    INSERT INTO referral_stats
+                        (referral_id, owner_client_id, visits, unique_visitors, conversions, paid_conversions)
+                    SELECT r.referral_id,
+                           r.owner_client_id,
+                           (SELECT COUNT(*) FROM referral_usage ru WHERE ru.referral_id = r.referral_id),
+                           COUNT(v.visitor_client_id),
+                           COUNT(*) FILTER (WHERE v.converted),
+                           COUNT(*) FILTER (WHERE v.paid)
+                    FROM referrals r
+                    JOIN referral_visitors v ON v.referral_id = r.referral_id
+                    GROUP BY r.referral_id, r.owner_client_id
+                    ON CONFLICT DO NOTHING
+                """)
             await conn.execute("""
                 CREATE TABLE IF NOT EXISTS onboarding_state (
                     tg_id BIGINT PRIMARY KEY REFERENCES users(tg_id),
@@ -142,11 +429,378 @@ class Database:
                             ALTER TABLE users
                             ADD COLUMN IF NOT EXISTS keyboard_version INT DEFAULT 0;
                         """)
+            # Саппорт в сети (/online) — кандидат для автоназначения; NULL — не в сети
+            await conn.execute(
+                "ALTER TABLE users ADD COLUMN IF NOT EXISTS online_since TIMESTAMPTZ"
+            )
+            # Outbox событий для CRM: пишется в одной транзакции с лидом/оплатой,
+            # доставляется фоновым воркером (services/crm.py)
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS crm_outbox (
+                    event_id BIGSERIAL PRIMARY KEY,
+                    sink TEXT NOT NULL,                 -- webhook | sheets
+                    event_type TEXT NOT NULL,           -- lead | client
+                    payload JSONB NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at TIMESTAMPTZ DEFAULT NOW(),  -- NULL: попытки исчерпаны
+                    last_error TEXT,
+                    created_at TIMESTAMPTZ DEFAULT NOW(),
+                    delivered_at TIMESTAMPTZ
+                )
+            """)
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS crm_outbox_due_idx
+                ON crm_outbox (sink, next_attempt_at)
+                WHERE delivered_at IS NULL
+            """)
+            # Запросы /search для кнопки «Дальше»: текст в callback_data не помещается,
+            # а храниться он должен и после перезапуска бота
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS searches (
+                    search_id BIGSERIAL PRIMARY KEY,
+                    query TEXT NOT NULL,
+                    max_message_id INTEGER,             -- снимок: страницы не сдвигаются новыми сообщениями
+                    created_at TIMESTAMPTZ DEFAULT NOW()
+                )
+            """)
+
+
+
+# Колонки messages кроме message_id; первичный ключ включает ключ секционирования
+_MESSAGES_DDL = """
+    ticket_id INTEGER REFERENCES tickets(ticket_id) ON DELETE CASCADE,
+    direction TEXT NOT NULL,
+    author_user_id BIGINT,
+    text TEXT,
+    media_type TEXT,
+    media_file_id TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (message_id, created_at)
+"""
+
+
+# Документ полнотекстового поиска по messages.text: русская морфология плюс simple
+# для ников, кодов и латиницы. Запросы должны использовать это же выражение — по нему GIN-индекс
+MESSAGES_TSVECTOR = (
+    "(to_tsvector('russian', coalesce(text, '')) || to_tsvector('simple', coalesce(text, '')))"
+)
+
+
+async def _ensure_referral_owner_unique(conn) -> None:
+    """
+    Одна ссылка на владельца: на referrals_owner_uniq опирается upsert в
+    services/db/referals.py. Однократная миграция — пока индекса нет, лишние ссылки
+    без переходов (гонка при создании до индекса) удаляются с записью в лог.
+    Ссылки с переходами не трогаем: если они мешают индексу, старт падает.
+    """
+    if await conn.fetchval("SELECT to_regclass('referrals_owner_uniq') IS NOT NULL"):
+        return
+    async with conn.transaction():
+        await conn.execute("SELECT pg_advisory_xact_lock(hashtext('greenlight:referrals_owner_uniq'))")
+        if await conn.fetchval("SELECT to_regclass('referrals_owner_uniq') IS NOT NULL"):
+            return
+        removed = await conn.fetch("""
+            DELETE FROM referrals r
+            USING referrals keep
+            WHERE r.owner_client_id = keep.owner_client_id
+              AND (keep.created_at, keep.referral_id) < (r.created_at, r.referral_id)
+              AND NOT EXISTS (SELECT 1 FROM referral_usage u WHERE u.referral_id = r.referral_id)
+            RETURNING r.code, r.owner_client_id
+        """)
+        for row in removed:
+            logger.warning(
+                "Удалена лишняя реферальная ссылка %s владельца %s", row["code"], row["owner_client_id"]
+            )
+        try:
+            await conn.execute("CREATE UNIQUE INDEX referrals_owner_uniq ON referrals (owner_client_id)")
+        except asyncpg.UniqueViolationError as e:
+            raise RuntimeError(
+                "Не удалось создать referrals_owner_uniq: у владельцев несколько ссылок с переходами, "
+                "оставьте по одной ссылке на владельца вручную"
+            ) from e
+
+
+def working_seconds_function_sql() -> str:
+    """
+    DDL функции working_seconds(start_at, end_at): рабочие секунды между двумя моментами
+    по календарю из Config (WORK_START_HOUR–WORK_END_HOUR в TIMEZONE, каждый день).
+    Календарь вшит в тело функции; после его смены функция пересоздаётся при старте.
+    """
+    start_hour = int(config.work_start_hour)
+    end_hour = int(config.work_end_hour)
+    tz = config.timezone.replace("'", "''")
+    day_start = f"(d + make_interval(hours => {start_hour})) AT TIME ZONE '{tz}'"
+    day_end = f"(d + make_interval(hours => {end_hour})) AT TIME ZONE '{tz}'"
+    return f"""
+        CREATE OR REPLACE FUNCTION working_seconds(start_at timestamptz, end_at timestamptz)
+        RETURNS double precision
+        LANGUAGE sql STABLE STRICT PARALLEL SAFE
+        AS $$
+            SELECT COALESCE(SUM(EXTRACT(EPOCH FROM
+                       LEAST(end_at, {day_end}) - GREATEST(start_at, {day_start})
+                   )), 0)::double precision
+            FROM generate_series(
+                date_trunc('day', start_at AT TIME ZONE '{tz}'),
+                date_trunc('day', end_at AT TIME ZONE '{tz}'),
+                interval '1 day'
+            ) AS d
+            WHERE LEAST(end_at, {day_end}) > GREATEST(start_at, {day_start})
+        $$
+    """
+
+
+async def _create_working_seconds_function(conn) -> None:
+    """Рабочее время считается в БД одной функцией — её вызывают SLA-воркер и статистика."""
+    async with conn.transaction():
+        # CREATE OR REPLACE с нескольких реплик одновременно конфликтует — пересоздаёт одна
+        await conn.execute("SELECT pg_advisory_xact_lock(hashtext('greenlight:working_seconds'))")
+        await conn.execute(working_seconds_function_sql())
+
+
+def _month_start(day: date, shift: int = 0) -> date:
+    """Первое число месяца day, сдвинутого на shift месяцев."""
+    month = day.month - 1 + shift
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+async def ensure_message_partitions(conn, months_ahead: int) -> list[str]:
+    """Секции messages на текущий месяц и months_ahead следующих (UTC). Возвращает созданные."""
+    today = datetime.now(timezone.utc).date()
+    created = []
+    for shift in range(months_ahead + 1):
+        start, end = _month_start(today, shift), _month_start(today, shift + 1)
+        name = f"messages_p{start:%Y%m}"
+        if await conn.fetchval("SELECT to_regclass($1)", name) is not None:
+            continue
+        await conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF messages "
+            f"FOR VALUES FROM ('{start} 00:00+00') TO ('{end} 00:00+00')"
+        )
+        created.append(name)
+    return created
+
+
+async def _partition_messages(conn) -> None:
+    """Создать секционированную messages или перевести на секции существующую таблицу."""
+    async with conn.transaction():
+        # Несколько реплик стартуют одновременно — миграцию выполняет одна
+        await conn.execute("SELECT pg_advisory_xact_lock(hashtext('greenlight:messages_partitions'))")
+        relkind = await conn.fetchval(
+            "SELECT relkind::text FROM pg_class WHERE oid = to_regclass('messages')"
+        )
+        if relkind is None:
+            await conn.execute(
+                f"CREATE TABLE messages (message_id SERIAL, {_MESSAGES_DDL}) PARTITION BY RANGE (created_at)"
+            )
+        elif relkind == "r":
+            await _migrate_messages_to_partitions(conn)
+        await ensure_message_partitions(conn, config.messages_partitions_ahead)
+
+
+async def _migrate_messages_to_partitions(conn) -> None:
+    """
+    Обычная таблица messages становится messages_legacy (всё до начала текущего
+    месяца) без копирования; в новые секции переносятся только строки текущего
+    месяца. Нумерация message_id продолжается той же последовательностью.
+    Секцией messages_legacy становится позже, в _index_messages — вне транзакции.
+    """
+    logger.info("Перевод messages на помесячные секции")
+    sequence = await conn.fetchval("SELECT pg_get_serial_sequence('messages', 'message_id')")
+    bound = f"'{_month_start(datetime.now(timezone.utc).date())} 00:00+00'"
+
+    await conn.execute("ALTER TABLE messages RENAME TO messages_legacy")
+    await conn.execute("ALTER INDEX IF EXISTS messages_pkey RENAME TO messages_legacy_pkey")
+    await conn.execute("UPDATE messages_legacy SET created_at = 'epoch' WHERE created_at IS NULL")
+    await conn.execute("ALTER TABLE messages_legacy ALTER COLUMN created_at SET NOT NULL")
+    await conn.execute(
+        f"CREATE TABLE messages (message_id INTEGER NOT NULL DEFAULT nextval('{sequence}'), "
+        f"{_MESSAGES_DDL}) PARTITION BY RANGE (created_at)"
+    )
+    await conn.execute(f"ALTER SEQUENCE {sequence} OWNED BY messages.message_id")
+
+    await ensure_message_partitions(conn, config.messages_partitions_ahead)
+    await conn.execute(
+        f"INSERT INTO messages ({MESSAGE_COLUMNS}) "
+        f"SELECT {MESSAGE_COLUMNS} FROM messages_legacy WHERE created_at >= {bound}"
+    )
+    await conn.execute(f"DELETE FROM messages_legacy WHERE created_at >= {bound}")
 
 
+# Индексы messages: имя на родительской таблице → определение без имени таблицы
+_MESSAGES_INDEXES = {
+    "messages_ticket_created_idx": "(ticket_id, created_at)",
+    "messages_text_fts_idx": f"USING GIN ({MESSAGES_TSVECTOR})",
+}
+
+
+async def _index_messages(conn) -> None:
+    """
+    Индексы messages и подключение messages_legacy — отдельный шаг вне транзакции:
+    индекс секционированной таблицы нельзя построить CONCURRENTLY, поэтому он
+    создаётся ON ONLY messages, а на каждой секции строится CONCURRENTLY и
+    подключается к нему. Таблица при этом остаётся доступной на запись.
+    """
+    # Несколько реплик стартуют одновременно; CONCURRENTLY не работает в транзакции,
+    # поэтому блокировка сессионная
+    await conn.execute("SELECT pg_advisory_lock(hashtext('greenlight:messages_indexes'))")
+    try:
+        for name, definition in _MESSAGES_INDEXES.items():
+            await conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY messages {definition}")
+        await _attach_legacy_messages(conn)
+        partitions = await conn.fetch(
+            "SELECT inhrelid::regclass::text AS name FROM pg_inherits WHERE inhparent = 'messages'::regclass"
+        )
+        for partition in partitions:
+            for name, definition in _MESSAGES_INDEXES.items():
+                await _index_partition(conn, name, partition["name"], definition)
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock(hashtext('greenlight:messages_indexes'))")
+
+
+async def _create_index_concurrently(conn, name: str, table: str, definition: str, unique: bool = False) -> None:
+    """CREATE INDEX CONCURRENTLY; недостроенный прошлой попыткой (INVALID) индекс пересоздаётся."""
+    valid = await conn.fetchval(
+        "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)", name
+    )
+    if valid:
+        return
+    if valid is not None:
+        await conn.execute(f"DROP INDEX CONCURRENTLY {name}")
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    await conn.execute(f"CREATE {kind} CONCURRENTLY {name} ON {table} {definition}")
+
+
+async def _index_partition(conn, index: str, partition: str, definition: str) -> None:
+    """Построить индекс index на секции partition, если у неё его ещё нет, и подключить к родителю."""
+    attached = await conn.fetchval(
+        """
+        SELECT EXISTS (
+            SELECT 1 FROM pg_inherits i JOIN pg_index x ON x.indexrelid = i.inhrelid
+            WHERE i.inhparent = $1::regclass AND x.indrelid = $2::regclass
+        )
+        """,
+        index, partition,
+    )
+    if attached:
+        return
+    child = partition + index.removeprefix("messages")
+    await _create_index_concurrently(conn, child, partition, definition)
+    await conn.execute(f"ALTER INDEX {index} ATTACH PARTITION {child}")
+
+
+async def _attach_legacy_messages(conn) -> None:
+    """
+    Подключить messages_legacy секцией (MINVALUE, начало первой помесячной секции).
+    Всё тяжёлое — заранее и без блокировки записи: индексы строятся CONCURRENTLY
+    (ATTACH подхватывает совпадающие), граница проверяется VALIDATE CONSTRAINT
+    (ATTACH не сканирует таблицу). Сам ATTACH — короткая блокировка.
+    """
+    if await conn.fetchval("SELECT to_regclass('messages_legacy') IS NULL"):
+        return
+    if await conn.fetchval(
+        "SELECT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = 'messages_legacy'::regclass)"
+    ):
+        return
+    first = await conn.fetchval(
+        """
+        SELECT min(c.relname) FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'messages'::regclass AND c.relname ~ '^messages_p[0-9]{6}$'
+        """
+    )
+    bound = f"'{first[len('messages_p'):len('messages_p') + 4]}-{first[-2:]}-01 00:00+00'"
+    logger.info("Подключение messages_legacy секцией до %s", bound)
+
+    for name, definition in _MESSAGES_INDEXES.items():
+        await _create_index_concurrently(
+            conn, "messages_legacy" + name.removeprefix("messages"), "messages_legacy", definition
+        )
+    # Первичный ключ секции должен совпадать с ключом messages: (message_id, created_at)
+    await _create_index_concurrently(
+        conn, "messages_legacy_id_created_key", "messages_legacy", "(message_id, created_at)", unique=True
+    )
+    pkey = await conn.fetchrow(
+        """
+        SELECT conname, conindid::regclass::text AS index_name FROM pg_constraint
+        WHERE conrelid = 'messages_legacy'::regclass AND contype = 'p'
+        """
+    )
+    if pkey is None or pkey["index_name"] != "messages_legacy_id_created_key":
+        drop = f"DROP CONSTRAINT {pkey['conname']}, " if pkey else ""
+        await conn.execute(
+            f"ALTER TABLE messages_legacy {drop}"
+            f"ADD CONSTRAINT messages_legacy_id_created_key PRIMARY KEY USING INDEX messages_legacy_id_created_key"
+        )
+
+    await conn.execute("ALTER TABLE messages_legacy DROP CONSTRAINT IF EXISTS messages_legacy_bound")
+    await conn.execute(
+        f"ALTER TABLE messages_legacy ADD CONSTRAINT messages_legacy_bound CHECK (created_at < {bound}) NOT VALID"
+    )
+    await conn.execute("ALTER TABLE messages_legacy VALIDATE CONSTRAINT messages_legacy_bound")
+    await conn.execute(
+        f"ALTER TABLE messages ATTACH PARTITION messages_legacy FOR VALUES FROM (MINVALUE) TO ({bound})"
+    )
+    await conn.execute("ALTER TABLE messages_legacy DROP CONSTRAINT messages_legacy_bound")
+
+
+@asynccontextmanager
+async def _direct_connection(dsn: str):
+    """Отдельное соединение вне пула (миграции)."""
+    conn = await asyncpg.connect(dsn)
+    try:
+        yield conn
+    finally:
+        await conn.close()
+
+
+def iter_pools() -> list[tuple[str, asyncpg.Pool]]:
+    """Открытые пулы с именами; без connect() (тесты) — только Database.pool."""
+    if Database.pools:
+        return list(Database.pools.items())
+    return [(INTERACTIVE_POOL, Database.pool)] if Database.pool is not None else []
+
+
+async def warm_pools() -> int:
+    """
+    Прогрев пулов при старте: в каждом пуле разом взять min_size соединений (недостающие
+    открываются, на новых готовится каталог запросов), проверить их SELECT 1 и вернуть.
+    Возвращает число проверенных соединений.
+    """
+    total = 0
+    for name, pool in iter_pools():
+        conns = await asyncio.gather(*(pool.acquire() for _ in range(pool.get_min_size())))
+        try:
+            await asyncio.gather(*(conn.fetchval("SELECT 1") for conn in conns))
+        finally:
+            for conn in conns:
+                await pool.release(conn)
+        total += len(conns)
+    return total
+
+
+async def collect_pool_metrics() -> None:
+    """Коллектор /metrics: размер и свободные соединения каждого пула."""
+    for name, pool in iter_pools():
+        DB_POOL_SIZE.set(pool.get_size(), pool=name)
+        DB_POOL_IDLE.set(pool.get_idle_size(), pool=name)
+        DB_POOL_MAX.set(pool.get_max_size(), pool=name)
+
+
+async def check_database_ready() -> bool:
+    """Проверка /readyz: пул есть и отвечает."""
+    if Database.pool is None:
+        return False
+    return await asyncio.wait_for(Database.pool.fetchval("SELECT 1"), timeout=2) == 1
+
 
-def get_pool() -> asyncpg.Pool:
-    """Получить пул подключений."""
+def get_pool(name: str = INTERACTIVE_POOL) -> asyncpg.Pool:
+    """
+    Получить пул подключений: INTERACTIVE_POOL (по умолчанию) — обработчики апдейтов,
+    BACKGROUND_POOL — фоновые воркеры, ANALYTICS_POOL — статистика и отчёты,
+    REPLICA_POOL — read-реплика с откатом на ANALYTICS_POOL, если она отстаёт или недоступна.
+    Если именованные пулы не созданы (тесты подменяют Database.pool), отдаётся Database.pool.
+    """
     if Database.pool is None:
         raise RuntimeError("Database not connected. Call Database.connect() first.")
-    return Database.pool
+    if name == REPLICA_POOL and not Database.replica_available():
+        name = ANALYTICS_POOL
+    return Database.pools.get(name, Database.pool)
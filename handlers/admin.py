@@ -2,19 +2,30 @@
 import logging
 import asyncio
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
 from datetime import datetime, timedelta, timezone
 
 from constants import ADMIN_COMMANDS_HELP
-from keyboards import broadcast_confirm_kb
+from keyboards import broadcast_confirm_kb, pager_kb
 from config import config
 
 from zoneinfo import ZoneInfo
 
-from services.db.tickets import get_tickets_by_status, get_all_users_with_start, set_role
+from services.db.tickets import (
+    get_tickets_by_status, get_all_users_with_start, set_role, encode_ticket_cursor, decode_ticket_cursor,
+)
 from services.db.users import get_user_role, get_users_by_type
 from utils.media_extractor import extract_media
 from utils.media_sender import send_media
+from utils.pager import show_page
+from services.metrics import BROADCAST_RECIPIENTS, BROADCAST_SENT, BROADCAST_FAILED
+from services.profiler import (
+    MAX_PROFILE_SECONDS,
+    profile_busy,
+    profile_event_loop,
+    dump_tasks,
+    runtime_stats,
+)
 
 logger = logging.getLogger(__name__)
 router = Router(name="admin")
@@ -64,13 +75,39 @@ async def cmd_tickets(message: Message):
         )
         return
 
-    status = parts[1].upper()
-    tickets = await get_tickets_by_status(status)
+    text, kb = await _tickets_page_view(parts[1].upper())
+    await message.answer(text, reply_markup=kb)
 
-    if not tickets:
-        await message.answer(f"📭 Нет тикетов со статусом {status}")
+
+@router.callback_query(F.data.startswith("tickets:"))
+async def cb_tickets_page(cb: CallbackQuery):
+    """Листание /tickets: сообщение со списком редактируется на месте."""
+    tg_id = cb.from_user.id
+    role = await get_user_role(tg_id, config.admin_ids or [])
+    if not _is_admin(tg_id, role):
+        await cb.answer("⛔ Доступно только администратору.", show_alert=True)
         return
 
+    _, status, direction, cursor = cb.data.split(":", 3)
+    cursor = decode_ticket_cursor(cursor)
+    text, kb = await _tickets_page_view(
+        status.upper(),
+        after=cursor if direction == "next" else None,
+        before=cursor if direction == "prev" else None,
+    )
+    await show_page(cb, text, kb)
+
+
+async def _tickets_page_view(status: str, after=None, before=None):
+    """Текст и клавиатура одной страницы /tickets."""
+    tickets, has_prev, has_next = await get_tickets_by_status(status, after=after, before=before)
+
+    if not tickets and (after or before):
+        # Страница опустела, пока её листали (тикеты взяли/закрыли) — с начала списка
+        tickets, has_prev, has_next = await get_tickets_by_status(status)
+    if not tickets:
+        return f"📭 Нет тикетов со статусом {status}", None
+
     lines: list[str] = []
 
     for t in tickets:
@@ -95,7 +132,12 @@ async def cmd_tickets(message: Message):
 
         lines.append("")
 
-    await message.answer("\n".join(lines))
+    kb = pager_kb(
+        f"tickets:{status.lower()}",
+        encode_ticket_cursor(tickets[0]) if has_prev else None,
+        encode_ticket_cursor(tickets[-1]) if has_next else None,
+    )
+    return "\n".join(lines), kb
 
 @router.message(F.chat.type == "private", F.text == "/help")
 async def cmd_help(message: Message):
@@ -111,7 +153,9 @@ async def cmd_help(message: Message):
 /start — Начать диалог с поддержкой
             
 /my_tickets - Просмотреть активные тикеты
-/transfer_tickets user_name - Передать все свои тикеты другому  
+/transfer_tickets user_name [open|waiting | id …] - Передать свои тикеты другому  
+/online, /offline - Получать новые тикеты автоматически / перестать
+/search запрос - Поиск по сообщениям тикетов
             
 /statistik - Статистика.
 /stats 01.02.2026 10.02.2026 — Статистика за период\n"""
@@ -234,6 +278,9 @@ async def _do_broadcast(bot, admin_tg_id: int, content: tuple):
     logger.info("Broadcast: отправка %s получателям: %s", content_type, len(user_ids))
     success = 0
     failed = 0
+    BROADCAST_RECIPIENTS.set(len(user_ids))
+    BROADCAST_SENT.set(0)
+    BROADCAST_FAILED.set(0)
     batch_size = RATE_LIMIT
     delay = 1.0
 
@@ -252,6 +299,8 @@ async def _do_broadcast(bot, admin_tg_id: int, content: tuple):
             except Exception as e:
                 logger.warning("Broadcast не доставлен uid=%s: %s", uid, e)
                 failed += 1
+        BROADCAST_SENT.set(success)
+        BROADCAST_FAILED.set(failed)
         await asyncio.sleep(delay)
 
     report = f"Рассылка завершена.\nДоставлено: {success}\nНе доставлено: {failed}"
@@ -286,3 +335,55 @@ async def cmd_set_role(message: Message):
 
     await set_role(target_tg_id, new_role)
     await message.answer(f"Роль для {target_tg_id} установлена: {new_role}")
+
+
+@router.message(F.chat.type == "private", F.text.startswith("/profile"))
+async def cmd_profile(message: Message):
+    """Команда /profile [секунды] — сэмплирующий профайлер event loop, результат файлом."""
+    tg_id = message.from_user.id
+    role = await get_user_role(tg_id, config.admin_ids or [])
+
+    if not _is_admin(tg_id, role):
+        await message.answer("Доступ запрещён.")
+        return
+
+    parts = message.text.split()
+    try:
+        seconds = int(parts[1]) if len(parts) > 1 else 10
+    except ValueError:
+        await message.answer(f"Использование: /profile [1-{MAX_PROFILE_SECONDS}]")
+        return
+
+    if profile_busy():
+        await message.answer("Профилирование уже идёт, дождитесь результата.")
+        return
+
+    seconds = max(1, min(seconds, MAX_PROFILE_SECONDS))
+    await message.answer(f"Профилирую {seconds} с…")
+    collapsed, samples = await profile_event_loop(seconds)
+
+    stamp = now_local().strftime("%Y%m%d-%H%M%S")
+    await message.answer_document(
+        BufferedInputFile(collapsed.encode(), filename=f"profile-{stamp}.collapsed"),
+        caption=f"Сэмплов: {samples}. Формат collapsed stacks — flamegraph.pl или speedscope.app",
+    )
+
+
+@router.message(F.chat.type == "private", F.text == "/tasks")
+async def cmd_tasks(message: Message):
+    """Команда /tasks — живые asyncio-задачи со стеками, пул БД и очереди, файлом."""
+    tg_id = message.from_user.id
+    role = await get_user_role(tg_id, config.admin_ids or [])
+
+    if not _is_admin(tg_id, role):
+        await message.answer("Доступ запрещён.")
+        return
+
+    stats = await runtime_stats()
+    report = f"{stats}\n\n{dump_tasks()}"
+
+    stamp = now_local().strftime("%Y%m%d-%H%M%S")
+    await message.answer_document(
+        BufferedInputFile(report.encode(), filename=f"tasks-{stamp}.txt"),
+        caption=stats.split("\n\n", 1)[0][:1000] or "Дамп задач",
+    )
@@ -1,5 +1,4 @@
 """Обработчики для клиентов."""
-import json
 from aiogram import Router, F
 from aiogram.types import Message
 from aiogram.filters import CommandStart
@@ -16,16 +15,15 @@ from constants import (
 )
 from keyboards import main_keyboard
 from config import config
-from services.db.onboarding import get_onboarding_state, start_onboarding, save_onboarding_answer, complete_onboarding
+from services.db.onboarding import advance_onboarding, start_onboarding, finish_onboarding
 from services.db.referals import get_referral_by_code, create_referral_usage
 from services.db.sla import start_ticket_sla
 from services.db.tickets import upsert_user_with_client_type, mark_user_active, add_message, \
-    get_or_create_active_ticket, get_ticket, activate_ticket, set_client_type, set_ticket_card_message_id, \
-    update_created_at_for_draft_on_open
+    get_or_create_active_ticket, get_ticket, set_ticket_card_message_id
 from services.db.users import get_user_role, get_or_create_user
 from services.menu import ensure_actual_keyboard
+from services.assignment import auto_assign
 from services.working_hours import is_working_hours
-from services.crm import send_lead_to_crm
 from services.support_chat import (
     send_ticket_to_support_group,
     send_new_client_message_to_topic,
@@ -50,7 +48,7 @@ def get_text_and_media(message: Message):
     last_msg = text or "(медиа)"
     return text, media_type, file_id, last_msg
 
-async def send_ticket(bot, ticket_id, tg_id, username, client_type, last_msg):
+async def send_ticket(bot, ticket_id, tg_id, username, client_type, last_msg, ticket=None):
     client_label = _get_client_label(client_type)
     card_msg_id = await send_ticket_to_support_group(
         bot=bot,
@@ -59,14 +57,20 @@ async def send_ticket(bot, ticket_id, tg_id, username, client_type, last_msg):
         username=username or "—",
         client_type_label=client_label,
         last_message=last_msg,
+        ticket=ticket,
     )
     if card_msg_id:
         await set_ticket_card_message_id(ticket_id, card_msg_id)
-        await update_ticket_card(bot, ticket_id, last_message=last_msg)
 
 async def handle_onboarding(message: Message, tg_id: int, username: str, text: str, media_type=None, file_id=None, ticket_id=None):
-    state = await get_onboarding_state(tg_id)
-    if not state:
+    answer = {"text": text}
+    if media_type and file_id:
+        answer["media_type"] = media_type
+        answer["media_file_id"] = file_id
+
+    # Ответ дописывается одним UPDATE; None — онбординг ещё не начат
+    advanced = await advance_onboarding(tg_id, answer)
+    if advanced is None:
         await message.answer(MSG_TICKET_RECEIVED)
         if not is_working_hours():
             await message.answer(MSG_OFFLINE)
@@ -74,31 +78,18 @@ async def handle_onboarding(message: Message, tg_id: int, username: str, text: s
         await message.answer(f"1. {ONBOARDING_QUESTIONS[0]}")
         await start_onboarding(tg_id)
         return True  # завершено
-    step = int(state["current_step"])
-    answer = {"text": text}
-    if media_type and file_id:
-        answer["media_type"] = media_type
-        answer["media_file_id"] = file_id
-    await save_onboarding_answer(tg_id, step, answer)
 
-    next_step = step + 1
+    next_step, answers = advanced
     if next_step > len(ONBOARDING_QUESTIONS):
-        raw = state.get("answers") or {}
-        if isinstance(raw, str):
-            raw = json.loads(raw) if raw else {}
-        raw[str(step)] = answer
-        lead_id = await complete_onboarding(tg_id, raw)
-        await activate_ticket(ticket_id)
-        await set_client_type(tg_id, ClientType.LEAD)
-        await send_lead_to_crm(lead_id, tg_id, username, raw)
+        # Лид, CRM outbox и открытие тикета — одной транзакцией
+        _, ticket = await finish_onboarding(tg_id, ticket_id, answers, username=username)
         await message.answer(MSG_ONBOARDING_DONE)
 
-        await send_ticket(message.bot, ticket_id, tg_id, username, ClientType.LEAD, text)
-        await update_created_at_for_draft_on_open(ticket_id)
-        await start_ticket_sla(ticket_id)
+        await send_ticket(message.bot, ticket_id, tg_id, username, ClientType.LEAD, text, ticket=ticket)
+        await auto_assign(message.bot, ticket_id)
         return True
     else:
-        next_q = ONBOARDING_QUESTIONS[step]
+        next_q = ONBOARDING_QUESTIONS[next_step - 1]
         await message.answer(f"{next_step}. {next_q}")
         return True
 
@@ -154,8 +145,7 @@ async def client_message(message: Message):
     tg_id = message.from_user.id
     username = message.from_user.username
 
-    # Тут уже пользователь активный, message_id есть
-    await ensure_actual_keyboard(message.bot, tg_id, message.message_id)
+    # Клавиатуру уже проверил MenuMiddleware (с message_id)
 
     # 1️⃣ Проверяем, админ или саппорт
     is_admin, role = await is_admin_or_support(tg_id)
@@ -214,6 +204,7 @@ async def client_message(message: Message):
             )
             if card_msg_id:
                 await set_ticket_card_message_id(ticket_id, card_msg_id)
+            await auto_assign(message.bot, ticket_id)
 
         else:
             if ticket.get("support_thread_id"):
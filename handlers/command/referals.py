@@ -1,15 +1,23 @@
 from aiogram import F, Router
-from aiogram.filters import StateFilter
+from aiogram.filters import Command, CommandObject, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import Message
 
 from config import config
-from services.db.referals import get_or_create_referral, get_user_id_by_username_referals
+from services.db.referals import (
+    get_or_create_referral,
+    get_user_id_by_username_referals,
+    get_top_referral_stats,
+    get_owner_referral_stats,
+)
 from services.db.users import get_user_role
 
 router = Router(name="referals")
 
+REF_STATS_DEFAULT_TOP = 10
+REF_STATS_MAX_TOP = 50
+
 class CreateReferralFSM(StatesGroup):
     waiting_for_username = State()
 
@@ -43,4 +51,82 @@ async def process_username(message: Message, state: FSMContext):
     # Создаем или получаем реферальную ссылку
     referral = await get_or_create_referral(owner_client_id=client_id, created_by=message.from_user.id)
     await message.answer(f"✅ Реферальная ссылка для @{username}:\n{referral['link']}")
-    await state.clear()
\ No newline at end of file
+    await state.clear()
+
+
+def _format_ref_stats_row(row: dict) -> str:
+    owner = f"@{row['owner_username']}" if row.get("owner_username") else str(row["owner_client_id"])
+    return (
+        f"{owner} ({row['code']}): переходов {row['visits']}, "
+        f"уникальных {row['unique_visitors']}, регистраций {row['conversions']}, "
+        f"оплат {row['paid_conversions']}"
+    )
+
+
+REF_STATS_USAGE = (
+    "Использование:\n"
+    "/ref_stats [top N] — топ-N ссылок по регистрациям\n"
+    "/ref_stats id &lt;tg_id&gt; — ссылки владельца по tg_id\n"
+    "/ref_stats @username — ссылки владельца по username"
+)
+
+
+def parse_ref_stats_args(args: str | None) -> tuple[str, int | str] | None:
+    """
+    Аргументы /ref_stats: ("top", N), ("id", tg_id) или ("username", username).
+    None — аргументы не подходят ни под одну форму.
+    """
+    parts = (args or "").split()
+    if not parts:
+        return "top", REF_STATS_DEFAULT_TOP
+    if len(parts) == 1 and parts[0].startswith("@") and len(parts[0]) > 1:
+        return "username", parts[0][1:]
+    if parts[0] == "top" and len(parts) <= 2:
+        if len(parts) == 1:
+            return "top", REF_STATS_DEFAULT_TOP
+        if parts[1].isdigit():
+            return "top", max(1, min(int(parts[1]), REF_STATS_MAX_TOP))
+    if parts[0] == "id" and len(parts) == 2 and parts[1].isdigit():
+        return "id", int(parts[1])
+    return None
+
+
+@router.message(F.chat.type == "private", Command("ref_stats"))
+async def cmd_ref_stats(message: Message, command: CommandObject):
+    """
+    /ref_stats [top N] — топ-N ссылок по регистрациям.
+    /ref_stats id <tg_id> | @username — статистика ссылок владельца.
+    """
+    tg_id = message.from_user.id
+    role = await get_user_role(tg_id, config.admin_ids or [])
+    if not (role == "admin" or (config.admin_ids and tg_id in config.admin_ids)):
+        await message.answer("⛔ Доступно только администратору.")
+        return
+
+    parsed = parse_ref_stats_args(command.args)
+    if parsed is None:
+        await message.answer(REF_STATS_USAGE)
+        return
+    kind, value = parsed
+
+    if kind == "username":
+        owner_id = await get_user_id_by_username_referals(value)
+        if not owner_id:
+            await message.answer(f"❌ Пользователь @{value} не найден.")
+            return
+        rows = await get_owner_referral_stats(owner_id)
+        title = f"📈 Реферальная статистика @{value}"
+    elif kind == "id":
+        rows = await get_owner_referral_stats(value)
+        title = f"📈 Реферальная статистика {value}"
+    else:
+        rows = await get_top_referral_stats(value)
+        title = f"📈 Топ-{value} реферальных ссылок"
+
+    if not rows:
+        await message.answer(f"{title}\n\nДанных пока нет.")
+        return
+
+    lines = [title, ""]
+    lines += [f"{i}. {_format_ref_stats_row(r)}" for i, r in enumerate(rows, 1)]
+    await message.answer("\n".join(lines))
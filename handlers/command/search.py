@@ -0,0 +1,77 @@
+from html import escape
+from zoneinfo import ZoneInfo
+
+from aiogram import F, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import CallbackQuery, Message
+
+from config import config
+from keyboards import search_more_kb
+from services.db.search import create_search, get_search, search_messages, SEARCH_PAGE_SIZE
+from services.db.users import get_user_role
+
+router = Router(name="search")
+TZ = ZoneInfo(config.timezone)
+
+
+async def _is_staff(tg_id: int) -> bool:
+    role = await get_user_role(tg_id, config.admin_ids or [])
+    return role in ("support", "admin")
+
+
+def _format_hit(row) -> str:
+    client = f"@{row['client_username']}" if row["client_username"] else str(row["client_user_id"])
+    created = row["created_at"].astimezone(TZ).strftime("%d.%m.%Y %H:%M")
+    snippet = escape(row["snippet"] or "")
+    return f"🎫 #{row['ticket_id']} · {client} · {created}\n{snippet}\n/go_{row['ticket_id']}"
+
+
+async def _send_page(
+    message: Message, search_id: int, search: dict, after: tuple[float, int] | None
+) -> None:
+    query = search["query"]
+    # На одну строку больше страницы — чтобы знать, есть ли продолжение
+    rows = await search_messages(query, SEARCH_PAGE_SIZE + 1, after, search["max_message_id"])
+    if not rows:
+        await message.answer("Ничего не найдено." if after is None else "Больше результатов нет.")
+        return
+
+    page = rows[:SEARCH_PAGE_SIZE]
+    text = f"🔎 <b>{escape(query)}</b>\n\n" + "\n\n".join(_format_hit(r) for r in page)
+    markup = None
+    if len(rows) > SEARCH_PAGE_SIZE:
+        markup = search_more_kb(search_id, page[-1]["rank"], page[-1]["message_id"])
+    await message.answer(text, reply_markup=markup, disable_web_page_preview=True)
+
+
+@router.message(F.chat.type == "private", Command("search"))
+async def cmd_search(message: Message, command: CommandObject):
+    """/search <запрос> — поиск по сообщениям тикетов для поддержки и админа."""
+    if not await _is_staff(message.from_user.id):
+        await message.answer("Команда доступна только поддержке.")
+        return
+
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("Использование: /search <запрос>\nНапример: /search выплата -отмена")
+        return
+
+    # Запрос хранится в БД: «Дальше» работает и после перезапуска бота
+    search = await create_search(query)
+    await _send_page(message, search["search_id"], search, None)
+
+
+@router.callback_query(F.data.startswith("search:next:"))
+async def search_next(cb: CallbackQuery):
+    if not await _is_staff(cb.from_user.id):
+        await cb.answer("Доступ запрещён.", show_alert=True)
+        return
+
+    _, _, search_id, rank, message_id = cb.data.split(":")
+    search = await get_search(int(search_id))
+    if search is None:
+        await cb.answer("Поиск устарел, повторите /search.", show_alert=True)
+        return
+
+    await cb.answer()
+    await _send_page(cb.message, int(search_id), search, (float(rank), int(message_id)))
@@ -1,14 +1,18 @@
 from aiogram import Router, F
-from aiogram.types import Message
+from aiogram.types import CallbackQuery, Message
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from config import config
 from services.db.statistik import get_avg_first_reply_time, get_sla_violations, get_leads_count, get_avg_reply_time
-from services.db.tickets import get_all_supports
+from keyboards import pager_kb
+from services.db.tickets import get_all_supports, get_supports_page
 from services.db.users import get_user_role
+from utils.pager import show_page
 
 router = Router(name="statistik")
 TZ = ZoneInfo(config.timezone)
+# Саппортов на странице /statistik: по 12 запросов на каждого (4 метрики × 3 периода)
+STATS_SUPPORTS_PER_PAGE = 3
 
 
 async def build_stats_block(date_from, date_to, tg_support: int | None = None) -> str:
@@ -78,29 +82,69 @@ async def cmd_statistik(message: Message):
         await message.answer("⛔ Только админ или саппорт.")
         return
 
-    now = datetime.now(tz=TZ)
-    periods = [
-        ("за день", now.replace(hour=0, minute=0, second=0, microsecond=0), now),
-        ("за неделю", now - timedelta(days=7), now),
-        ("за месяц", now - timedelta(days=30), now),
-    ]
-
     blocks = []
     if role == "support":
+        periods = _periods()
         username = (await get_all_supports())
         supports_dict = {s["tg_id"]: s for s in username}
         username = supports_dict.get(tg_id, {}).get("username", "—")
         blocks.append(f"[SUPPORT] @{username}")
         for pname, df, dt in periods:
             blocks.append(f"[Статистика {pname}]\n{await build_stats_block(df, dt, tg_id)}")
-    else:
-        supports = await get_all_supports()
-        for s in supports:
-            uname = s.get("username") or "—"
-            blocks.append(f"[SUPPORT] @{uname}")
-            for pname, df, dt in periods:
-                blocks.append(f"[Статистика {pname}]\n{await build_stats_block(df, dt, s['tg_id'])}")
+        await message.answer("\n\n".join(blocks))
+        return
+
+    text, kb = await _statistik_page_view()
+    await message.answer(text, reply_markup=kb)
+
+
+@router.callback_query(F.data.startswith("statistik:"))
+async def cb_statistik_page(cb: CallbackQuery):
+    """Листание /statistik по саппортам: сообщение редактируется на месте."""
+    role = await get_user_role(cb.from_user.id, config.admin_ids or [])
+    if role != "admin":
+        await cb.answer("⛔ Доступно только администратору.", show_alert=True)
+        return
+
+    _, direction, cursor = cb.data.split(":", 2)
+    text, kb = await _statistik_page_view(
+        after=int(cursor) if direction == "next" else None,
+        before=int(cursor) if direction == "prev" else None,
+    )
+    await show_page(cb, text, kb)
+
+
+def _periods() -> list[tuple[str, datetime, datetime]]:
+    now = datetime.now(tz=TZ)
+    return [
+        ("за день", now.replace(hour=0, minute=0, second=0, microsecond=0), now),
+        ("за неделю", now - timedelta(days=7), now),
+        ("за месяц", now - timedelta(days=30), now),
+    ]
+
+
+async def _statistik_page_view(after: int | None = None, before: int | None = None):
+    """
+    Страница /statistik для админа: STATS_SUPPORTS_PER_PAGE саппортов, на первой
+    странице ещё и итог по всем. Считаются только показанные саппорты.
+    """
+    periods = _periods()
+    supports, has_prev, has_next = await get_supports_page(STATS_SUPPORTS_PER_PAGE, after=after, before=before)
+
+    blocks = []
+    if not has_prev:
         blocks.append("[ВСЕ САППОРТЫ]")
         for pname, df, dt in periods:
             blocks.append(f"[Статистика {pname}]\n{await build_stats_block(df, dt)}")
-    await message.answer("\n\n".join(blocks))
+    for s in supports:
+        uname = s.get("username") or "—"
+        blocks.append(f"[SUPPORT] @{uname}")
+        for pname, df, dt in periods:
+            blocks.append(f"[Статистика {pname}]\n{await build_stats_block(df, dt, s['tg_id'])}")
+
+    kb = pager_kb(
+        "statistik",
+        str(supports[0]["tg_id"]) if supports and has_prev else None,
+        str(supports[-1]["tg_id"]) if supports and has_next else None,
+    )
+    return "\n\n".join(blocks), kb
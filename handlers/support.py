@@ -1,35 +1,35 @@
 """Обработчики для Support Group — кнопки тикетов."""
 import logging
 
-from services.crm import send_client_to_crm
 from services.db.sla import stop_ticket_sla
-from services.db.tickets import get_support_active_tickets, get_ticket, get_client_username, get_ticket_messages, \
-    take_ticket, update_ticket_status, set_ticket_thread_id, set_ticket_topic_card_message_id, \
+from services.db.tickets import get_support_tickets_page, get_ticket, get_client_username, get_ticket_messages, \
+    claim_ticket, update_ticket_status, \
     get_history_messages_full, add_message, set_first_reply_if_needed, get_lead_by_client_tg_id, \
-    get_user_id_by_username, get_open_tickets_by_support, transfer_ticket, set_client_type
-from services.db.users import get_user_role, get_user_client_type, mark_user_as_paid
+    get_user_id_by_username, transfer_tickets, encode_ticket_cursor, decode_ticket_cursor
+from services.db.users import get_user_role, mark_user_as_paid, set_support_online
+from services.assignment import load_index
+from services.thread_index import thread_index
 from utils.media_extractor import extract_media
 from utils.media_sender import send_media
+from utils.pager import show_page
 
 logger = logging.getLogger(__name__)
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message, BufferedInputFile, InputMediaPhoto, InputMediaDocument, InputMediaAudio, InputMediaVideo
 from aiogram.filters import Command
-from constants import MSG_REPLY_PROMPT, ClientType, QUICK_REPLIES_MAP
+from constants import MAX_TICKET_ID, MSG_REPLY_PROMPT, QUICK_REPLIES_MAP, TicketStatus
 
 from services.support_chat import (
     send_escalation_to_admin,
-    send_ticket_to_support_group,
+    open_ticket_topic,
     refresh_ticket_card,
+    notify_tickets_transferred,
 )
-from keyboards import ticket_status_kb, ticket_quick_replies_kb
+from keyboards import ticket_status_kb, ticket_quick_replies_kb, pager_kb
 from config import config
 
 router = Router(name="support")
 
-# Хранилище ожидаемых ответов: {support_tg_id: ticket_id}
-pending_replies: dict[int, int] = {}
-
 #Ограничения телеграм
 MAX_CAPTION = 4000
 
@@ -87,11 +87,35 @@ async def my_tickets(message: Message):
         await message.answer("Команда доступна только поддержке.")
         return
 
-    tickets = await get_support_active_tickets(message.from_user.id)
-    if not tickets:
-        await message.answer("У вас нет активных тикетов.")
+    text, kb = await _my_tickets_page_view(message.from_user.id)
+    await message.answer(text, reply_markup=kb)
+
+
+@router.callback_query(F.data.startswith("my_tickets:"))
+async def cb_my_tickets_page(cb: CallbackQuery):
+    """Листание /my_tickets: сообщение со списком редактируется на месте."""
+    if not await _check_support(cb):
+        await cb.answer("Команда доступна только поддержке.", show_alert=True)
         return
 
+    _, direction, cursor = cb.data.split(":", 2)
+    cursor = decode_ticket_cursor(cursor)
+    text, kb = await _my_tickets_page_view(
+        cb.from_user.id,
+        after=cursor if direction == "next" else None,
+        before=cursor if direction == "prev" else None,
+    )
+    await show_page(cb, text, kb)
+
+
+async def _my_tickets_page_view(support_id: int, after=None, before=None):
+    """Текст и клавиатура одной страницы /my_tickets."""
+    tickets, has_prev, has_next = await get_support_tickets_page(support_id, after=after, before=before)
+    if not tickets and (after or before):
+        tickets, has_prev, has_next = await get_support_tickets_page(support_id)
+    if not tickets:
+        return "У вас нет активных тикетов.", None
+
     lines = []
     for t in tickets:
         lines.append(
@@ -100,7 +124,31 @@ async def my_tickets(message: Message):
             f"/go_{t['ticket_id']}"
         )
 
-    await message.answer("\n\n".join(lines))
+    kb = pager_kb(
+        "my_tickets",
+        encode_ticket_cursor(tickets[0]) if has_prev else None,
+        encode_ticket_cursor(tickets[-1]) if has_next else None,
+    )
+    return "\n\n".join(lines), kb
+
+@router.message(F.chat.type == "private", F.text.in_({"/online", "/offline"}))
+async def support_presence(message: Message):
+    """/online — получать новые тикеты автоматически, /offline — перестать."""
+    role = await get_user_role(message.from_user.id, config.admin_ids or [])
+    if role not in ("support", "admin"):
+        await message.answer("Команда доступна только поддержке.")
+        return
+
+    online = message.text == "/online"
+    await set_support_online(message.from_user.id, online)
+    load_index.invalidate()
+
+    if not online:
+        await message.answer("⚪ Вы не в сети: новые тикеты не назначаются.")
+    elif config.auto_assign_enabled:
+        await message.answer("🟢 Вы в сети: новые тикеты будут назначаться вам автоматически.")
+    else:
+        await message.answer("🟢 Вы в сети. Автоназначение сейчас выключено.")
 
 @router.message(F.text.startswith("/go_"))
 async def go_ticket(message: Message):
@@ -165,6 +213,21 @@ async def ticket_callback(cb: CallbackQuery):
     except ValueError:
         return
 
+    if action == "take":
+        # Атомарный захват: из одновременно нажавших выигрывает ровно один
+        claimed = await claim_ticket(ticket_id, cb.from_user.id)
+        if not claimed:
+            exists = await get_ticket(ticket_id)
+            await cb.answer(
+                "Тикет уже взят" if exists else "Тикет не найден",
+                show_alert=True,
+            )
+            return
+
+        await cb.answer("Тикет взят — переносим в вашу тему…")
+        await open_ticket_topic(cb.message.bot, claimed)
+        return
+
     ticket = await get_ticket(ticket_id)
     if not ticket:
         await cb.answer("Тикет не найден", show_alert=True)
@@ -176,7 +239,7 @@ async def ticket_callback(cb: CallbackQuery):
     is_assignee = assigned_id is not None and assigned_id == cb.from_user.id
 
     # Только назначенный оператор может что-либо делать с тикетом (кроме «Взять»)
-    if action != "take" and not await can_manage_ticket(cb.from_user.id, ticket):
+    if not await can_manage_ticket(cb.from_user.id, ticket):
         assignee_username = await get_client_username(assigned_id) or "—"
         await cb.answer(
             f"Тикет ведёт другой оператор (@{assignee_username}). Действия недоступны.",
@@ -197,15 +260,10 @@ async def ticket_callback(cb: CallbackQuery):
                 show_alert=True,
             )
             return
-        pending_replies[cb.from_user.id] = ticket_id
-        print(pending_replies)
-        await cb.answer("Режим ответа включён — все сообщения в этой теме пойдут клиенту. Нажмите другую кнопку, чтобы выйти.")
+        await cb.answer()
         await cb.message.answer(MSG_REPLY_PROMPT)
         return
 
-    # Любая другая кнопка — выходим из режима ответа
-    pending_replies.pop(cb.from_user.id, None)
-
     if action == "escalate":
         if status == "CLOSED":
             await cb.answer("Эскалация недоступна для закрытого тикета.", show_alert=True)
@@ -228,71 +286,7 @@ async def ticket_callback(cb: CallbackQuery):
         await cb.answer("Эскалация отправлена")
         return
 
-    if action == "take":
-        ok = await take_ticket(ticket_id, cb.from_user.id)
-        if not ok:
-            await cb.answer("Тикет уже взят", show_alert=True)
-            return
-
-        await cb.answer("Тикет взят — переносим в вашу тему…")
-
-        # Создать тему (форум-топик) и перенести тикет туда
-        try:
-            topic = await cb.message.bot.create_forum_topic(
-                chat_id=config.support_group_id,
-                name=f"Ticket #{ticket_id}",
-            )
-            thread_id = topic.message_thread_id
-        except Exception as e:
-            logging.getLogger(__name__).warning(
-                "Не удалось создать тему для тикета #%s (включите «Темы» в настройках группы): %s",
-                ticket_id, e,
-            )
-            # Fallback: тикет взят, переводим в WAITING и обновляем карточку в общем чате
-            await update_ticket_status(ticket_id, "WAITING")
-            await refresh_ticket_card(cb.message.bot, ticket_id)
-            return
-
-        # Отправить карточку тикета в тему (обновлённый тикет уже с taken_at)
-        ticket = await get_ticket(ticket_id)
-        client_tg_id = ticket["client_user_id"]
-        username = await get_client_username(client_tg_id) or "—"
-        ct = await get_user_client_type(client_tg_id)
-        client_type_label = "🆕 Новый" if ct == "new" else "👤 Действующий"
-        last_msg = "(тикет взят)"
-        msgs = await get_ticket_messages(ticket_id, limit=1)
-        if msgs:
-            last_msg = msgs[-1].get("text") or "(медиа)"
-
-        card_msg_id = await send_ticket_to_support_group(
-            bot=cb.message.bot,
-            ticket_id=ticket_id,
-            client_tg_id=client_tg_id,
-            username=username,
-            client_type_label=client_type_label,
-            last_message=last_msg,
-            message_thread_id=thread_id,
-        )
-        await set_ticket_thread_id(ticket_id, thread_id)
-        if card_msg_id:
-            await set_ticket_topic_card_message_id(ticket_id, card_msg_id)
-
-        # OPEN → WAITING только после того, как оператор взял тикет (теперь можно писать клиенту)
-        await update_ticket_status(ticket_id, "WAITING")
-        await refresh_ticket_card(cb.message.bot, ticket_id)
-
-        # Удалить карточку из общего чата
-        card_msg_id = ticket.get("ticket_card_message_id")
-        if card_msg_id:
-            try:
-                await cb.message.bot.delete_message(
-                    config.support_group_id,
-                    card_msg_id,
-                )
-            except Exception:
-                pass
-
-    elif action == "history":
+    if action == "history":
         ticket = await get_ticket(ticket_id)
         if not ticket:
             await cb.answer("Тикет не найден", show_alert=True)
@@ -397,26 +391,9 @@ async def ticket_callback(cb: CallbackQuery):
         client_tg_id = ticket["client_user_id"]
         client_username = await get_client_username(client_tg_id)
 
-        # 🔁 Отправка в CRM (перевод лида → клиент)
-
-
-        ok = await send_client_to_crm(
-            lead_id=ticket_id,
-            tg_id=client_tg_id,
-            username=client_username,
-        )
-
-        if not ok:
-            await cb.answer(
-                "❌ Не удалось отправить данные в CRM",
-                show_alert=True,
-            )
-            return
-
-        # 🏷 Меняем тип клиента
-
-        await set_client_type(client_tg_id, ClientType.EXISTING)
-        await mark_user_as_paid(client_tg_id)
+        # 🏷 Клиент → EXISTING + оплата; карточка для CRM (перевод лида → клиент)
+        # ставится в outbox той же транзакцией и доставляется в фоне
+        await mark_user_as_paid(client_tg_id, lead_id=ticket_id, username=client_username)
 
         # 🔒 Закрываем тикет
         # await update_ticket_status(ticket_id, "CLOSED")
@@ -551,6 +528,11 @@ async def status_callback(cb: CallbackQuery):
 
     old_status = ticket.get("status") or "OPEN"
     await update_ticket_status(ticket_id, new_status)
+    # Закрытый тикет выходит из индекса тем: сообщения в его теме больше не уходят клиенту
+    if new_status == "CLOSED":
+        thread_index.discard(ticket.get("support_thread_id"))
+    else:
+        thread_index.add(ticket.get("support_thread_id"), ticket_id)
     logger.info(
         "Тикет #%s: статус изменён %s -> %s (оператор %s)",
         ticket_id, old_status, new_status, cb.from_user.id,
@@ -559,44 +541,51 @@ async def status_callback(cb: CallbackQuery):
     await cb.answer(f"Статус: {new_status}")
 
 
-@router.message(F.chat.id == config.support_group_id)
-async def support_reply_message(message: Message):
+async def _ticket_thread(message: Message) -> dict | bool:
+    """Фильтр: сообщение в теме тикета (индекс, при промахе — БД); ticket_id передаётся в обработчик."""
+    ticket_id = await thread_index.resolve(message.message_thread_id)
+    return {"ticket_id": ticket_id} if ticket_id else False
+
+
+@router.message(F.chat.id == config.support_group_id, _ticket_thread)
+async def support_reply_message(message: Message, ticket_id: int):
     """
-    Ответ оператора клиенту. Режим включается одной кнопкой «Ответить».
+    Ответ оператора клиенту: любое сообщение в теме тикета уходит клиенту.
     Писать клиенту можно только когда тикет в статусе WAITING (взят оператором); при OPEN — нельзя.
     """
-    tg_id = message.from_user.id
-    ticket_id = pending_replies.get(tg_id)
-    if not ticket_id:
+    if message.text and message.text.startswith("/"):
+        return
+    media_type, media_file_id = extract_media(message)
+    text = message.text or message.caption or ""
+    # Служебные сообщения темы, стикеры и т.п. клиенту не пересылаются
+    if not text and not media_type:
         return
 
+    tg_id = message.from_user.id
     role = await get_user_role(tg_id, config.admin_ids or [])
     if role not in ("support", "admin"):
-        pending_replies.pop(tg_id, None)
         return
 
     ticket = await get_ticket(ticket_id)
     if not ticket:
-        pending_replies.pop(tg_id, None)
+        thread_index.discard(message.message_thread_id)
         return
 
     # Проверка прав
     if not await can_manage_ticket(tg_id, ticket):
-        await message.bot.send_message(config.support_group_id, "Этот тикет ведёт другой оператор. Ответ запрещён.")
+        await message.reply("Этот тикет ведёт другой оператор. Ответ запрещён.")
         return
 
     # Статус тикета
     if ticket.get("status") == "CLOSED":
-        await message.bot.send_message(config.support_group_id, "Тикет закрыт. Ответы клиенту недоступны.")
+        thread_index.discard(message.message_thread_id)
+        await message.reply("Тикет закрыт. Ответы клиенту недоступны.")
         return
     if ticket.get("status") == "OPEN":
-        await message.bot.send_message(config.support_group_id, "Сначала возьмите тикет кнопкой «Взять».")
+        await message.reply("Сначала возьмите тикет кнопкой «Взять».")
         return
 
-    media_type, media_file_id = extract_media(message)
-
     client_tg_id = ticket["client_user_id"]
-    text = message.text or message.caption or ""
 
     await add_message(
         ticket_id, "OUT", tg_id,
@@ -662,9 +651,6 @@ async def view_onboarding_cb(cb: CallbackQuery):
         return
 
     answers = lead["answers"]
-    if isinstance(answers, str):
-        import json
-        answers = json.loads(answers) if answers else {}
 
     if not answers:
         await cb.answer("Ответов нет", show_alert=True)
@@ -687,28 +673,40 @@ async def cmd_transfer_tickets(message: Message):
 
     parts = message.text.split()
 
-    if len(parts) != 2:
+    if len(parts) < 2:
         await message.answer(
-            "Использование:\n<code>/transfer_tickets username</code>"
+            "Использование:\n<code>/transfer_tickets username [open|waiting | id …]</code>"
         )
         return
 
     target_username = parts[1].lstrip("@")
+    # Необязательный фильтр: статусы или номера тикетов
+    filters = parts[2:]
+    statuses = ticket_ids = None
+    if filters and all(f.isdigit() for f in filters):
+        ticket_ids = [int(f) for f in filters]
+        if max(ticket_ids) > MAX_TICKET_ID:
+            await message.answer("Нет тикета с таким номером.")
+            return
+    elif filters:
+        statuses = [f.upper() for f in filters]
+        if not set(statuses) <= {TicketStatus.OPEN.value, TicketStatus.WAITING.value}:
+            await message.answer("Фильтр: статусы open, waiting или номера тикетов.")
+            return
 
     target_tg_id = await get_user_id_by_username(target_username)
     if not target_tg_id:
         await message.answer(f"Пользователь @{target_username} не найден.")
         return
 
-    tickets = await get_open_tickets_by_support(tg_id)
+    tickets = await transfer_tickets(tg_id, target_tg_id, statuses=statuses, ticket_ids=ticket_ids)
 
     if not tickets:
         await message.answer("У вас нет открытых тикетов для передачи.")
         return
 
-    for t in tickets:
-        await transfer_ticket(t["ticket_id"], target_tg_id)
-
+    load_index.invalidate()
     await message.answer(
         f"Передано {len(tickets)} тикетов пользователю @{target_username}."
-    )
\ No newline at end of file
+    )
+    await notify_tickets_transferred(message.bot, tickets, target_username)
@@ -57,6 +57,28 @@ def broadcast_confirm_kb() -> InlineKeyboardMarkup:
     ])
 
 
+def search_more_kb(search_id: int, rank: float, message_id: int) -> InlineKeyboardMarkup:
+    """Следующая страница /search: курсор — (релевантность, message_id) последнего результата."""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(
+            text="➡️ Дальше", callback_data=f"search:next:{search_id}:{rank!r}:{message_id}"
+        )],
+    ])
+
+
+def pager_kb(prefix: str, prev_cursor: str | None, next_cursor: str | None) -> InlineKeyboardMarkup | None:
+    """
+    Листание списка: «{prefix}:prev:{курсор}» и «{prefix}:next:{курсор}».
+    Курсор — ключ первой/последней записи страницы; нет ни одной кнопки — None.
+    """
+    row = []
+    if prev_cursor is not None:
+        row.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"{prefix}:prev:{prev_cursor}"))
+    if next_cursor is not None:
+        row.append(InlineKeyboardButton(text="Дальше ➡️", callback_data=f"{prefix}:next:{next_cursor}"))
+    return InlineKeyboardMarkup(inline_keyboard=[row]) if row else None
+
+
 def ticket_quick_replies_kb(ticket_id: int) -> InlineKeyboardMarkup:
     """Клавиатура с быстрыми ответами для тикета."""
     rows: list[list[InlineKeyboardButton]] = []
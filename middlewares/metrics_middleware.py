@@ -0,0 +1,51 @@
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+from services.metrics import API_ERRORS, API_LATENCY, UPDATE_LATENCY, UPDATES_TOTAL
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer-middleware на dp.update: полное время апдейта по типу события."""
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            UPDATES_TOTAL.observe(time.perf_counter() - started, event=event.event_type)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware на message/callback_query: время обработчика по роутеру."""
+
+    def __init__(self, event: str):
+        self.event = event
+
+    async def __call__(self, handler, event, data):
+        router = data.get("event_router")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            UPDATE_LATENCY.observe(
+                time.perf_counter() - started,
+                router=router.name if router else "",
+                event=self.event,
+            )
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время и ошибки запросов к Bot API по методу."""
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            API_ERRORS.inc(method=name, error=type(e).__name__)
+            raise
+        finally:
+            API_LATENCY.observe(time.perf_counter() - started, method=name)
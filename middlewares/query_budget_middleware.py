@@ -0,0 +1,25 @@
+from aiogram import BaseMiddleware
+
+from services.db.instrumentation import log_if_over_budget, query_scope, rename_scope
+
+
+class QueryScopeMiddleware(BaseMiddleware):
+    """Outer-middleware на dp.update: один QueryScope на апдейт, проверка бюджета в конце."""
+
+    async def __call__(self, handler, event, data):
+        with query_scope(event.event_type) as scope:
+            try:
+                return await handler(event, data)
+            finally:
+                log_if_over_budget(scope)
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Inner-middleware на message/callback_query: подписывает scope именем обработчика."""
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        if handler_object is not None:
+            callback = handler_object.callback
+            rename_scope(f"{callback.__module__}.{callback.__qualname__}")
+        return await handler(event, data)
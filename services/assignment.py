@@ -0,0 +1,97 @@
+"""
+Автоназначение тикетов: новый тикет сразу забирает наименее загруженный саппорт
+из тех, кто отметился /online, тем же атомарным claim_ticket, что и кнопка «Взять».
+
+Нагрузка (тикеты в работе) держится в памяти и перечитывается из БД не чаще раза
+в AUTO_ASSIGN_RESYNC_SECONDS; между перечитываниями учитываются свои назначения.
+"""
+import logging
+import time
+from typing import Optional
+
+from aiogram import Bot
+
+from config import config
+from services.db.tickets import claim_ticket
+from services.db.users import get_online_support_loads
+from services.support_chat import open_ticket_topic
+from services.working_hours import is_working_hours
+
+logger = logging.getLogger(__name__)
+
+
+class LoadIndex:
+    """Тикеты в работе по саппортам в сети: {tg_id: load}."""
+
+    def __init__(self):
+        self.loads: dict[int, int] = {}
+        self.usernames: dict[int, Optional[str]] = {}
+        self.last_assigned: dict[int, float] = {}
+        self.synced_at = 0.0
+
+    async def refresh(self, force: bool = False) -> None:
+        if not force and time.monotonic() - self.synced_at < config.auto_assign_resync_seconds:
+            return
+        rows = await get_online_support_loads()
+        self.loads = {r["tg_id"]: r["load"] for r in rows}
+        self.usernames = {r["tg_id"]: r["username"] for r in rows}
+        self.synced_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        """Состав «в сети» изменился — перечитать при следующем назначении."""
+        self.synced_at = 0.0
+
+    def pick(self) -> Optional[int]:
+        """Наименее загруженный саппорт ниже лимита; при равенстве — дольше всех без назначений."""
+        candidates = [s for s, load in self.loads.items() if load < config.auto_assign_max_tickets]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda s: (self.loads[s], self.last_assigned.get(s, 0.0)))
+
+    def reserve(self, support_id: int) -> None:
+        self.loads[support_id] = self.loads.get(support_id, 0) + 1
+        self.last_assigned[support_id] = time.monotonic()
+
+    def release(self, support_id: int) -> None:
+        if support_id in self.loads:
+            self.loads[support_id] = max(0, self.loads[support_id] - 1)
+
+
+load_index = LoadIndex()
+
+
+async def auto_assign(bot: Bot, ticket_id: int) -> Optional[int]:
+    """
+    Назначить тикет, если автоназначение включено, сейчас рабочее время и есть свободный
+    саппорт в сети. Возвращает tg_id назначенного или None (тикет ждёт «Взять»).
+    """
+    if not config.auto_assign_enabled or not is_working_hours():
+        return None
+
+    await load_index.refresh()
+    support_id = load_index.pick()
+    if support_id is None:
+        return None
+
+    # Резерв до await: параллельные назначения в этом процессе видят нагрузку сразу
+    load_index.reserve(support_id)
+    claimed = await claim_ticket(ticket_id, support_id)
+    if not claimed:
+        # Тикет успели взять вручную
+        load_index.release(support_id)
+        return None
+
+    thread_id = await open_ticket_topic(bot, claimed)
+    username = load_index.usernames.get(support_id)
+    assignee = f"@{username}" if username else str(support_id)
+    try:
+        await bot.send_message(
+            config.support_group_id,
+            f"🤖 Тикет #{ticket_id} назначен автоматически: {assignee}",
+            message_thread_id=thread_id,
+        )
+    except Exception as e:
+        logger.warning("Не удалось уведомить о назначении тикета #%s: %s", ticket_id, e)
+
+    logger.info("Тикет #%s автоматически назначен %s", ticket_id, support_id)
+    return support_id
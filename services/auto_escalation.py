@@ -1,15 +1,83 @@
 import asyncio
 import logging
-from datetime import datetime, timezone
+import time
 
-from services.db.sla import get_tickets_for_sla_check, update_ticket_sla_stage
-from services.db.tickets import get_client_username
-from services.working_hours import is_working_hours, working_minutes_between
-from services.support_chat import send_escalation_to_admin, send_warning_to_support
+from services.db.sla import get_tickets_for_sla_check, set_ticket_sla_stages
+from services.working_hours import is_working_hours
+from services.support_chat import send_escalation_digest, send_warning_to_support
+from services.metrics import WORKER_SWEEP
 from config import config
 
 logger = logging.getLogger(__name__)
-UTC = timezone.utc
+
+
+def _digest_line(t, reason: str) -> str:
+    """Строка тикета в сводке эскалаций."""
+    if not t["taken_at"]:
+        reason = "тикет ещё не взят"
+    return (
+        f"#{t['ticket_id']} · {t['status']} · саппорт @{t['support_username'] or '—'} · "
+        f"клиент @{t['client_username'] or '—'} · {int(t['minutes_passed'])} мин · {reason}"
+    )
+
+
+async def sla_sweep(bot) -> None:
+    """Один проход SLA: предупреждения, сводки эскалаций и одно обновление стадий."""
+    sweep_started = time.perf_counter()
+    # В выборке только тикеты, которым пора на следующую стадию
+    tickets = await get_tickets_for_sla_check(
+        config.sla_warning_minutes, config.sla_admin_minutes, config.sla_critical_minutes
+    )
+
+    warnings = []
+    # {стадия: тикеты} для сводки в Admin Chat
+    escalations: dict[int, list] = {2: [], 3: []}
+    advanced_ids: list[int] = []
+    advanced_stages: list[int] = []
+
+    for t in tickets:
+        stage = t["sla_stage"] or 0
+        minutes_passed = t["minutes_passed"]
+
+        # ⚠️ Первая стадия: предупреждение саппорта
+        if minutes_passed >= config.sla_warning_minutes and stage < 1:
+            warnings.append(t)
+            new_stage = 1
+        # 🚨 Вторая стадия: эскалация админам
+        elif minutes_passed >= config.sla_admin_minutes and stage < 2:
+            escalations[2].append(t)
+            new_stage = 2
+        # 🔥 Критическая стадия
+        elif minutes_passed >= config.sla_critical_minutes and stage < 3:
+            escalations[3].append(t)
+            new_stage = 3
+        else:
+            continue
+        advanced_ids.append(t["ticket_id"])
+        advanced_stages.append(new_stage)
+
+    # Предупреждения в темы — параллельно, темп держит support_group_limiter
+    await asyncio.gather(
+        *(send_warning_to_support(bot, t["ticket_id"], ticket=t) for t in warnings)
+    )
+    if escalations[2]:
+        await send_escalation_digest(
+            bot,
+            f"⛔ Эскалация SLA: {len(escalations[2])} тикетов без ответа "
+            f"больше {config.sla_admin_minutes} мин",
+            [_digest_line(t, "нет ответа от саппорта") for t in escalations[2]],
+        )
+    if escalations[3]:
+        await send_escalation_digest(
+            bot,
+            f"🔥 КРИТИЧЕСКОЕ нарушение SLA: {len(escalations[3])} тикетов без ответа "
+            f"больше {config.sla_critical_minutes} мин",
+            [_digest_line(t, "КРИТИЧЕСКОЕ нарушение SLA") for t in escalations[3]],
+        )
+    await set_ticket_sla_stages(advanced_ids, advanced_stages)
+
+    WORKER_SWEEP.observe(time.perf_counter() - sweep_started, worker="sla_watcher")
+
 
 async def escalation_watcher(bot):
     CHECK_INTERVAL = 300  # проверка каждые 5 минут
@@ -20,70 +88,7 @@ async def escalation_watcher(bot):
                 await asyncio.sleep(CHECK_INTERVAL)
                 continue
 
-            tickets = await get_tickets_for_sla_check()
-            now = datetime.now(UTC)
-
-            for t in tickets:
-                ticket_id = t["ticket_id"]
-                stage = t["sla_stage"] or 0
-
-                # Определяем, с какого момента считать SLA
-                if not t["taken_at"]:
-                    start_time = t["created_at"]
-                    mode = "take"  # никто не взял
-                else:
-                    # тикет взят — считаем с момента взятия
-                    start_time = t["sla_started_at"]
-                    mode = "reply"  # ждём ответа саппорта
-
-                if start_time is None:
-                    continue
-
-                minutes_passed = working_minutes_between(start_time, now)
-
-                # ⚠️ Первая стадия: предупреждение саппорта
-                if minutes_passed >= config.sla_warning_minutes and stage < 1:
-                    await send_warning_to_support(bot, ticket_id)
-                    await update_ticket_sla_stage(ticket_id, 1)
-
-                # 🚨 Вторая стадия: эскалация админам
-                elif minutes_passed >= config.sla_admin_minutes and stage < 2:
-                    support_username = await get_client_username(
-                        t["assigned_to_support_id"]
-                    )
-                    client_username = await get_client_username(
-                        t["client_user_id"]
-                    )
-                    last_msg = "(тикет ещё не взят)" if mode == "take" else "Нет ответа от саппорта"
-                    await send_escalation_to_admin(
-                        bot,
-                        ticket_id=ticket_id,
-                        support_username=support_username,
-                        client_username=client_username,
-                        last_message=last_msg,
-                        status=t["status"],
-                    )
-                    await update_ticket_sla_stage(ticket_id, 2)
-
-                # 🔥 Критическая стадия
-                elif minutes_passed >= config.sla_critical_minutes and stage < 3:
-                    support_username = await get_client_username(
-                        t["assigned_to_support_id"]
-                    )
-                    client_username = await get_client_username(
-                        t["client_user_id"]
-                    )
-                    last_msg = "(тикет ещё не взят)" if mode == "take" else "КРИТИЧЕСКОЕ нарушение SLA"
-                    await send_escalation_to_admin(
-                        bot,
-                        ticket_id=ticket_id,
-                        support_username=support_username,
-                        client_username=client_username,
-                        last_message=last_msg,
-                        status=t["status"],
-                    )
-                    await update_ticket_sla_stage(ticket_id, 3)
-
+            await sla_sweep(bot)
         except Exception as e:
             logger.exception("SLA watcher error: %s", e)
 
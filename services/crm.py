@@ -1,17 +1,41 @@
-"""Отправка данных в CRM: webhook и Google Sheets."""
+"""Отправка данных в CRM: webhook и Google Sheets.
+
+События пишутся в таблицу crm_outbox в одной транзакции с изменением в БД
+(services/db/crm_outbox.py), а доставляет их фоновый crm_outbox_worker —
+хендлеры больше не ждут внешние сервисы.
+"""
 import asyncio
-import json
+import logging
+import time
 from datetime import datetime
 
 import aiohttp
 from config import config
+from services.db.crm_outbox import (
+    crm_sinks,
+    count_pending_crm_events,
+    fetch_due_crm_events,
+    mark_crm_events_delivered,
+    reschedule_crm_events,
+    purge_delivered_crm_events,
+)
+from services.metrics import OUTBOX_PENDING, WORKER_SWEEP
+from services.sheets import get_sheets_sink, close_sheets_sink, lead_row, client_row
+
+logger = logging.getLogger(__name__)
+
+# Доставленные события храним 30 дней
+OUTBOX_RETENTION_DAYS = 30
+
+# Одна HTTP-сессия (пул keep-alive соединений) на процесс
+_http_session: aiohttp.ClientSession | None = None
 
 
-async def send_lead_to_crm(
+def build_lead_payload(
     lead_id: int, tg_id: int, username: str | None, answers: dict
-) -> bool:
-    """Отправить карточку лида в CRM (webhook и/или Google Sheets)."""
-    payload = {
+) -> dict:
+    """Карточка лида для CRM."""
+    return {
         "lead_id": lead_id,
         "tg_id": tg_id,
         "username": username,
@@ -21,30 +45,12 @@ async def send_lead_to_crm(
         "created_at": datetime.utcnow().isoformat() + "Z",
     }
 
-    ok_webhook = False
-    if config.crm_enabled and config.crm_webhook_url:
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    config.crm_webhook_url,
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=10),
-                ) as resp:
-                    ok_webhook = resp.status in (200, 201, 204)
-        except Exception:
-            pass
-
-    ok_sheets = False
-    if config.google_sheets_enabled and config.google_credentials_file and config.spreadsheet_id:
-        ok_sheets = await _append_lead_to_sheets(lead_id, tg_id, username, answers)
 
-    return ok_webhook or ok_sheets
-
-async def send_client_to_crm(
-    lead_id: int, tg_id: int, username: str | None
-) -> bool:
-    """Отправить карточку лида в CRM (webhook и/или Google Sheets)."""
-    payload = {
+def build_client_payload(
+    lead_id: int | None, tg_id: int, username: str | None
+) -> dict:
+    """Карточка оплатившего клиента для CRM."""
+    return {
         "lead_id": lead_id,
         "tg_id": tg_id,
         "username": username,
@@ -53,123 +59,126 @@ async def send_client_to_crm(
         "created_at": datetime.utcnow().isoformat() + "Z",
     }
 
-    ok_webhook = False
-    if config.crm_enabled and config.crm_webhook_url:
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Общая HTTP-сессия для webhook CRM."""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=config.crm_http_pool_size),
+            timeout=aiohttp.ClientTimeout(total=10),
+        )
+    return _http_session
+
+
+async def close_http_session() -> None:
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+
+
+async def post_to_webhook(
+    session: aiohttp.ClientSession, url: str, payloads: list[dict]
+) -> None:
+    """
+    Отправить события в webhook. При CRM_BATCH_SIZE > 1 тело — JSON-массив карточек,
+    иначе одна карточка (прежний формат). Ошибка доставки — исключение.
+    """
+    body = payloads if config.crm_batch_size > 1 else payloads[0]
+    async with session.post(url, json=body) as resp:
+        if resp.status not in (200, 201, 204):
+            raise RuntimeError(f"CRM webhook ответил {resp.status}")
+
+
+async def _deliver_webhook_events() -> int:
+    events = await fetch_due_crm_events("webhook", config.crm_outbox_fetch_limit)
+    if not events:
+        return 0
+
+    session = get_http_session()
+    batch_size = max(config.crm_batch_size, 1)
+    delivered = 0
+    for i in range(0, len(events), batch_size):
+        chunk = events[i : i + batch_size]
+        event_ids = [e["event_id"] for e in chunk]
+        try:
+            await post_to_webhook(session, config.crm_webhook_url, [e["payload"] for e in chunk])
+        except Exception as e:
+            logger.warning("CRM webhook: не доставлено %s событий: %s", len(chunk), e)
+            await reschedule_crm_events(event_ids, str(e) or type(e).__name__)
+            continue
+        await mark_crm_events_delivered(event_ids)
+        delivered += len(chunk)
+    return delivered
+
+
+async def _deliver_sheets_events() -> int:
+    """Все подошедшие строки — одним append_rows на лист."""
+    events = await fetch_due_crm_events("sheets", config.crm_outbox_fetch_limit)
+    if not events:
+        return 0
+
+    by_sheet: dict[str, list[dict]] = {}
+    for e in events:
+        sheet_name = config.sheet_name if e["event_type"] == "lead" else config.sheet_name_client
+        by_sheet.setdefault(sheet_name, []).append(e)
+
+    sink = get_sheets_sink()
+    delivered = 0
+    for sheet_name, sheet_events in by_sheet.items():
+        event_ids = [e["event_id"] for e in sheet_events]
+        rows = [
+            lead_row(e["payload"]) if e["event_type"] == "lead" else client_row(e["payload"])
+            for e in sheet_events
+        ]
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    config.crm_webhook_url,
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=10),
-                ) as resp:
-                    ok_webhook = resp.status in (200, 201, 204)
-        except Exception:
-            pass
-
-    ok_sheets = False
+            await sink.append_rows(sheet_name, rows)
+        except Exception as e:
+            logger.warning("Google Sheets: не записано %s строк в «%s»: %s", len(rows), sheet_name, e)
+            await reschedule_crm_events(event_ids, str(e) or type(e).__name__)
+            continue
+        await mark_crm_events_delivered(event_ids)
+        delivered += len(rows)
+    return delivered
+
+
+async def deliver_crm_outbox_once() -> int:
+    """Один проход доставки по всем получателям. Возвращает число доставленных событий."""
+    delivered = 0
+    if config.crm_enabled and config.crm_webhook_url:
+        delivered += await _deliver_webhook_events()
     if config.google_sheets_enabled and config.google_credentials_file and config.spreadsheet_id:
-        ok_sheets = await _append_client_to_sheets(lead_id, tg_id, username)
+        delivered += await _deliver_sheets_events()
+    return delivered
 
-    return ok_webhook or ok_sheets
 
-def _append_lead_to_sheets_sync(
-    lead_id: int, tg_id: int, username: str | None, answers: dict
-) -> bool:
-    """Синхронная запись лида в Google Sheets."""
-    try:
-        import gspread
-        from google.oauth2.service_account import Credentials
+async def collect_outbox_metrics() -> None:
+    """Коллектор /metrics: глубина CRM outbox по получателям."""
+    pending = await count_pending_crm_events()
+    for sink in crm_sinks():
+        OUTBOX_PENDING.set(pending.get(sink, 0), sink=sink)
 
-        scopes = [
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive",
-        ]
-        creds = Credentials.from_service_account_file(
-            config.google_credentials_file, scopes=scopes
-        )
-        gc = gspread.authorize(creds)
-        sh = gc.open_by_key(config.spreadsheet_id)
-        sheet = sh.worksheet(config.sheet_name)
-
-        # Заголовки ожидаются: lead_id, tg_id, username, created_at, status, answer_1..answer_9
-        row = [
-            lead_id,
-            tg_id,
-            username or "",
-            datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
-            "NEW_LEAD",
-        ]
-        for i in range(1, 10):
-            val = answers.get(str(i))
-            if isinstance(val, dict):
-                text = (val.get("text") or "").strip()
-                if not text and val.get("media_type"):
-                    text = "(медиа)"
-                row.append(text or "")
-            else:
-                row.append(str(val) if val is not None else "")
-
-        sheet.append_row(row, value_input_option="USER_ENTERED")
-        return True
-    except Exception:
-        return False
-
-def _append_client_to_sheets_sync(
-    lead_id: int, tg_id: int, username: str | None
-) -> bool:
-    """Синхронная запись лида в Google Sheets."""
-    try:
-        import gspread
-        from google.oauth2.service_account import Credentials
 
-        scopes = [
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive",
-        ]
-        creds = Credentials.from_service_account_file(
-            config.google_credentials_file, scopes=scopes
-        )
-        gc = gspread.authorize(creds)
-        sh = gc.open_by_key(config.spreadsheet_id)
-        sheet = sh.worksheet(config.sheet_name_client)
-
-        # Заголовки ожидаются: lead_id, tg_id, username, created_at, status, answer_1..answer_9
-        row = [
-            lead_id,
-            tg_id,
-            username or "",
-            datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
-            "Client",
-        ]
-        sheet.append_row(row, value_input_option="USER_ENTERED")
-        return True
-    except Exception:
-        return False
+async def crm_outbox_worker():
+    """Фоновая доставка CRM-событий из outbox."""
+    last_purge = 0.0
 
-
-async def _append_lead_to_sheets(
-    lead_id: int, tg_id: int, username: str | None, answers: dict
-) -> bool:
-    """Асинхронная обёртка для записи в Google Sheets."""
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(
-        None,
-        _append_lead_to_sheets_sync,
-        lead_id,
-        tg_id,
-        username,
-        answers,
-    )
-
-async def _append_client_to_sheets(
-    lead_id: int, tg_id: int, username: str | None
-) -> bool:
-    """Асинхронная обёртка для записи в Google Sheets."""
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(
-        None,
-        _append_client_to_sheets_sync,
-        lead_id,
-        tg_id,
-        username,
-    )
+    try:
+        while True:
+            try:
+                with WORKER_SWEEP.time(worker="crm_outbox"):
+                    delivered = await deliver_crm_outbox_once()
+                if delivered:
+                    logger.info("CRM outbox: доставлено %s событий", delivered)
+
+                if time.monotonic() - last_purge > 3600:
+                    await purge_delivered_crm_events(OUTBOX_RETENTION_DAYS)
+                    last_purge = time.monotonic()
+            except Exception as e:
+                logger.exception("CRM outbox worker error: %s", e)
+
+            await asyncio.sleep(config.crm_outbox_interval)
+    finally:
+        await close_http_session()
+        close_sheets_sink()
@@ -0,0 +1,33 @@
+"""
+Кодеки типов для соединений пула: json/jsonb приходят из БД готовыми dict/list
+и принимают dict/list в параметрах — без json.dumps/json.loads в коде.
+Если установлен orjson, используется он.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    def json_dumps(value) -> str:
+        return orjson.dumps(value).decode()
+
+    json_loads = orjson.loads
+else:
+    def json_dumps(value) -> str:
+        return json.dumps(value, ensure_ascii=False)
+
+    json_loads = json.loads
+
+
+async def register_json_codecs(conn) -> None:
+    for type_name in ("json", "jsonb"):
+        await conn.set_type_codec(
+            type_name,
+            encoder=json_dumps,
+            decoder=json_loads,
+            schema="pg_catalog",
+        )
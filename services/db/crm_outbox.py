@@ -0,0 +1,100 @@
+"""Операции с БД."""
+from config import config
+from database import get_pool, BACKGROUND_POOL
+
+
+def crm_sinks() -> list[str]:
+    """Включённые получатели CRM-событий."""
+    sinks = []
+    if config.crm_enabled and config.crm_webhook_url:
+        sinks.append("webhook")
+    if config.google_sheets_enabled and config.google_credentials_file and config.spreadsheet_id:
+        sinks.append("sheets")
+    return sinks
+
+
+async def enqueue_crm_event(conn, event_type: str, payload: dict) -> None:
+    """
+    Записать событие в outbox — по строке на каждый включённый получатель.
+    conn — соединение вызывающего: событие попадает в его транзакцию.
+    """
+    sinks = crm_sinks()
+    if not sinks:
+        return
+    await conn.execute(
+        """INSERT INTO crm_outbox (sink, event_type, payload)
+           SELECT sink, $2, $3::jsonb FROM unnest($1::text[]) AS sink""",
+        sinks, event_type, payload
+    )
+
+
+async def fetch_due_crm_events(sink: str, limit: int) -> list:
+    """Недоставленные события получателя, у которых подошло время попытки; payload — уже dict."""
+    pool = get_pool(BACKGROUND_POOL)
+    return await pool.fetch(
+        """
+        SELECT event_id, event_type, payload, attempts
+        FROM crm_outbox
+        WHERE sink = $1
+          AND delivered_at IS NULL
+          AND next_attempt_at <= NOW()
+        ORDER BY event_id
+        LIMIT $2
+        """,
+        sink, limit
+    )
+
+
+async def count_pending_crm_events() -> dict[str, int]:
+    """Глубина очереди: недоставленные события, которые ещё будут повторяться, по получателям."""
+    pool = get_pool(BACKGROUND_POOL)
+    rows = await pool.fetch(
+        """
+        SELECT sink, COUNT(*) AS pending
+        FROM crm_outbox
+        WHERE delivered_at IS NULL AND next_attempt_at IS NOT NULL
+        GROUP BY sink
+        """
+    )
+    return {r["sink"]: r["pending"] for r in rows}
+
+
+async def mark_crm_events_delivered(event_ids: list[int]) -> None:
+    pool = get_pool(BACKGROUND_POOL)
+    await pool.execute(
+        "UPDATE crm_outbox SET delivered_at = NOW(), last_error = NULL WHERE event_id = ANY($1::bigint[])",
+        event_ids
+    )
+
+
+async def reschedule_crm_events(event_ids: list[int], error: str) -> None:
+    """
+    Отложить события с экспоненциальной задержкой: base * 2^attempts, не больше max.
+    После crm_max_attempts попыток next_attempt_at = NULL — событие остаётся в таблице для разбора.
+    """
+    pool = get_pool(BACKGROUND_POOL)
+    await pool.execute(
+        """
+        UPDATE crm_outbox
+        SET attempts = attempts + 1,
+            last_error = $2,
+            next_attempt_at = CASE
+                WHEN attempts + 1 >= $3 THEN NULL
+                ELSE NOW() + make_interval(secs => LEAST($4 * power(2, attempts), $5))
+            END
+        WHERE event_id = ANY($1::bigint[])
+        """,
+        event_ids, error[:500], config.crm_max_attempts,
+        float(config.crm_retry_base_seconds), float(config.crm_retry_max_seconds),
+    )
+
+
+async def purge_delivered_crm_events(older_than_days: int) -> None:
+    """Удалить давно доставленные события."""
+    pool = get_pool(BACKGROUND_POOL)
+    await pool.execute(
+        """DELETE FROM crm_outbox
+           WHERE delivered_at IS NOT NULL
+             AND delivered_at < NOW() - make_interval(days => $1)""",
+        older_than_days
+    )
@@ -0,0 +1,280 @@
+"""
+Учёт запросов к БД по обработчикам.
+
+InstrumentedPool / InstrumentedConnection оборачивают asyncpg и на каждый запрос
+добавляют два perf_counter и запись в текущий QueryScope (contextvar); ожидание
+соединения из пула уходит в гистограмму db_pool_acquire_seconds с именем пула. Scope
+открывает middleware на апдейт или query_scope() в фоновом воркере. Отдельно
+копится статистика по отпечаткам запросов (scope + нормализованный SQL).
+"""
+import asyncio
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Optional
+
+import asyncpg
+
+from config import config
+from services.metrics import DB_POOL_ACQUIRE_WAIT, DB_POOL_ACQUIRE_TIMEOUTS
+
+logger = logging.getLogger(__name__)
+
+UNSCOPED = "background"
+
+
+@dataclass
+class QueryScope:
+    """Запросы одного апдейта (или одного прохода воркера)."""
+    name: str
+    count: int = 0
+    total_time: float = 0.0
+    slowest_time: float = 0.0
+    slowest_query: str = ""
+    parent: Optional["QueryScope"] = None
+
+    def record(self, query: str, elapsed: float) -> None:
+        self.count += 1
+        self.total_time += elapsed
+        if elapsed > self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_query = query
+
+    def merge_into_parent(self) -> None:
+        """Вложенный scope (например, бенчмарк вокруг апдейта) видит запросы внутреннего."""
+        parent = self.parent
+        if parent is None:
+            return
+        parent.count += self.count
+        parent.total_time += self.total_time
+        if self.slowest_time > parent.slowest_time:
+            parent.slowest_time = self.slowest_time
+            parent.slowest_query = self.slowest_query
+
+    def over_budget(self) -> bool:
+        return (
+            self.count > config.db_query_budget
+            or self.total_time * 1000 > config.db_time_budget_ms
+        )
+
+
+@dataclass
+class FingerprintStats:
+    calls: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+
+_current_scope: ContextVar[Optional[QueryScope]] = ContextVar("db_query_scope", default=None)
+# {(scope name, отпечаток): статистика}
+_fingerprints: dict[tuple[str, str], FingerprintStats] = {}
+
+_WHITESPACE = re.compile(r"\s+")
+_NUMBER = re.compile(r"\b\d+\b")
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(query: str) -> str:
+    """SQL без лишних пробелов и числовых литералов; параметры $n не трогаем."""
+    return _NUMBER.sub("?", _WHITESPACE.sub(" ", query).strip()).replace("$?", "$n")
+
+
+def current_scope() -> Optional[QueryScope]:
+    return _current_scope.get()
+
+
+def record_query(query: str, elapsed: float) -> None:
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.record(query, elapsed)
+    key = (scope.name if scope else UNSCOPED, fingerprint(query))
+    stats = _fingerprints.get(key)
+    if stats is None:
+        stats = _fingerprints[key] = FingerprintStats()
+    stats.calls += 1
+    stats.total_time += elapsed
+    if elapsed > stats.max_time:
+        stats.max_time = elapsed
+
+
+def get_fingerprint_stats(limit: int = 20) -> list[tuple[str, str, FingerprintStats]]:
+    """Самые затратные по суммарному времени запросы: (scope, отпечаток, статистика)."""
+    top = sorted(_fingerprints.items(), key=lambda kv: kv[1].total_time, reverse=True)[:limit]
+    return [(name, fp, stats) for (name, fp), stats in top]
+
+
+def reset_fingerprint_stats() -> None:
+    _fingerprints.clear()
+
+
+@contextmanager
+def query_scope(name: str):
+    """Открыть scope: в middleware на апдейт, в воркерах — на один проход."""
+    scope = QueryScope(name, parent=_current_scope.get())
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+        scope.merge_into_parent()
+
+
+def rename_scope(name: str) -> None:
+    """Уточнить имя scope, когда стал известен обработчик."""
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.name = name
+
+
+def log_if_over_budget(scope: QueryScope) -> None:
+    if scope.over_budget():
+        logger.warning(
+            "DB budget exceeded in %s: %s queries, %.1f ms; slowest %.1f ms: %s",
+            scope.name,
+            scope.count,
+            scope.total_time * 1000,
+            scope.slowest_time * 1000,
+            fingerprint(scope.slowest_query)[:200],
+        )
+
+
+class InstrumentedConnection:
+    """Соединение из пула: запросы замеряются, остальное проксируется как есть."""
+
+    __slots__ = ("_conn",)
+
+    def __init__(self, conn: asyncpg.Connection):
+        self._conn = conn
+
+    @property
+    def raw(self) -> asyncpg.Connection:
+        return self._conn
+
+    async def execute(self, query: str, *args, **kwargs) -> str:
+        started = time.perf_counter()
+        try:
+            return await self._conn.execute(query, *args, **kwargs)
+        finally:
+            record_query(query, time.perf_counter() - started)
+
+    async def executemany(self, query: str, args, **kwargs) -> None:
+        started = time.perf_counter()
+        try:
+            return await self._conn.executemany(query, args, **kwargs)
+        finally:
+            record_query(query, time.perf_counter() - started)
+
+    async def fetch(self, query: str, *args, **kwargs) -> list:
+        started = time.perf_counter()
+        try:
+            return await self._conn.fetch(query, *args, **kwargs)
+        finally:
+            record_query(query, time.perf_counter() - started)
+
+    async def fetchrow(self, query: str, *args, **kwargs) -> Any:
+        started = time.perf_counter()
+        try:
+            return await self._conn.fetchrow(query, *args, **kwargs)
+        finally:
+            record_query(query, time.perf_counter() - started)
+
+    async def fetchval(self, query: str, *args, **kwargs) -> Any:
+        started = time.perf_counter()
+        try:
+            return await self._conn.fetchval(query, *args, **kwargs)
+        finally:
+            record_query(query, time.perf_counter() - started)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._conn, name)
+
+
+class _AcquireContext:
+    __slots__ = ("_ctx", "_pool_name", "_count_queries")
+
+    def __init__(self, ctx, pool_name: str, count_queries: bool):
+        self._ctx = ctx
+        self._pool_name = pool_name
+        self._count_queries = count_queries
+
+    async def __aenter__(self):
+        return await self._wrap(self._ctx.__aenter__())
+
+    async def __aexit__(self, *exc) -> None:
+        await self._ctx.__aexit__(*exc)
+
+    def __await__(self):
+        return self._wrap(self._ctx).__await__()
+
+    async def _wrap(self, acquiring):
+        started = time.perf_counter()
+        try:
+            conn = await acquiring
+        except asyncio.TimeoutError:
+            DB_POOL_ACQUIRE_TIMEOUTS.inc(pool=self._pool_name)
+            raise
+        finally:
+            DB_POOL_ACQUIRE_WAIT.observe(time.perf_counter() - started, pool=self._pool_name)
+        return InstrumentedConnection(conn) if self._count_queries else conn
+
+
+class InstrumentedPool:
+    """
+    Пул asyncpg с именем, таймаутом ожидания соединения по умолчанию и учётом запросов;
+    совместим с кодом, который работает с get_pool(). count_queries=False — только
+    метрики ожидания, соединения отдаются без обёртки.
+    """
+
+    def __init__(
+        self,
+        pool: asyncpg.Pool,
+        name: str = "default",
+        *,
+        acquire_timeout: float | None = None,
+        count_queries: bool = True,
+    ):
+        self._pool = pool
+        self.name = name
+        self.acquire_timeout = acquire_timeout
+        self.count_queries = count_queries
+
+    @property
+    def raw(self) -> asyncpg.Pool:
+        return self._pool
+
+    def acquire(self, *, timeout: float | None = None) -> _AcquireContext:
+        if timeout is None:
+            timeout = self.acquire_timeout
+        return _AcquireContext(self._pool.acquire(timeout=timeout), self.name, self.count_queries)
+
+    async def release(self, conn, *, timeout: float | None = None) -> None:
+        if isinstance(conn, InstrumentedConnection):
+            conn = conn.raw
+        await self._pool.release(conn, timeout=timeout)
+
+    async def execute(self, query: str, *args, **kwargs) -> str:
+        async with self.acquire() as conn:
+            return await conn.execute(query, *args, **kwargs)
+
+    async def executemany(self, query: str, args, **kwargs) -> None:
+        async with self.acquire() as conn:
+            return await conn.executemany(query, args, **kwargs)
+
+    async def fetch(self, query: str, *args, **kwargs) -> list:
+        async with self.acquire() as conn:
+            return await conn.fetch(query, *args, **kwargs)
+
+    async def fetchrow(self, query: str, *args, **kwargs) -> Any:
+        async with self.acquire() as conn:
+            return await conn.fetchrow(query, *args, **kwargs)
+
+    async def fetchval(self, query: str, *args, **kwargs) -> Any:
+        async with self.acquire() as conn:
+            return await conn.fetchval(query, *args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._pool, name)
@@ -1,9 +1,12 @@
 """Операции с БД."""
 from typing import Optional
-import json
 from database import get_pool
+from services.db import queries
 from constants import ClientType
 from services.db.users import get_or_create_user
+from services.db.crm_outbox import enqueue_crm_event
+from services.crm import build_lead_payload
+from services.db.records import Ticket, TICKET_COLUMNS
 
 
 async def start_onboarding(tg_id: int) -> None:
@@ -19,51 +22,93 @@ async def start_onboarding(tg_id: int) -> None:
         )
 
 
-async def get_onboarding_state(tg_id: int) -> Optional[dict]:
-    """Получить состояние онбординга."""
+async def get_onboarding_state(tg_id: int):
+    """Получить состояние онбординга (current_step, answers — уже dict)."""
     pool = get_pool()
-    row = await pool.fetchrow(
-        "SELECT * FROM onboarding_state WHERE tg_id = $1", tg_id
+    return await pool.fetchrow(
+        "SELECT tg_id, current_step, answers FROM onboarding_state WHERE tg_id = $1", tg_id
     )
-    return dict(row) if row else None
 
 
-async def save_onboarding_answer(tg_id: int, step: int, answer: str | dict) -> None:
-    """Сохранить ответ онбординга и перейти к следующему шагу."""
-    pool = get_pool()
-    async with pool.acquire() as conn:
-        state = await conn.fetchrow(
-            "SELECT answers FROM onboarding_state WHERE tg_id = $1", tg_id
-        )
-        answers = state["answers"] or {}
-        if isinstance(answers, str):
-            answers = json.loads(answers) if answers else {}
-        answers[str(step)] = answer
-        next_step = step + 1
-        await conn.execute(
-            """UPDATE onboarding_state SET current_step = $1, answers = $2
-               WHERE tg_id = $3""",
-            next_step, json.dumps(answers, ensure_ascii=False), tg_id
-        )
+async def advance_onboarding(tg_id: int, answer: str | dict) -> Optional[tuple[int, dict]]:
+    """
+    Сохранить ответ на текущий шаг одним UPDATE.
+    Возвращает (следующий шаг, все ответы) или None, если онбординг не начат.
+    """
+    # Ответ дописывается в JSONB на стороне БД: без чтения и пересборки answers в Python
+    row = await queries.fetchrow(
+        "onboarding_append_answer", tg_id, None, answer
+    )
+    if not row:
+        return None
+    return row["current_step"], row["answers"] or {}
+
+
+async def save_onboarding_answer(tg_id: int, step: int, answer: str | dict) -> int:
+    """Сохранить ответ онбординга и перейти к следующему шагу. Возвращает следующий шаг."""
+    row = await queries.fetchrow(
+        "onboarding_append_answer", tg_id, step, answer
+    )
+    if not row:
+        raise ValueError("Онбординг не начат")
+    return row["current_step"]
 
-async def complete_onboarding(tg_id: int, answers: dict) -> int:
+
+async def _complete_onboarding(conn, tg_id: int, answers: dict, username: str | None) -> int:
+    """Шаги завершения онбординга внутри транзакции вызывающего. Возвращает lead_id."""
+    await conn.execute(
+        """UPDATE users SET onboarding_completed_at = NOW(), client_type = $1
+           WHERE tg_id = $2""",
+        ClientType.LEAD.value, tg_id
+    )
+    lead_id = await conn.fetchval(
+        """INSERT INTO leads (tg_id, answers, status)
+           VALUES ($1, $2, 'NEW_LEAD') RETURNING lead_id""",
+        tg_id, answers
+    )
+    await enqueue_crm_event(
+        conn, "lead", build_lead_payload(lead_id, tg_id, username, answers)
+    )
+    await conn.execute("DELETE FROM onboarding_state WHERE tg_id = $1", tg_id)
+    return lead_id
+
+
+async def complete_onboarding(tg_id: int, answers: dict, username: str | None = None) -> int:
     """
-    Завершить онбординг: обновить user, создать lead, очистить state.
+    Завершить онбординг: обновить user, создать lead, поставить лида в CRM outbox,
+    очистить state — одной транзакцией.
     Возвращает lead_id.
     """
 
+    await get_or_create_user(tg_id)
     pool = get_pool()
     async with pool.acquire() as conn:
-        await get_or_create_user(tg_id)
-        await conn.execute(
-            """UPDATE users SET onboarding_completed_at = NOW(), client_type = $1
-               WHERE tg_id = $2""",
-            ClientType.LEAD.value, tg_id
-        )
-        lead_id = await conn.fetchval(
-            """INSERT INTO leads (tg_id, answers, status)
-               VALUES ($1, $2, 'NEW_LEAD') RETURNING lead_id""",
-            tg_id, json.dumps(answers, ensure_ascii=False)
-        )
-        await conn.execute("DELETE FROM onboarding_state WHERE tg_id = $1", tg_id)
-        return lead_id
\ No newline at end of file
+        async with conn.transaction():
+            return await _complete_onboarding(conn, tg_id, answers, username)
+
+
+async def finish_onboarding(
+    tg_id: int, ticket_id: int, answers: dict, username: str | None = None
+) -> tuple[int, Optional[Ticket]]:
+    """
+    Завершить онбординг и открыть тикет одной транзакцией: лид, CRM outbox,
+    client_type = LEAD, тикет DRAFT → OPEN со свежим created_at и запущенным SLA.
+    Возвращает (lead_id, строка открытого тикета).
+    """
+    pool = get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            lead_id = await _complete_onboarding(conn, tg_id, answers, username)
+            ticket = await conn.fetchrow(
+                f"""
+                UPDATE tickets
+                SET status = 'OPEN',
+                    sla_stage = 0,
+                    created_at = NOW(),
+                    sla_started_at = NOW()
+                WHERE ticket_id = $1
+                RETURNING {TICKET_COLUMNS}
+                """,
+                ticket_id, record_class=Ticket,
+            )
+    return lead_id, ticket
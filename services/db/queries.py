@@ -0,0 +1,196 @@
+"""
+Каталог горячих запросов.
+
+У каждого запроса фиксированная форма: необязательные фильтры — через
+`$n::type IS NULL OR …`, без склейки строк. При создании соединения пула
+(init-хук) все запросы каталога заранее кладутся в кэш prepared statements
+asyncpg, и вызов по имени сразу исполняет готовый statement — без parse/plan
+на каждый вызов. На соединении не из каталожного пула (тесты, отдельные
+соединения) запрос подготовится при первом вызове и дальше тоже берётся из кэша.
+"""
+import logging
+from typing import Any
+
+import asyncpg
+
+from services.db.codecs import register_json_codecs
+from services.db.records import Ticket, User, TICKET_COLUMNS, USER_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+QUERIES: dict[str, str] = {
+    # --- users ---
+    "user_role": "SELECT role FROM users WHERE tg_id = $1",
+    "user_by_id": f"SELECT {USER_COLUMNS} FROM users WHERE tg_id = $1",
+    "user_touch": """
+        UPDATE users
+        SET username = $1,
+            last_seen = NOW()
+        WHERE tg_id = $2
+    """,
+    "keyboard_version": "SELECT keyboard_version FROM users WHERE tg_id = $1",
+
+    # --- tickets / messages ---
+    "ticket_by_id": f"SELECT {TICKET_COLUMNS} FROM tickets WHERE ticket_id = $1",
+    "active_ticket_of_client": """
+        SELECT ticket_id FROM tickets
+        WHERE client_user_id = $1 AND status IN ('DRAFT', 'OPEN', 'WAITING')
+        ORDER BY created_at DESC
+        LIMIT 1
+    """,
+    "message_insert": """
+        INSERT INTO messages (ticket_id, direction, author_user_id, text, media_type, media_file_id)
+        VALUES ($1, $2, $3, $4, $5, $6)
+    """,
+    "ticket_claim": f"""
+        UPDATE tickets
+        SET assigned_to_support_id = $1, taken_at = NOW(), status = 'WAITING'
+        WHERE ticket_id = $2 AND assigned_to_support_id IS NULL
+        RETURNING {TICKET_COLUMNS}
+    """,
+
+    # --- referrals ---
+    "referral_by_code": """
+        SELECT r.referral_id,
+               r.owner_client_id,
+               r.created_by,
+               r.code,
+               u.username AS owner_username
+        FROM referrals r
+        JOIN users u ON u.tg_id = r.owner_client_id
+        WHERE r.code = $1
+    """,
+
+    # --- onboarding ---
+    # Ответ дописывается в JSONB на стороне БД; $2 — номер шага, NULL — текущий шаг
+    "onboarding_append_answer": """
+        UPDATE onboarding_state
+        SET answers = COALESCE(answers, '{}'::jsonb)
+                      || jsonb_build_object(COALESCE($2::int, current_step)::text, $3::jsonb),
+            current_step = COALESCE($2::int, current_step) + 1
+        WHERE tg_id = $1
+        RETURNING current_step, answers
+    """,
+
+    # --- statistik: $3 — саппорт или NULL для всех ---
+    "stats_leads_count": """
+        SELECT COUNT(*) AS total
+        FROM tickets
+        WHERE created_at BETWEEN $1 AND $2
+          AND ($3::bigint IS NULL OR assigned_to_support_id = $3)
+    """,
+    "stats_avg_first_reply": """
+        SELECT AVG(EXTRACT(EPOCH FROM (first_reply_at - created_at))) AS avg_seconds
+        FROM tickets
+        WHERE first_reply_at IS NOT NULL
+          AND created_at BETWEEN $1 AND $2
+          AND ($3::bigint IS NULL OR assigned_to_support_id = $3)
+    """,
+    # Время ответа — в рабочих секундах: working_seconds() из миграции (database.py)
+    "stats_sla_violations": """
+        SELECT COUNT(*) AS violations
+        FROM tickets
+        WHERE first_reply_at IS NOT NULL
+          AND created_at BETWEEN $1 AND $2
+          AND ($3::bigint IS NULL OR assigned_to_support_id = $3)
+          AND working_seconds(created_at, first_reply_at) > $4::int * 60
+    """,
+    "stats_avg_reply_time": """
+        WITH pairs AS (
+            SELECT
+                c.ticket_id,
+                c.created_at AS client_time,
+                MIN(s.created_at) AS support_time
+            FROM messages c
+            JOIN messages s
+              ON s.ticket_id = c.ticket_id
+             AND s.direction = 'OUT'
+             AND s.created_at > c.created_at
+             -- явная нижняя граница: планировщик отсекает секции messages до периода
+             AND s.created_at >= $1
+             AND ($3::bigint IS NULL OR s.author_user_id = $3)
+            WHERE c.direction = 'IN'
+              AND c.created_at BETWEEN $1 AND $2
+            GROUP BY c.ticket_id, c.created_at
+        )
+        SELECT AVG(working_seconds(client_time, support_time)) AS avg_seconds
+        FROM pairs
+    """,
+}
+
+
+# Тип строк запроса; по умолчанию — обычный asyncpg.Record
+RECORD_CLASSES: dict[str, type] = {
+    "user_by_id": User,
+    "ticket_by_id": Ticket,
+    "ticket_claim": Ticket,
+}
+
+
+class CatalogConnection(asyncpg.Connection):
+    """
+    Соединение пула, у которого запросы каталога заранее лежат в кэше
+    prepared statements asyncpg.
+
+    Отдельные PreparedStatement не держим: asyncpg инвалидирует их при первом
+    возврате соединения в пул. Кэш соединения (ключ — текст запроса и класс
+    строк) возврат переживает, а устаревший после миграции statement asyncpg
+    переподготавливает сам.
+    """
+
+    __slots__ = ()
+
+    async def prepare_catalog(self) -> None:
+        for name, sql in QUERIES.items():
+            try:
+                await self._get_statement(sql, None, record_class=RECORD_CLASSES.get(name))
+            except asyncpg.PostgresError as e:
+                # Схема ещё не та (например, старая реплика) — запрос подготовится при первом вызове
+                logger.warning("Запрос каталога %s не подготовлен: %s", name, e)
+
+    def catalog_prepared(self, name: str) -> bool:
+        record_class = RECORD_CLASSES.get(name) or self._protocol.get_record_class()
+        return self._stmt_cache.get((QUERIES[name], record_class, False)) is not None
+
+
+async def init_connection(conn: CatalogConnection) -> None:
+    """init-хук пула: кодеки JSON и каталог на новом соединении (кодеки — до prepare)."""
+    await register_json_codecs(conn)
+    await conn.prepare_catalog()
+
+
+async def _run(method: str, name: str, args: tuple, conn=None, pool: str | None = None) -> Any:
+    if conn is None:
+        from database import get_pool
+
+        async with (get_pool(pool) if pool else get_pool()).acquire() as acquired:
+            return await _run(method, name, args, acquired)
+
+    # Тот же текст и класс строк, что при подготовке, — asyncpg берёт statement из кэша
+    sql = QUERIES[name]
+    if method == "execute":
+        return await conn.execute(sql, *args)
+    record_class = RECORD_CLASSES.get(name)
+    if record_class is not None and method != "fetchval":
+        return await getattr(conn, method)(sql, *args, record_class=record_class)
+    return await getattr(conn, method)(sql, *args)
+
+
+async def fetch(name: str, *args, conn=None, pool: str | None = None) -> list:
+    """
+    Выполнить запрос каталога; conn — соединение вызывающего (транзакция),
+    иначе из пула pool (имя из database.POOL_NAMES, по умолчанию — interactive).
+    """
+    return await _run("fetch", name, args, conn, pool)
+
+
+async def fetchrow(name: str, *args, conn=None, pool: str | None = None) -> Any:
+    return await _run("fetchrow", name, args, conn, pool)
+
+
+async def fetchval(name: str, *args, conn=None, pool: str | None = None) -> Any:
+    return await _run("fetchval", name, args, conn, pool)
+
+
+async def execute(name: str, *args, conn=None, pool: str | None = None) -> str:
+    return await _run("execute", name, args, conn, pool)
@@ -0,0 +1,52 @@
+"""
+Типы строк БД. Это asyncpg.Record с доступом к полям как к атрибутам —
+без копирования в dict: ticket.status и ticket["status"] равнозначны.
+Проекции колонок перечислены явно, чтобы не тянуть лишнее и не зависеть от SELECT *.
+"""
+import asyncpg
+
+
+class Row(asyncpg.Record):
+    __slots__ = ()
+
+    def __getattr__(self, name: str):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+class Ticket(Row):
+    __slots__ = ()
+
+
+class User(Row):
+    __slots__ = ()
+
+
+class Message(Row):
+    __slots__ = ()
+
+
+class Lead(Row):
+    __slots__ = ()
+
+
+TICKET_COLUMNS = """ticket_id, client_user_id, status, assigned_to_support_id,
+    created_at, taken_at, first_reply_at, closed_at,
+    sla_stage, sla_started_at,
+    support_thread_id, ticket_card_message_id, ticket_topic_card_message_id"""
+
+USER_COLUMNS = """tg_id, username, role, client_type, is_blocked, is_paid,
+    created_at, last_seen, first_message_at, onboarding_completed_at,
+    keyboard_version, reminder_step, online_since"""
+
+MESSAGE_COLUMNS = """message_id, ticket_id, direction, author_user_id,
+    text, media_type, media_file_id, created_at"""
+
+LEAD_COLUMNS = "lead_id, tg_id, answers, created_at, status"
+
+
+def columns(projection: str, alias: str) -> str:
+    """Проекция с префиксом таблицы: columns(MESSAGE_COLUMNS, "m") → "m.message_id, m.ticket_id, …"."""
+    return ", ".join(f"{alias}.{c.strip()}" for c in projection.split(","))
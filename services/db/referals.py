@@ -1,9 +1,41 @@
 """Операции с БД."""
+import time
 from typing import Optional
+import asyncpg
 from config import config
-import random
-import string
-from database import get_pool
+from database import get_pool, BACKGROUND_POOL, REPLICA_POOL
+from services.db import queries
+from utils.lru_cache import LRUCache
+
+# Один запрос: существующая ссылка владельца или новая, код — referral_code(referral_id).
+# ON CONFLICT по владельцу закрывает гонку двух одновременных созданий.
+_UPSERT_REFERRAL_SQL = """
+    WITH existing AS (
+        SELECT code FROM referrals WHERE owner_client_id = $1
+    ),
+    inserted AS (
+        INSERT INTO referrals (referral_id, code, owner_client_id, created_by)
+        SELECT s.id, referral_code(s.id), $1, $2
+        FROM (SELECT nextval(pg_get_serial_sequence('referrals', 'referral_id')) AS id) s
+        WHERE NOT EXISTS (SELECT 1 FROM existing)
+        ON CONFLICT (owner_client_id) DO UPDATE SET owner_client_id = EXCLUDED.owner_client_id
+        RETURNING code
+    )
+    SELECT code FROM existing
+    UNION ALL
+    SELECT code FROM inserted
+    LIMIT 1
+"""
+
+# code → ссылка (с username владельца) для deep-link /start; несуществующий код —
+# момент (time.monotonic), до которого промах считается актуальным
+_referral_cache = LRUCache(config.referral_cache_size)
+_MISS_TTL = 60.0
+
+
+def _referral_link(code: str) -> dict:
+    return {"code": code, "link": f"https://t.me/{config.bot_username}?start={code}"}
+
 
 async def get_or_create_referral(owner_client_id: int, created_by: int | None = None) -> dict:
     """
@@ -11,37 +43,20 @@ async def get_or_create_referral(owner_client_id: int, created_by: int | None =
     created_by = tg_id того, кто создаёт ссылку (может быть клиент сам или админ/саппорт)
     Возвращает словарь: {"code": str, "link": str}
     """
+    # Если created_by не указан, значит создаём сами
+    if created_by is None:
+        created_by = owner_client_id
+
     pool = get_pool()
-    async with pool.acquire() as conn:
-        # Сначала ищем существующую
-        row = await conn.fetchrow("""
-            SELECT code FROM referrals
-            WHERE owner_client_id = $1
-            ORDER BY created_at ASC
-            LIMIT 1
-        """, owner_client_id)
-        if row:
-            code = row["code"]
-            return {"code": code, "link": f"https://t.me/{config.bot_username}?start={code}"}
-
-        # Генерируем уникальный код
-        while True:
-            code = ''.join(random.choices(string.ascii_letters + string.digits, k=8))
-            exists = await conn.fetchrow("SELECT 1 FROM referrals WHERE code = $1", code)
-            if not exists:
-                break
-
-        # Если created_by не указан, значит создаём сами
-        if created_by is None:
-            created_by = owner_client_id
-
-        # Сохраняем новую ссылку
-        await conn.execute("""
-            INSERT INTO referrals(owner_client_id, created_by, code)
-            VALUES ($1, $2, $3)
-        """, owner_client_id, created_by, code)
-
-        return {"code": code, "link": f"https://t.me/{config.bot_username}?start={code}"}
+    try:
+        code = await pool.fetchval(_UPSERT_REFERRAL_SQL, owner_client_id, created_by)
+    except asyncpg.UniqueViolationError:
+        # Совпадение с давним случайным кодом — следующий id даст другой код
+        code = await pool.fetchval(_UPSERT_REFERRAL_SQL, owner_client_id, created_by)
+    # Код мог попасть в кэш как несуществующий до создания ссылки
+    if not isinstance(_referral_cache.get(code), dict):
+        _referral_cache.pop(code)
+    return _referral_link(code)
 
 async def get_user_id_by_username_referals(username: str) -> int | None:
     pool = get_pool()
@@ -60,59 +75,138 @@ async def get_referral_by_code(code: str) -> Optional[dict]:
     """
     Найти реферальную ссылку по коду.
     Возвращает словарь с полями: referral_id, owner_client_id, created_by, code, owner_username
+    Ссылки кэшируются (LRU): повторные /start по одному коду не ходят в БД.
+    Промахи тоже, но на _MISS_TTL секунд — код могла создать другая реплика.
     """
-    pool = get_pool()
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow("""
-            SELECT r.referral_id,
-                   r.owner_client_id,
-                   r.created_by,
-                   r.code,
-                   u.username AS owner_username
-            FROM referrals r
-            JOIN users u ON u.tg_id = r.owner_client_id
-            WHERE r.code = $1
-        """, code)
-        if row:
-            return dict(row)
-    return None
+    cached = _referral_cache.get(code)
+    if isinstance(cached, dict):
+        return cached
+    if cached is not None and cached > time.monotonic():
+        return None
+
+    row = await queries.fetchrow("referral_by_code", code)
+    if not row:
+        _referral_cache.set(code, time.monotonic() + _MISS_TTL)
+        return None
+    referral = dict(row)
+    _referral_cache.set(code, referral)
+    return referral
 
 async def create_referral_usage(referral_id: int, visitor_client_id: int, converted: bool = False) -> None:
     """
-    Сохраняет факт перехода по реферальной ссылке.
+    Сохраняет факт перехода по реферальной ссылке и сразу обновляет referral_stats.
     converted = True, если посетитель зарегистрировался
     """
     pool = get_pool()
     async with pool.acquire() as conn:
-        await conn.execute("""
-            INSERT INTO referral_usage(referral_id, visitor_client_id, visited_at, converted)
-            VALUES ($1, $2, NOW(), $3)
-        """, referral_id, visitor_client_id, converted)
+        async with conn.transaction():
+            await conn.execute("""
+                INSERT INTO referral_usage(referral_id, visitor_client_id, visited_at, converted)
+                VALUES ($1, $2, NOW(), $3)
+            """, referral_id, visitor_client_id, converted)
 
+            new_visitor = False
+            new_conversion = False
+            if visitor_client_id is not None:
+                # Строка возвращается только для нового посетителя или впервые сконвертированного
+                visitor = await conn.fetchrow("""
+                    INSERT INTO referral_visitors (referral_id, visitor_client_id, converted)
+                    VALUES ($1, $2, $3)
+                    ON CONFLICT (referral_id, visitor_client_id) DO UPDATE SET converted = TRUE
+                    WHERE NOT referral_visitors.converted AND EXCLUDED.converted
+                    RETURNING (xmax = 0) AS is_new
+                """, referral_id, visitor_client_id, converted)
+                if visitor:
+                    new_visitor = visitor["is_new"]
+                    new_conversion = converted
 
-# Version
+            await conn.execute("""
+                INSERT INTO referral_stats (referral_id, owner_client_id, visits, unique_visitors, conversions)
+                SELECT referral_id, owner_client_id, 1, $2, $3
+                FROM referrals
+                WHERE referral_id = $1
+                ON CONFLICT (referral_id) DO UPDATE SET
+                    visits = referral_stats.visits + 1,
+                    unique_visitors = referral_stats.unique_visitors + EXCLUDED.unique_visitors,
+                    conversions = referral_stats.conversions + EXCLUDED.conversions,
+                    updated_at = NOW()
+            """, referral_id, int(new_visitor), int(new_conversion))
 
-async def get_keyboard_version(tg_id: int):
-    pool = get_pool()
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow(
-            """
-            SELECT keyboard_version
-            FROM users
-            WHERE tg_id = $1
-            """,
-            tg_id
+
+async def record_referral_payment(conn, visitor_client_id: int) -> None:
+    """
+    Учесть оплату пришедшего по ссылке клиента в paid_conversions.
+    conn — соединение вызывающего (транзакция mark_user_as_paid); повторная оплата не считается.
+    """
+    await conn.execute("""
+        WITH flipped AS (
+            UPDATE referral_visitors
+            SET paid = TRUE
+            WHERE visitor_client_id = $1 AND NOT paid
+            RETURNING referral_id
         )
+        UPDATE referral_stats s
+        SET paid_conversions = s.paid_conversions + 1,
+            updated_at = NOW()
+        FROM flipped f
+        WHERE s.referral_id = f.referral_id
+    """, visitor_client_id)
+
+
+async def get_top_referral_stats(limit: int) -> list[dict]:
+    """Топ ссылок по конверсиям (индекс referral_stats_top_idx)."""
+    pool = get_pool(REPLICA_POOL)
+    rows = await pool.fetch("""
+        SELECT s.referral_id,
+               s.owner_client_id,
+               s.visits,
+               s.unique_visitors,
+               s.conversions,
+               s.paid_conversions,
+               r.code,
+               u.username AS owner_username
+        FROM referral_stats s
+        JOIN referrals r ON r.referral_id = s.referral_id
+        LEFT JOIN users u ON u.tg_id = s.owner_client_id
+        ORDER BY s.conversions DESC, s.visits DESC
+        LIMIT $1
+    """, limit)
+    return [dict(r) for r in rows]
 
-        if not row:
-            return 0
 
-        return row["keyboard_version"]
+async def get_owner_referral_stats(owner_client_id: int) -> list[dict]:
+    """Статистика по ссылкам одного владельца."""
+    pool = get_pool(REPLICA_POOL)
+    rows = await pool.fetch("""
+        SELECT s.referral_id,
+               s.owner_client_id,
+               s.visits,
+               s.unique_visitors,
+               s.conversions,
+               s.paid_conversions,
+               r.code,
+               u.username AS owner_username
+        FROM referral_stats s
+        JOIN referrals r ON r.referral_id = s.referral_id
+        LEFT JOIN users u ON u.tg_id = s.owner_client_id
+        WHERE s.owner_client_id = $1
+    """, owner_client_id)
+    return [dict(r) for r in rows]
 
-async def set_keyboard_version(tg_id: int, version: int):
+
+# Version
+
+async def get_keyboard_version(tg_id: int):
+    row = await queries.fetchrow("keyboard_version", tg_id)
+    if not row:
+        return 0
+    return row["keyboard_version"]
+
+async def set_keyboard_version(tg_id: int, version: int) -> bool:
+    """Сохранить версию клавиатуры. False — пользователя ещё нет в БД."""
     pool = get_pool()
     async with pool.acquire() as conn:
-        await conn.execute(
+        status = await conn.execute(
             """
             UPDATE users
             SET keyboard_version = $1
@@ -120,4 +214,49 @@ async def set_keyboard_version(tg_id: int, version: int):
             """,
             version,
             tg_id
-        )
\ No newline at end of file
+        )
+    return status != "UPDATE 0"
+
+
+async def get_users_with_keyboard_version(version: int, limit: int) -> list[int]:
+    """tg_id не более limit недавно активных пользователей, у которых уже стоит указанная версия клавиатуры."""
+    pool = get_pool()
+    rows = await pool.fetch(
+        """
+        SELECT tg_id FROM users
+        WHERE keyboard_version = $1
+        ORDER BY last_seen DESC NULLS LAST
+        LIMIT $2
+        """,
+        version, limit
+    )
+    return [r["tg_id"] for r in rows]
+
+
+async def get_users_with_outdated_keyboard(version: int, after_tg_id: int, limit: int) -> list[dict]:
+    """
+    Очередная пачка пользователей со старой клавиатурой (keyset по tg_id).
+    Возвращает tg_id и role — роль нужна, чтобы собрать правильную клавиатуру.
+    """
+    pool = get_pool(BACKGROUND_POOL)
+    rows = await pool.fetch(
+        """
+        SELECT tg_id, role
+        FROM users
+        WHERE keyboard_version < $1
+          AND tg_id > $2
+        ORDER BY tg_id
+        LIMIT $3
+        """,
+        version, after_tg_id, limit
+    )
+    return [dict(r) for r in rows]
+
+
+async def set_keyboard_version_bulk(tg_ids: list[int], version: int) -> None:
+    """Проставить версию клавиатуры пачке пользователей одним запросом."""
+    pool = get_pool(BACKGROUND_POOL)
+    await pool.execute(
+        "UPDATE users SET keyboard_version = $1 WHERE tg_id = ANY($2::bigint[])",
+        version, tg_ids
+    )
@@ -0,0 +1,90 @@
+"""Полнотекстовый поиск по сообщениям тикетов."""
+from typing import Optional
+
+from database import get_pool, MESSAGES_TSVECTOR, REPLICA_POOL
+
+SEARCH_PAGE_SIZE = 10
+# Ранжируются только столько самых новых совпадений: ts_rank пересчитывает документ
+# каждой строки, и частое слово за год иначе ранжировало бы десятки тысяч сообщений
+SEARCH_CANDIDATES = 1000
+# Сколько дней хранится запрос для кнопки «Дальше»
+SEARCH_TTL_DAYS = 7
+
+
+async def create_search(query: str) -> dict:
+    """
+    Сохранить запрос /search и снимок последнего message_id.
+    Возвращает {"search_id", "query", "max_message_id"}; заодно удаляет запросы старше SEARCH_TTL_DAYS.
+    """
+    pool = get_pool()
+    row = await pool.fetchrow(
+        """
+        WITH expired AS (
+            DELETE FROM searches WHERE created_at < NOW() - make_interval(days => $2)
+        )
+        INSERT INTO searches (query, max_message_id)
+        VALUES ($1, (SELECT max(message_id) FROM messages))
+        RETURNING search_id, query, max_message_id
+        """,
+        query, SEARCH_TTL_DAYS,
+    )
+    return dict(row)
+
+
+async def get_search(search_id: int) -> Optional[dict]:
+    """Сохранённый запрос: {"query", "max_message_id"}; None — истёк или не существует."""
+    pool = get_pool()
+    row = await pool.fetchrow(
+        "SELECT query, max_message_id FROM searches WHERE search_id = $1", search_id
+    )
+    return dict(row) if row else None
+
+
+async def search_messages(
+    query: str,
+    limit: int = SEARCH_PAGE_SIZE,
+    after: Optional[tuple[float, int]] = None,
+    max_message_id: Optional[int] = None,
+) -> list:
+    """
+    Сообщения под запрос (синтаксис websearch: "фраза", -слово, or) по убыванию релевантности
+    среди SEARCH_CANDIDATES самых новых совпадений.
+    after — (rank, message_id) последнего результата предыдущей страницы;
+    max_message_id — снимок из create_search, чтобы страницы считались по одному набору.
+    """
+    after_rank, after_id = after if after else (None, None)
+    pool = get_pool(REPLICA_POOL)
+    return await pool.fetch(
+        f"""
+        WITH q AS (
+            SELECT websearch_to_tsquery('russian', $1) || websearch_to_tsquery('simple', $1) AS query
+        ),
+        candidates AS (
+            SELECT m.message_id, m.ticket_id, m.created_at, m.text, q.query
+            FROM messages m, q
+            WHERE {MESSAGES_TSVECTOR} @@ q.query
+              AND ($5::int IS NULL OR m.message_id <= $5)
+            ORDER BY m.created_at DESC, m.message_id DESC
+            LIMIT $6
+        ),
+        hits AS (
+            SELECT c.message_id, c.ticket_id, c.created_at, c.text,
+                   ts_rank({MESSAGES_TSVECTOR}, c.query) AS rank
+            FROM candidates c
+        )
+        SELECT h.message_id,
+               h.ticket_id,
+               h.created_at,
+               h.rank,
+               left(h.text, 200) AS snippet,
+               t.client_user_id,
+               u.username AS client_username
+        FROM hits h
+        JOIN tickets t ON t.ticket_id = h.ticket_id
+        LEFT JOIN users u ON u.tg_id = t.client_user_id
+        WHERE $2::real IS NULL OR (h.rank, h.message_id) < ($2::real, $3::int)
+        ORDER BY h.rank DESC, h.message_id DESC
+        LIMIT $4
+        """,
+        query, after_rank, after_id, limit, max_message_id, SEARCH_CANDIDATES,
+    )
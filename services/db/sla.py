@@ -1,5 +1,6 @@
 """Операции с БД."""
-from database import get_pool
+from services.db.records import Ticket, TICKET_COLUMNS
+from database import get_pool, BACKGROUND_POOL
 
 async def start_ticket_sla(ticket_id: int):
     """
@@ -33,27 +34,47 @@ async def stop_ticket_sla(ticket_id: int):
         )
 
 
-async def update_ticket_sla_stage(ticket_id: int, stage: int):
-    """
-    Обновить SLA-стадию тикета.
-    """
-    pool = get_pool()
+async def set_ticket_sla_stages(ticket_ids: list[int], stages: list[int]) -> None:
+    """Перевести тикеты на новые SLA-стадии одним UPDATE (пары ticket_ids[i] → stages[i])."""
+    if not ticket_ids:
+        return
+    pool = get_pool(BACKGROUND_POOL)
     async with pool.acquire() as conn:
         await conn.execute("""
-            UPDATE tickets
-            SET sla_stage = $2
-            WHERE ticket_id = $1
-        """, ticket_id, stage)
+            UPDATE tickets t
+            SET sla_stage = v.stage
+            FROM unnest($1::int[], $2::int[]) AS v(ticket_id, stage)
+            WHERE t.ticket_id = v.ticket_id
+        """, ticket_ids, stages)
 
-async def get_tickets_for_sla_check():
+async def get_tickets_for_sla_check(warning_minutes: int, admin_minutes: int, critical_minutes: int):
     """
-    Получить тикеты, для которых запущен SLA и нет первого ответа.
+    Тикеты без ответа, дошедшие до следующей SLA-стадии. Рабочие минуты с момента
+    отсчёта (создание, если тикет не взят, иначе sla_started_at) считает в БД
+    working_seconds(); в строке — колонки minutes_passed, client_username и support_username.
     """
-    pool = get_pool()
+    pool = get_pool(BACKGROUND_POOL)
     async with pool.acquire() as conn:
-        rows = await conn.fetch("""
-            SELECT *
-            FROM tickets
-            WHERE status IN ('OPEN', 'WAITING')
-        """)
-    return [dict(r) for r in rows]
+        return await conn.fetch(f"""
+            SELECT t.*,
+                   uc.username AS client_username,
+                   us.username AS support_username
+            FROM (
+                SELECT {TICKET_COLUMNS},
+                       working_seconds(
+                           CASE WHEN taken_at IS NULL THEN created_at ELSE sla_started_at END,
+                           NOW()
+                       ) / 60 AS minutes_passed
+                FROM tickets
+                WHERE status IN ('OPEN', 'WAITING')
+                  AND COALESCE(sla_stage, 0) < 3
+            ) t
+            LEFT JOIN users uc ON uc.tg_id = t.client_user_id
+            LEFT JOIN users us ON us.tg_id = t.assigned_to_support_id
+            WHERE t.minutes_passed >= CASE COALESCE(t.sla_stage, 0)
+                                          WHEN 0 THEN $1::int
+                                          WHEN 1 THEN $2::int
+                                          ELSE $3::int
+                                      END
+            ORDER BY t.ticket_id
+        """, warning_minutes, admin_minutes, critical_minutes, record_class=Ticket)
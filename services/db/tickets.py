@@ -4,9 +4,13 @@ import json
 import datetime
 from config import config
 
-from database import get_pool
+from database import get_pool, REPLICA_POOL
+from services.db import queries
 from constants import ClientType, TicketStatus
-from services.db.users import get_or_create_user
+from services.db.users import get_or_create_user, invalidate_role
+from services.db.records import (
+    Lead, Message, Ticket, LEAD_COLUMNS, MESSAGE_COLUMNS, TICKET_COLUMNS, columns,
+)
 
 
 async def get_or_create_active_ticket(client_tg_id: int) -> tuple[int, bool]:
@@ -18,15 +22,7 @@ async def get_or_create_active_ticket(client_tg_id: int) -> tuple[int, bool]:
 
     pool = get_pool()
     async with pool.acquire() as conn:
-        open_ticket = await conn.fetchrow(
-            """
-                SELECT ticket_id FROM tickets
-                WHERE client_user_id = $1 AND status IN ('DRAFT', 'OPEN', 'WAITING')
-                ORDER BY created_at DESC
-                LIMIT 1
-            """,
-            client_tg_id
-        )
+        open_ticket = await queries.fetchrow("active_ticket_of_client", client_tg_id, conn=conn)
         if open_ticket:
             return open_ticket["ticket_id"], False
 
@@ -55,28 +51,23 @@ async def add_message(
     text: str | None = None, media_type: str | None = None, media_file_id: str | None = None
 ) -> None:
     """Добавить сообщение в тикет."""
-    pool = get_pool()
-    await pool.execute(
-        """INSERT INTO messages (ticket_id, direction, author_user_id, text, media_type, media_file_id)
-           VALUES ($1, $2, $3, $4, $5, $6)""",
+    await queries.execute(
+        "message_insert",
         ticket_id, direction, author_user_id, text, media_type, media_file_id
     )
 
 
+async def claim_ticket(ticket_id: int, support_tg_id: int) -> Optional[Ticket]:
+    """
+    Атомарно взять тикет: один условный UPDATE, победитель получает обновлённую строку.
+    None — тикет уже взят (или не существует).
+    """
+    return await queries.fetchrow("ticket_claim", support_tg_id, ticket_id)
+
+
 async def take_ticket(ticket_id: int, support_tg_id: int) -> bool:
     """Взять тикет. False если уже взят."""
-    pool = get_pool()
-    row = await pool.fetchrow(
-        "SELECT assigned_to_support_id FROM tickets WHERE ticket_id = $1", ticket_id
-    )
-    if not row or row["assigned_to_support_id"]:
-        return False
-    await pool.execute(
-        """UPDATE tickets SET assigned_to_support_id = $1, taken_at = NOW(), status = 'WAITING'
-           WHERE ticket_id = $2""",
-        support_tg_id, ticket_id
-    )
-    return True
+    return await claim_ticket(ticket_id, support_tg_id) is not None
 
 
 async def set_ticket_thread_id(ticket_id: int, thread_id: int) -> None:
@@ -90,6 +81,18 @@ async def set_ticket_thread_id(ticket_id: int, thread_id: int) -> None:
 
 
 
+async def set_ticket_topic(ticket_id: int, thread_id: int, topic_card_message_id: int | None) -> None:
+    """Сохранить тему тикета и message_id карточки в ней одним запросом."""
+    pool = get_pool()
+    await pool.execute(
+        """UPDATE tickets
+           SET support_thread_id = $1,
+               ticket_topic_card_message_id = COALESCE($2, ticket_topic_card_message_id)
+           WHERE ticket_id = $3""",
+        thread_id, topic_card_message_id, ticket_id
+    )
+
+
 async def set_ticket_card_message_id(ticket_id: int, message_id: int) -> None:
     """Сохранить message_id карточки тикета в общем чате (для последующего удаления)."""
     pool = get_pool()
@@ -108,13 +111,22 @@ async def set_ticket_topic_card_message_id(ticket_id: int, message_id: int) -> N
     )
 
 
-async def get_ticket_by_thread_id(thread_id: int) -> Optional[dict]:
+async def get_ticket_by_thread_id(thread_id: int) -> Optional[Ticket]:
     """Найти тикет по ID темы в чате поддержки."""
     pool = get_pool()
-    row = await pool.fetchrow(
-        "SELECT * FROM tickets WHERE support_thread_id = $1", thread_id
+    return await pool.fetchrow(
+        f"SELECT {TICKET_COLUMNS} FROM tickets WHERE support_thread_id = $1",
+        thread_id, record_class=Ticket,
+    )
+
+
+async def get_open_ticket_threads() -> list:
+    """Темы незакрытых тикетов: (support_thread_id, ticket_id) — для прогрева индекса тем."""
+    pool = get_pool()
+    return await pool.fetch(
+        """SELECT support_thread_id, ticket_id FROM tickets
+           WHERE support_thread_id IS NOT NULL AND status != 'CLOSED'"""
     )
-    return dict(row) if row else None
 
 
 async def set_first_reply_if_needed(ticket_id: int) -> None:
@@ -150,35 +162,33 @@ async def update_ticket_status(ticket_id: int, status: str) -> None:
             status, ticket_id
         )
 
-async def get_ticket(ticket_id: int) -> Optional[dict]:
+async def get_ticket(ticket_id: int) -> Optional[Ticket]:
     """Получить тикет."""
-    pool = get_pool()
-    row = await pool.fetchrow("SELECT * FROM tickets WHERE ticket_id = $1", ticket_id)
-    return dict(row) if row else None
+    return await queries.fetchrow("ticket_by_id", ticket_id)
 
 
-async def get_ticket_messages(ticket_id: int, limit: int = 30) -> list[dict]:
+async def get_ticket_messages(ticket_id: int, limit: int = 30) -> list[Message]:
     """Последние N сообщений тикета."""
     pool = get_pool()
     rows = await pool.fetch(
-        """SELECT m.*, u.username
+        f"""SELECT {columns(MESSAGE_COLUMNS, "m")}, u.username
            FROM messages m
            LEFT JOIN users u ON u.tg_id = m.author_user_id
            WHERE m.ticket_id = $1
            ORDER BY m.created_at DESC
            LIMIT $2""",
-        ticket_id, limit
+        ticket_id, limit, record_class=Message,
     )
-    return [dict(r) for r in reversed(rows)]
+    rows.reverse()
+    return rows
 
-async def get_history_messages_full(client_tg_id: int) -> list[dict]:
+async def get_history_messages_full(client_tg_id: int) -> list[Message]:
     pool = get_pool()
     async with pool.acquire() as conn:
-        rows = await conn.fetch(
-            """
+        return await conn.fetch(
+            f"""
             SELECT
-                m.*,
-                t.ticket_id,
+                {columns(MESSAGE_COLUMNS, "m")},
                 u.username
             FROM messages m
             JOIN tickets t ON t.ticket_id = m.ticket_id
@@ -186,9 +196,8 @@ async def get_history_messages_full(client_tg_id: int) -> list[dict]:
             WHERE t.client_user_id = $1
             ORDER BY m.created_at ASC
             """,
-            client_tg_id
+            client_tg_id, record_class=Message,
         )
-    return [dict(r) for r in rows]
 
 async def get_client_username(tg_id: int) -> str | None:
     """Получить username клиента."""
@@ -207,10 +216,41 @@ async def get_all_supports() -> list[dict]:
     """
     Возвращает список всех саппортов с tg_id и username
     """
-    pool = await get_pool()
+    pool = get_pool()
     rows = await pool.fetch("SELECT tg_id, username FROM users WHERE role = 'support'")
     return [{"tg_id": r["tg_id"], "username": r["username"]} for r in rows]
 
+async def get_supports_page(
+    limit: int,
+    after: Optional[int] = None,
+    before: Optional[int] = None,
+) -> tuple[list[dict], bool, bool]:
+    """
+    Страница саппортов по tg_id (для /statistik). after — tg_id последнего на предыдущей
+    странице, before — первого на следующей. Возвращает (supports, has_prev, has_next).
+    """
+    pool = get_pool()
+    if before is not None:
+        rows = await pool.fetch(
+            """SELECT tg_id, username FROM users
+               WHERE role = 'support' AND tg_id < $1
+               ORDER BY tg_id DESC LIMIT $2""",
+            before, limit + 1,
+        )
+    else:
+        rows = await pool.fetch(
+            """SELECT tg_id, username FROM users
+               WHERE role = 'support' AND ($1::bigint IS NULL OR tg_id > $1)
+               ORDER BY tg_id LIMIT $2""",
+            after, limit + 1,
+        )
+    has_more = len(rows) > limit
+    supports = [{"tg_id": r["tg_id"], "username": r["username"]} for r in rows[:limit]]
+    if before is not None:
+        supports.reverse()
+        return supports, has_more, True
+    return supports, after is not None, has_more
+
 async def set_role(tg_id: int, role: str) -> None:
     """Установить роль (admin только). Создаёт пользователя, если нет."""
     pool = get_pool()
@@ -219,6 +259,7 @@ async def set_role(tg_id: int, role: str) -> None:
            ON CONFLICT (tg_id) DO UPDATE SET role = EXCLUDED.role""",
         tg_id, role
     )
+    invalidate_role(tg_id)
 
 # ----------------------
 # Получить tg_id пользователя по username (только support/admin)
@@ -238,89 +279,148 @@ async def get_user_id_by_username(username: str) -> int | None:
     return row["tg_id"] if row else None
 
 # ----------------------
-# Получить все открытые тикеты саппорта
+# Передать тикеты другому саппорту
 # ----------------------
-async def get_open_tickets_by_support(support_id: int) -> list[dict]:
+async def transfer_tickets(
+    from_support_id: int,
+    to_support_id: int,
+    statuses: Optional[list[str]] = None,
+    ticket_ids: Optional[list[int]] = None,
+) -> list[Ticket]:
+    """
+    Передать незакрытые тикеты саппорта другому одним UPDATE; statuses и ticket_ids
+    сужают выборку (None — без фильтра). Возвращает переданные тикеты.
+    """
     pool = get_pool()
-    rows = await pool.fetch(
-        """
-        SELECT *
-        FROM tickets
+    return await pool.fetch(
+        f"""
+        UPDATE tickets
+        SET assigned_to_support_id = $2
         WHERE assigned_to_support_id = $1
           AND status != 'CLOSED'
+          AND ($3::text[] IS NULL OR status = ANY($3::text[]))
+          AND ($4::int[] IS NULL OR ticket_id = ANY($4::int[]))
+        RETURNING {TICKET_COLUMNS}
         """,
-        support_id,
-    )
-    return [dict(r) for r in rows]
-
-# ----------------------
-# Передать тикет другому саппорту
-# ----------------------
-async def transfer_ticket(ticket_id: int, new_support_id: int) -> None:
-    pool = get_pool()
-    await pool.execute(
-        """
-        UPDATE tickets
-        SET assigned_to_support_id = $1
-        WHERE ticket_id = $2
-        """,
-        new_support_id, ticket_id,
+        from_support_id, to_support_id, statuses, ticket_ids, record_class=Ticket,
     )
 
 
-async def get_active_ticket_by_client(tg_id: int) -> Optional[dict]:
+async def get_active_ticket_by_client(tg_id: int) -> Optional[Ticket]:
     """Активный тикет клиента."""
     pool = get_pool()
-    row = await pool.fetchrow(
-        """
-        SELECT *
+    return await pool.fetchrow(
+        f"""
+        SELECT {TICKET_COLUMNS}
         FROM tickets
         WHERE client_user_id = $1
           AND status IN ('OPEN', 'WAITING')
         ORDER BY created_at DESC
         LIMIT 1
         """,
-        tg_id
+        tg_id, record_class=Ticket,
     )
-    return dict(row) if row else None
 
-async def get_tickets_by_status(status: str) -> list[dict]:
+TICKETS_PAGE_SIZE = 10
+# Курсор первой страницы: раньше любого created_at
+_FIRST_PAGE = (datetime.datetime.min.replace(tzinfo=datetime.timezone.utc), 0)
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def encode_ticket_cursor(row) -> str:
+    """Курсор страницы тикетов для callback_data: «микросекунды_created_at.ticket_id»."""
+    micros = (row["created_at"] - _EPOCH) // datetime.timedelta(microseconds=1)
+    return f"{micros}.{row['ticket_id']}"
+
+
+def decode_ticket_cursor(value: str) -> tuple[datetime.datetime, int]:
+    micros, ticket_id = value.split(".")
+    return _EPOCH + datetime.timedelta(microseconds=int(micros)), int(ticket_id)
+
+
+async def _tickets_page(
+    where: str,
+    args: tuple,
+    after: Optional[tuple[datetime.datetime, int]],
+    before: Optional[tuple[datetime.datetime, int]],
+    limit: int,
+    pool_name: Optional[str] = None,
+) -> tuple[list, bool, bool]:
     """
-    Получить список тикетов по статусу OPEN или WAITING
+    Страница тикетов по ключу (created_at, ticket_id), без OFFSET: каждая страница —
+    один проход по индексу от курсора. after — последний тикет предыдущей страницы,
+    before — первый тикет следующей (листание назад). Возвращает (rows, has_prev, has_next).
     """
-    pool = get_pool()
+    if before is not None:
+        op, order, cursor = "<", "DESC", before
+    else:
+        op, order, cursor = ">", "ASC", after or _FIRST_PAGE
+    n = len(args)
+    pool = get_pool(pool_name) if pool_name else get_pool()
     rows = await pool.fetch(
-        """
+        f"""
         SELECT
             t.ticket_id,
             t.status,
             t.client_user_id,
             t.assigned_to_support_id,
+            t.created_at,
             uc.username AS client_username,
             us.username AS support_username
         FROM tickets t
         LEFT JOIN users uc ON uc.tg_id = t.client_user_id
         LEFT JOIN users us ON us.tg_id = t.assigned_to_support_id
-        WHERE t.status = $1
-        ORDER BY t.created_at ASC
+        WHERE {where}
+          AND (t.created_at, t.ticket_id) {op} (${n + 1}, ${n + 2})
+        ORDER BY t.created_at {order}, t.ticket_id {order}
+        LIMIT ${n + 3}
         """,
-        status
+        *args, *cursor, limit + 1,
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before is not None:
+        rows.reverse()
+        return rows, has_more, True
+    return rows, after is not None, has_more
+
+
+async def get_tickets_by_status(
+    status: str,
+    limit: int = TICKETS_PAGE_SIZE,
+    after: Optional[tuple[datetime.datetime, int]] = None,
+    before: Optional[tuple[datetime.datetime, int]] = None,
+) -> tuple[list, bool, bool]:
+    """
+    Страница тикетов со статусом OPEN или WAITING, старые первыми (с реплики: список для админа).
+    Возвращает (rows, has_prev, has_next).
+    """
+    return await _tickets_page("t.status = $1", (status,), after, before, limit, REPLICA_POOL)
+
+
+async def get_support_tickets_page(
+    support_tg_id: int,
+    limit: int = TICKETS_PAGE_SIZE,
+    after: Optional[tuple[datetime.datetime, int]] = None,
+    before: Optional[tuple[datetime.datetime, int]] = None,
+) -> tuple[list, bool, bool]:
+    """Страница тикетов саппорта в работе (/my_tickets). Возвращает (rows, has_prev, has_next)."""
+    return await _tickets_page(
+        "t.assigned_to_support_id = $1 AND t.status = 'WAITING'", (support_tg_id,), after, before, limit
     )
-    return [dict(r) for r in rows]
 
-async def get_support_active_tickets(support_tg_id: int) -> list[dict]:
+async def get_support_active_tickets(support_tg_id: int) -> list[Ticket]:
     pool = get_pool()
-    rows = await pool.fetch(
-        """
-        SELECT *
+    return await pool.fetch(
+        f"""
+        SELECT {TICKET_COLUMNS}
         FROM tickets
         WHERE assigned_to_support_id = $1
           AND status IN ('WAITING')
         ORDER BY taken_at ASC
         """,
-        support_tg_id
+        support_tg_id, record_class=Ticket,
     )
-    return [dict(r) for r in rows]
 
 async def set_client_type(tg_id: int, client_type: ClientType) -> None:
     """Обновить client_type пользователя: NEW → EXISTING."""
@@ -350,15 +450,13 @@ async def upsert_user_with_client_type(
     """, tg_id, username, client_type.value)
 
 
-async def get_lead_by_client_tg_id(client_tg_id: int) -> dict | None:
+async def get_lead_by_client_tg_id(client_tg_id: int) -> Lead | None:
     pool = get_pool()
-    row = await pool.fetchrow(
-        "SELECT * FROM leads WHERE tg_id = $1",
-        client_tg_id
+    return await pool.fetchrow(
+        f"SELECT {LEAD_COLUMNS} FROM leads WHERE tg_id = $1",
+        client_tg_id, record_class=Lead,
     )
 
-    return dict(row) if row else None
-
 async def mark_user_active(tg_id: int):
     pool = get_pool()
     async with pool.acquire() as conn:
@@ -1,7 +1,19 @@
 """Операции с БД."""
+import time
 from typing import Optional
+from config import config
 from database import get_pool
+from services.db import queries
 from constants import ClientType
+from services.db.crm_outbox import enqueue_crm_event
+from services.crm import build_client_payload
+from services.db.referals import record_referral_payment
+from services.db.records import User
+from utils.lru_cache import LRUCache
+
+# tg_id → (роль, момент устаревания по time.monotonic()). Роль проверяет почти каждый
+# обработчик; set_role сбрасывает запись сразу, смена роли на другой реплике видна через TTL
+_role_cache = LRUCache(config.role_cache_size)
 
 
 async def get_or_create_user(
@@ -9,37 +21,22 @@ async def get_or_create_user(
     username: str | None = None,
     role: str = "client",
     admin_ids: list[int] | None = None,
-) -> tuple[dict, ClientType, bool]:
+) -> tuple[User, ClientType, bool]:
 
     pool = get_pool()
 
     async with pool.acquire() as conn:
-        row = await conn.fetchrow(
-            "SELECT * FROM users WHERE tg_id = $1",
-            tg_id
-        )
+        row = await queries.fetchrow("user_by_id", tg_id, conn=conn)
 
         if row:
-            await conn.execute(
-                """
-                UPDATE users
-                SET username = $1,
-                    last_seen = NOW()
-                WHERE tg_id = $2
-                """,
-                username or row["username"],
-                tg_id
-            )
+            await queries.execute("user_touch", username or row["username"], tg_id, conn=conn)
 
-            row = await conn.fetchrow(
-                "SELECT * FROM users WHERE tg_id = $1",
-                tg_id
-            )
+            row = await queries.fetchrow("user_by_id", tg_id, conn=conn)
 
             client_type = ClientType(row["client_type"])
             is_paid = row.get("is_paid", False)
 
-            return dict(row), client_type, is_paid
+            return row, client_type, is_paid
 
         # если пользователя нет
         initial_role = "admin" if (admin_ids and tg_id in admin_ids) else role
@@ -55,12 +52,9 @@ async def get_or_create_user(
             ClientType.NEW.value,
         )
 
-        row = await conn.fetchrow(
-            "SELECT * FROM users WHERE tg_id = $1",
-            tg_id
-        )
+        row = await queries.fetchrow("user_by_id", tg_id, conn=conn)
 
-        return dict(row), ClientType.NEW, False
+        return row, ClientType.NEW, False
 
 
 
@@ -82,31 +76,108 @@ async def get_user_client_type(tg_id: int) -> str:
 
 async def get_user_role(tg_id: int, admin_ids: list[int] | None = None) -> Optional[str]:
     """Получить роль пользователя. admin_ids — первичные админы из config."""
-    pool = get_pool()
-    row = await pool.fetchrow("SELECT role FROM users WHERE tg_id = $1", tg_id)
-    if row:
-        return row["role"]
+    cached = _role_cache.get(tg_id)
+    if cached is not None and cached[1] > time.monotonic():
+        role = cached[0]
+    else:
+        row = await queries.fetchrow("user_role", tg_id)
+        role = row["role"] if row else None
+        # Отсутствующего пользователя не кэшируем: он вот-вот появится
+        if row:
+            cache_role(tg_id, role)
+    if role:
+        return role
     if admin_ids and tg_id in admin_ids:
         return "admin"
     return None
 
 
+def cache_role(tg_id: int, role: Optional[str]) -> None:
+    _role_cache.set(tg_id, (role, time.monotonic() + config.role_cache_ttl_seconds))
+
+
+def invalidate_role(tg_id: int) -> None:
+    _role_cache.pop(tg_id)
+
+
+def clear_role_cache() -> None:
+    _role_cache.clear()
 
 
-async def mark_user_as_paid(tg_id: int) -> None:
+async def warm_role_cache() -> int:
+    """Роли сотрудников и недавно активных пользователей — в кэш при старте. Возвращает количество."""
+    pool = get_pool()
+    rows = await pool.fetch(
+        """
+        SELECT tg_id, role
+        FROM users
+        WHERE role IN ('support', 'admin')
+           OR last_seen > NOW() - interval '1 day'
+        ORDER BY role IN ('support', 'admin') DESC, last_seen DESC NULLS LAST
+        LIMIT $1
+        """,
+        config.role_cache_size,
+    )
+    for r in rows:
+        cache_role(r["tg_id"], r["role"])
+    return len(rows)
+
+
+async def set_support_online(tg_id: int, online: bool) -> None:
+    """Отметить саппорта в сети (кандидат для автоназначения) или не в сети."""
     pool = get_pool()
     await pool.execute(
         """
         UPDATE users
-        SET is_paid = TRUE,
-            client_type = $1
-        WHERE tg_id = $2
+        SET online_since = CASE WHEN $2 THEN COALESCE(online_since, NOW()) END
+        WHERE tg_id = $1
         """,
-        ClientType.EXISTING.value,
-        tg_id
+        tg_id, online
     )
 
 
+async def get_online_support_loads() -> list:
+    """Саппорты в сети и число их тикетов в работе (WAITING): tg_id, username, load."""
+    pool = get_pool()
+    return await pool.fetch(
+        """
+        SELECT u.tg_id, u.username, COUNT(t.ticket_id) AS load
+        FROM users u
+        LEFT JOIN tickets t
+          ON t.assigned_to_support_id = u.tg_id
+         AND t.status = 'WAITING'
+        WHERE u.role IN ('support', 'admin')
+          AND u.online_since IS NOT NULL
+        GROUP BY u.tg_id, u.username
+        """
+    )
+
+
+
+
+async def mark_user_as_paid(
+    tg_id: int, lead_id: int | None = None, username: str | None = None
+) -> None:
+    """Отметить оплату и поставить карточку клиента в CRM outbox одной транзакцией."""
+    pool = get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute(
+                """
+                UPDATE users
+                SET is_paid = TRUE,
+                    client_type = $1
+                WHERE tg_id = $2
+                """,
+                ClientType.EXISTING.value,
+                tg_id
+            )
+            await enqueue_crm_event(
+                conn, "client", build_client_payload(lead_id, tg_id, username)
+            )
+            await record_referral_payment(conn, tg_id)
+
+
 async def get_users_by_type(client_type: str) -> list[int]:
     """
     Возвращает список tg_id пользователей по client_type:
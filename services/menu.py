@@ -1,22 +1,59 @@
+import asyncio
+import logging
+
 from keyboards import main_keyboard
 from config import config
-from services.db.referals import get_keyboard_version, set_keyboard_version
+from constants import MSG_KEYBOARD_UPDATED
+from services.db.referals import (
+    get_keyboard_version,
+    set_keyboard_version,
+    get_users_with_keyboard_version,
+    get_users_with_outdated_keyboard,
+    set_keyboard_version_bulk,
+)
 from services.db.users import get_user_role
+from utils.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
 
 KEYBOARD_VERSION = 3
 
+# tg_id пользователей, у которых уже KEYBOARD_VERSION. Версия только растёт,
+# поэтому попадание в реестр не устаревает — проверка на горячем пути без запросов.
+# Реестр ограничен (LRU): вытесненный пользователь стоит одного запроса при следующем апдейте.
+_actual_keyboard = LRUCache(config.keyboard_registry_size)
+
+
+def _mark_actual(tg_ids) -> None:
+    for tg_id in tg_ids:
+        _actual_keyboard.set(tg_id, True)
+
+
+async def warm_keyboard_registry() -> int:
+    """Заполнить реестр при старте недавно активными пользователями. Возвращает их количество."""
+    tg_ids = await get_users_with_keyboard_version(KEYBOARD_VERSION, _actual_keyboard.maxsize)
+    # Самые активные — последними, чтобы вытеснялись позже всех
+    _mark_actual(reversed(tg_ids))
+    return len(tg_ids)
+
+
 async def ensure_actual_keyboard(bot, user_id: int, message_id: int | None = None):
     """
     Обновляет клавиатуру, если версия устарела.
     Для новых пользователей (message_id=None) просто сохраняем версию.
     Для активных пользователей — редактируем reply_markup без отправки текста.
     """
+    if _actual_keyboard.get(user_id):
+        return
+
     current = await get_keyboard_version(user_id)
     if current == KEYBOARD_VERSION:
+        _actual_keyboard.set(user_id, True)
         return
 
-    # Сохраняем новую версию в БД
-    await set_keyboard_version(user_id, KEYBOARD_VERSION)
+    # Сохраняем новую версию в БД (пользователя может ещё не быть — тогда проверим позже)
+    if await set_keyboard_version(user_id, KEYBOARD_VERSION):
+        _actual_keyboard.set(user_id, True)
 
     # Если нет message_id — считаем, что пользователь только пришёл → ничего не отправляем
     if not message_id:
@@ -32,4 +69,55 @@ async def ensure_actual_keyboard(bot, user_id: int, message_id: int | None = Non
         )
     except Exception:
         # Игнорируем ошибки (например, если сообщение старое или удалено)
-        pass
\ No newline at end of file
+        pass
+
+
+async def migrate_keyboards(bot) -> int:
+    """
+    Разослать новую клавиатуру всем, у кого старая версия, пачками.
+    Версия сохраняется одним UPDATE на пачку; темп — как у рассылки (пачка в секунду).
+    Возвращает количество обработанных пользователей.
+    """
+    batch_size = config.keyboard_migration_batch_size
+    after_tg_id = 0
+    total = 0
+
+    while True:
+        users = await get_users_with_outdated_keyboard(KEYBOARD_VERSION, after_tg_id, batch_size)
+        if not users:
+            break
+
+        for u in users:
+            try:
+                await bot.send_message(
+                    u["tg_id"],
+                    MSG_KEYBOARD_UPDATED,
+                    reply_markup=main_keyboard(u["role"]),
+                )
+            except Exception as e:
+                # Заблокировал бота и т.п. — версию всё равно фиксируем, чтобы не повторять
+                logger.debug("Клавиатура не доставлена uid=%s: %s", u["tg_id"], e)
+
+        tg_ids = [u["tg_id"] for u in users]
+        await set_keyboard_version_bulk(tg_ids, KEYBOARD_VERSION)
+        _mark_actual(tg_ids)
+        total += len(tg_ids)
+        after_tg_id = tg_ids[-1]
+        await asyncio.sleep(1.0)
+
+    return total
+
+
+async def keyboard_migration_worker(bot):
+    """Фоновая миграция клавиатур после повышения KEYBOARD_VERSION."""
+    CHECK_INTERVAL = 3600
+
+    while True:
+        try:
+            migrated = await migrate_keyboards(bot)
+            if migrated:
+                logger.info("Клавиатура v%s разослана %s пользователям", KEYBOARD_VERSION, migrated)
+        except Exception as e:
+            logger.exception("Keyboard migration error: %s", e)
+
+        await asyncio.sleep(CHECK_INTERVAL)
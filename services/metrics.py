@@ -0,0 +1,234 @@
+"""
+Метрики процесса в текстовом формате Prometheus и HTTP-эндпоинты /metrics, /healthz, /readyz.
+
+Счётчики и гистограммы живут в памяти процесса; запись — пара операций со словарём.
+Значения, которые дешевле снять в момент запроса (пул, очереди), собирают коллекторы.
+"""
+import logging
+import math
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Iterable
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_metrics: list["_Metric"] = []
+_collectors: list[Callable[[], Awaitable[None]]] = []
+_readiness_checks: dict[str, Callable[[], Awaitable[bool]]] = {}
+_ready = False
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _metrics.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+            for key, v in self._values.items()
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # {labels: [счётчики по бакетам..., сумма, количество]}
+        self._values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        data = self._values.get(key)
+        if data is None:
+            data = self._values[key] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                data[i] += 1
+                break
+        data[-2] += value
+        data[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> list[str]:
+        lines = []
+        for key, data in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, data):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, inf)} {int(data[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(data[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {int(data[-1])}")
+        return lines
+
+
+# --- Метрики бота ---
+
+UPDATE_LATENCY = Histogram(
+    "bot_update_handling_seconds", "Время обработки апдейта обработчиком", ["router", "event"]
+)
+UPDATES_TOTAL = Histogram(
+    "bot_update_total_seconds", "Полное время апдейта, включая фильтры и middleware", ["event"]
+)
+API_LATENCY = Histogram("bot_api_request_seconds", "Время запроса к Bot API", ["method"])
+API_ERRORS = Counter("bot_api_errors_total", "Ошибки запросов к Bot API", ["method", "error"])
+
+DB_POOL_SIZE = Gauge("db_pool_size", "Открытых соединений в пуле", ["pool"])
+DB_POOL_IDLE = Gauge("db_pool_idle", "Свободных соединений в пуле", ["pool"])
+DB_POOL_MAX = Gauge("db_pool_max_size", "Максимальный размер пула", ["pool"])
+DB_POOL_ACQUIRE_WAIT = Histogram(
+    "db_pool_acquire_seconds", "Ожидание соединения из пула", ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+DB_REPLICA_LAG = Gauge("db_replica_lag_seconds", "Отставание read-реплики; -1 — реплика недоступна")
+DB_POOL_ACQUIRE_TIMEOUTS = Counter(
+    "db_pool_acquire_timeouts_total", "Не дождались соединения из пула", ["pool"]
+)
+
+WORKER_SWEEP = Histogram("worker_sweep_seconds", "Длительность прохода фонового воркера", ["worker"])
+
+BROADCAST_RECIPIENTS = Gauge("broadcast_recipients", "Получателей в текущей рассылке")
+BROADCAST_SENT = Gauge("broadcast_sent", "Доставлено в текущей рассылке")
+BROADCAST_FAILED = Gauge("broadcast_failed", "Не доставлено в текущей рассылке")
+
+OUTBOX_PENDING = Gauge("crm_outbox_pending", "Недоставленных событий CRM outbox", ["sink"])
+
+
+def register_collector(collector: Callable[[], Awaitable[None]]) -> None:
+    """Корутина, обновляющая gauge перед каждой выдачей /metrics."""
+    _collectors.append(collector)
+
+
+def register_readiness_check(name: str, check: Callable[[], Awaitable[bool]]) -> None:
+    _readiness_checks[name] = check
+
+
+def set_ready(ready: bool = True) -> None:
+    """Процесс закончил запуск и принимает апдейты."""
+    global _ready
+    _ready = ready
+
+
+async def render() -> str:
+    for collector in _collectors:
+        try:
+            await collector()
+        except Exception as e:
+            logger.warning("Metrics collector %s failed: %s", getattr(collector, "__name__", collector), e)
+    lines: list[str] = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+async def _metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=await render(), content_type="text/plain", charset="utf-8")
+
+
+async def _healthz_handler(request: web.Request) -> web.Response:
+    return web.Response(text="ok")
+
+
+async def _readyz_handler(request: web.Request) -> web.Response:
+    failed = [] if _ready else ["startup"]
+    for name, check in _readiness_checks.items():
+        try:
+            if not await check():
+                failed.append(name)
+        except Exception:
+            failed.append(name)
+    if failed:
+        return web.Response(status=503, text="not ready: " + ", ".join(failed))
+    return web.Response(text="ready")
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Поднять HTTP-сервер метрик. Вернуть runner для остановки (runner.cleanup())."""
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_handler)
+    app.router.add_get("/healthz", _healthz_handler)
+    app.router.add_get("/readyz", _readyz_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Метрики доступны на http://%s:%s/metrics", host, port)
+    return runner
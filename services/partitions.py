@@ -0,0 +1,28 @@
+"""Обслуживание секций messages: секции будущих месяцев создаются заранее."""
+import asyncio
+import logging
+import time
+
+from config import config
+from database import get_pool, ensure_message_partitions, BACKGROUND_POOL
+from services.metrics import WORKER_SWEEP
+
+logger = logging.getLogger(__name__)
+
+
+async def partition_worker():
+    """Раз в сутки досоздать секции messages на MESSAGES_PARTITIONS_AHEAD месяцев вперёд."""
+    CHECK_INTERVAL = 86400
+
+    while True:
+        sweep_started = time.perf_counter()
+        try:
+            async with get_pool(BACKGROUND_POOL).acquire() as conn:
+                created = await ensure_message_partitions(conn, config.messages_partitions_ahead)
+            if created:
+                logger.info("Созданы секции messages: %s", ", ".join(created))
+        except Exception as e:
+            logger.exception("Partition maintenance error: %s", e)
+        WORKER_SWEEP.observe(time.perf_counter() - sweep_started, worker="partitions")
+
+        await asyncio.sleep(CHECK_INTERVAL)
@@ -0,0 +1,116 @@
+"""
+Диагностика на живом процессе: сэмплирующий профайлер потока event loop
+и дамп asyncio-задач со стеками и состоянием пула/очередей.
+"""
+import asyncio
+import io
+import sys
+import threading
+import time
+from collections import Counter
+
+from database import iter_pools
+from services.db.crm_outbox import count_pending_crm_events
+from services.db.instrumentation import get_fingerprint_stats
+from services.metrics import BROADCAST_RECIPIENTS, BROADCAST_SENT, BROADCAST_FAILED
+
+DEFAULT_INTERVAL = 0.005
+MAX_PROFILE_SECONDS = 60
+
+_profile_lock = asyncio.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename.rsplit("/", 1)[-1]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _sample(thread_id: int, seconds: float, interval: float) -> tuple[Counter, int]:
+    """Снимать стек потока thread_id каждые interval секунд. Вызывается в отдельном потоке."""
+    stacks: Counter[str] = Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            stacks[";".join(reversed(labels))] += 1
+            samples += 1
+        time.sleep(interval)
+    return stacks, samples
+
+
+def format_collapsed(stacks: Counter) -> str:
+    """Формат collapsed stacks (flamegraph.pl, speedscope): «f1;f2;f3 count» построчно."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def profile_busy() -> bool:
+    return _profile_lock.locked()
+
+
+async def profile_event_loop(seconds: float, interval: float = DEFAULT_INTERVAL) -> tuple[str, int]:
+    """
+    Профилировать поток event loop seconds секунд.
+    Сэмплер работает в своём потоке, loop в это время обслуживает апдейты как обычно.
+    Возвращает (collapsed stacks, число сэмплов).
+    """
+    seconds = max(1.0, min(float(seconds), MAX_PROFILE_SECONDS))
+    loop_thread_id = threading.get_ident()
+    async with _profile_lock:
+        stacks, samples = await asyncio.to_thread(_sample, loop_thread_id, seconds, interval)
+    return format_collapsed(stacks), samples
+
+
+def dump_tasks(limit: int = 30) -> str:
+    """Живые asyncio-задачи со стеками корутин (limit кадров на задачу)."""
+    tasks = sorted(asyncio.all_tasks(), key=lambda t: t.get_name())
+    out = io.StringIO()
+    out.write(f"Задач: {len(tasks)}\n\n")
+    for task in tasks:
+        coro = task.get_coro()
+        name = getattr(coro, "__qualname__", repr(coro))
+        state = "done" if task.done() else "pending"
+        out.write(f"=== {task.get_name()} — {name} [{state}]\n")
+        task.print_stack(limit=limit, file=out)
+        out.write("\n")
+    return out.getvalue()
+
+
+async def runtime_stats() -> str:
+    """Пул БД, очереди и самые затратные запросы — шапка к дампу задач."""
+    lines = []
+    pools = iter_pools()
+    for name, pool in pools:
+        lines.append(
+            f"Пул БД {name}: {pool.get_size()} соединений, свободно {pool.get_idle_size()}, "
+            f"максимум {pool.get_max_size()}"
+        )
+    if pools:
+        try:
+            pending = await count_pending_crm_events()
+            lines.append(f"CRM outbox: {pending or 'пусто'}")
+        except Exception as e:
+            lines.append(f"CRM outbox: ошибка {e}")
+
+    recipients = BROADCAST_RECIPIENTS.value()
+    if recipients:
+        lines.append(
+            f"Рассылка: {BROADCAST_SENT.value():.0f}/{recipients:.0f}, "
+            f"не доставлено {BROADCAST_FAILED.value():.0f}"
+        )
+
+    top = get_fingerprint_stats(limit=10)
+    if top:
+        lines.append("")
+        lines.append("Запросы по суммарному времени:")
+        for name, fp, stats in top:
+            lines.append(
+                f"{stats.total_time * 1000:9.1f} ms  {stats.calls:7}x  max {stats.max_time * 1000:7.1f} ms  "
+                f"[{name}] {fp[:160]}"
+            )
+    return "\n".join(lines)
@@ -1,7 +1,9 @@
 import asyncio
+import time
 from datetime import datetime, timedelta, timezone
 from constants import ONE_PING_USER, TWO_PING_USER, FHREE_PING_USER, FOUR_PING_USER, FIVE_PING_USER
-from database import get_pool
+from database import get_pool, BACKGROUND_POOL
+from services.metrics import WORKER_SWEEP
 
 MESSAGES = [
     (30, ONE_PING_USER),
@@ -15,7 +17,8 @@ async def reminder_worker(bot):
     while True:
         await asyncio.sleep(600)  # проверяем каждые 30 сек для теста
 
-        pool = get_pool()
+        sweep_started = time.perf_counter()
+        pool = get_pool(BACKGROUND_POOL)
 
         async with pool.acquire() as conn:
             users = await conn.fetch("""
@@ -60,8 +63,9 @@ async def reminder_worker(bot):
                             JOIN tickets t ON m.ticket_id = t.ticket_id
                             WHERE t.client_user_id = $1
                               AND m.direction = 'OUT'
+                              AND m.created_at >= $2
                             LIMIT 1
-                        """, tg_id)
+                        """, tg_id, created)
 
                     if support_replied:
                         continue
@@ -77,4 +81,6 @@ async def reminder_worker(bot):
                             """, tg_id)
 
                     except Exception:
-                        pass
\ No newline at end of file
+                        pass
+
+        WORKER_SWEEP.observe(time.perf_counter() - sweep_started, worker="reminders")
@@ -0,0 +1,143 @@
+"""Запись в Google Sheets: кэшированный клиент и пакетный append_rows."""
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+
+def _authorize() -> Any:
+    """Авторизованный gspread-клиент по сервисному аккаунту из config."""
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    creds = Credentials.from_service_account_file(
+        config.google_credentials_file, scopes=SCOPES
+    )
+    return gspread.authorize(creds)
+
+
+def _created_at(payload: dict) -> str:
+    raw = payload.get("created_at")
+    try:
+        dt = datetime.fromisoformat(raw.rstrip("Z"))
+    except (AttributeError, ValueError):
+        dt = datetime.utcnow()
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def lead_row(payload: dict) -> list:
+    """Строка листа лидов: lead_id, tg_id, username, created_at, status, answer_1..answer_9."""
+    answers = payload.get("answers") or {}
+    row = [
+        payload["lead_id"],
+        payload["tg_id"],
+        payload.get("username") or "",
+        _created_at(payload),
+        "NEW_LEAD",
+    ]
+    for i in range(1, 10):
+        val = answers.get(str(i))
+        if isinstance(val, dict):
+            text = (val.get("text") or "").strip()
+            if not text and val.get("media_type"):
+                text = "(медиа)"
+            row.append(text or "")
+        else:
+            row.append(str(val) if val is not None else "")
+    return row
+
+
+def client_row(payload: dict) -> list:
+    """Строка листа клиентов: lead_id, tg_id, username, created_at, status."""
+    return [
+        payload["lead_id"],
+        payload["tg_id"],
+        payload.get("username") or "",
+        _created_at(payload),
+        "Client",
+    ]
+
+
+class SheetsSink:
+    """
+    Клиент gspread и листы кэшируются между записями (токен сервисного аккаунта
+    gspread обновляет сам). Строки пишутся одним append_rows на лист. Все вызовы
+    gspread идут в отдельном ограниченном executor, а не в общем пуле потоков.
+    """
+
+    def __init__(
+        self,
+        spreadsheet_id: str,
+        client_factory: Callable[[], Any] = _authorize,
+        max_workers: int = 1,
+    ):
+        self._spreadsheet_id = spreadsheet_id
+        self._client_factory = client_factory
+        self._client = None
+        self._worksheets: dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sheets")
+
+    def _worksheet(self, name: str) -> Any:
+        with self._lock:
+            if self._client is None:
+                self._client = self._client_factory()
+                self._worksheets.clear()
+            ws = self._worksheets.get(name)
+            if ws is None:
+                ws = self._client.open_by_key(self._spreadsheet_id).worksheet(name)
+                self._worksheets[name] = ws
+            return ws
+
+    def reset(self) -> None:
+        """Забыть клиент и листы — следующая запись заново авторизуется."""
+        with self._lock:
+            self._client = None
+            self._worksheets.clear()
+
+    def _append_rows_sync(self, sheet_name: str, rows: list[list]) -> None:
+        try:
+            self._worksheet(sheet_name).append_rows(rows, value_input_option="USER_ENTERED")
+        except Exception:
+            # Отозванные права, удалённый лист и т.п. — переоткроем со следующей попытки
+            self.reset()
+            raise
+
+    async def append_rows(self, sheet_name: str, rows: list[list]) -> None:
+        """Дописать строки в лист одним запросом к API."""
+        if not rows:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._append_rows_sync, sheet_name, rows)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+_sink: SheetsSink | None = None
+
+
+def get_sheets_sink() -> SheetsSink:
+    """Общий SheetsSink процесса."""
+    global _sink
+    if _sink is None:
+        _sink = SheetsSink(config.spreadsheet_id, max_workers=config.sheets_executor_workers)
+    return _sink
+
+
+def close_sheets_sink() -> None:
+    global _sink
+    if _sink is not None:
+        _sink.close()
+    _sink = None
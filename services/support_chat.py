@@ -1,4 +1,5 @@
 """Отправка сообщений в Support Group и Admin Chat."""
+import asyncio
 import logging
 from datetime import timezone, timedelta
 from aiogram import Bot
@@ -7,20 +8,39 @@ from aiogram.exceptions import TelegramBadRequest, TelegramAPIError
 from config import config
 from keyboards import ticket_kb
 
-from services.db.tickets import get_ticket, get_client_username, get_ticket_messages
+from services.db.tickets import get_ticket, get_client_username, get_ticket_messages, set_ticket_topic
 from services.db.users import get_user_client_type
+from services.thread_index import thread_index
 from utils.media_sender import send_media
+from utils.rate_limit import RateLimiter
 
 logger = logging.getLogger(__name__)
 
 MSK = timezone(timedelta(hours=3))
 
+# Telegram режет сообщения длиннее 4096 символов
+MAX_DIGEST_LENGTH = 4000
+
+# Общий темп массовых сообщений в Support Group
+support_group_limiter = RateLimiter(config.support_group_rate_per_minute, 60.0)
+
 def to_msk(dt):
     if not dt:
         return "—"
     return dt.astimezone(MSK).strftime("%d.%m.%Y %H:%M")
 
 
+def client_type_label(client_type: str) -> str:
+    """Подпись типа клиента для карточки по результату get_user_client_type."""
+    return "🆕 Новый" if client_type == "new" else "👤 Действующий"
+
+
+def _last_message_text(msgs: list[dict], default: str) -> str:
+    if msgs:
+        return msgs[-1].get("text") or "(медиа)"
+    return default
+
+
 def _format_ticket_card(
     ticket_id: int,
     status: str,
@@ -50,9 +70,14 @@ async def send_ticket_to_support_group(
     client_type_label: str,
     last_message: str,
     message_thread_id: int | None = None,
+    ticket: dict | None = None,
 ) -> int | None:
-    """Отправить карточку тикета в Support Group (или в тему, если передан message_thread_id). Возвращает message_id."""
-    ticket = await get_ticket(ticket_id)
+    """
+    Отправить карточку тикета в Support Group (или в тему, если передан message_thread_id). Возвращает message_id.
+    Если строка тикета уже есть у вызывающего (ticket), повторно из БД она не читается.
+    """
+    if ticket is None:
+        ticket = await get_ticket(ticket_id)
     if not ticket:
         return None
 
@@ -157,14 +182,16 @@ async def update_ticket_card(
         logger.debug("Не удалось отредактировать карточку тикета %s: %s", ticket_id, e)
 
 
-async def refresh_ticket_card(bot: Bot, ticket_id: int) -> None:
+async def refresh_ticket_card(bot: Bot, ticket_id: int, ticket=None) -> None:
     """
     Обновить карточку тикета в чате (общий чат или топик): пересобрать текст и кнопки,
     отредактировать сообщение. Вызывать после смены статуса и т.п.
+    ticket — уже прочитанная строка тикета (например, из UPDATE … RETURNING).
     """
     if not config.support_group_id:
         return
-    ticket = await get_ticket(ticket_id)
+    if ticket is None:
+        ticket = await get_ticket(ticket_id)
     if not ticket:
         return
     msg_id = None
@@ -178,19 +205,19 @@ async def refresh_ticket_card(bot: Bot, ticket_id: int) -> None:
         return
 
     client_tg_id = ticket["client_user_id"]
-    ct = await get_user_client_type(client_tg_id)
-    client_type_label = "🆕 Новый" if ct == "new" else "👤 Действующий"
-    username = await get_client_username(client_tg_id) or "—"
+    ct, username, msgs = await asyncio.gather(
+        get_user_client_type(client_tg_id),
+        get_client_username(client_tg_id),
+        get_ticket_messages(ticket_id, limit=1),
+    )
+    username = username or "—"
     status = ticket.get("status") or "OPEN"
     created_str = to_msk(ticket.get("created_at"))
     taken_str = to_msk(ticket.get("taken_at"))
-    last_msg = "(нет сообщений)"
-    msgs = await get_ticket_messages(ticket_id, limit=1)
-    if msgs:
-        last_msg = msgs[-1].get("text") or "(медиа)"
+    last_msg = _last_message_text(msgs, "(нет сообщений)")
 
     text = _format_ticket_card(
-        ticket_id, status, client_tg_id, username, client_type_label, last_msg,
+        ticket_id, status, client_tg_id, username, client_type_label(ct), last_msg,
         taken_str=taken_str, created_str=created_str,
     )
     is_taken = bool(ticket.get("assigned_to_support_id"))
@@ -205,28 +232,132 @@ async def refresh_ticket_card(bot: Bot, ticket_id: int) -> None:
         logger.debug("Не удалось обновить карточку тикета %s: %s", ticket_id, e)
 
 
+async def notify_tickets_transferred(bot: Bot, tickets: list, new_support_username: str) -> None:
+    """
+    После передачи тикетов: обновить карточки и написать в темы о новом ответственном.
+    Тикеты обрабатываются параллельно, каждый вызов Bot API ждёт слот support_group_limiter.
+    """
+    if not config.support_group_id or not tickets:
+        return
+    await asyncio.gather(
+        *(_notify_ticket_transferred(bot, t, new_support_username) for t in tickets)
+    )
+
+
+async def _notify_ticket_transferred(bot: Bot, ticket, new_support_username: str) -> None:
+    ticket_id = ticket["ticket_id"]
+    async with support_group_limiter:
+        await refresh_ticket_card(bot, ticket_id, ticket=ticket)
+
+    thread_id = ticket.get("support_thread_id")
+    if not thread_id:
+        return
+    async with support_group_limiter:
+        try:
+            await bot.send_message(
+                chat_id=config.support_group_id,
+                message_thread_id=thread_id,
+                text=f"🔁 Ticket #{ticket_id} передан @{new_support_username}",
+            )
+        except (TelegramBadRequest, TelegramAPIError) as e:
+            logger.warning("Уведомление о передаче тикета %s не отправлено: %s", ticket_id, e)
+
+
+async def open_ticket_topic(bot: Bot, ticket: dict) -> int | None:
+    """
+    Перенести только что взятый тикет в отдельную тему.
+
+    ticket — строка, которую вернул claim_ticket (уже WAITING, с taken_at), поэтому
+    карточка в теме сразу актуальна и дополнительный refresh не нужен. Создание темы
+    и чтение данных для карточки идут параллельно. Возвращает message_thread_id
+    или None, если темы недоступны (тогда обновляется карточка в общем чате).
+    """
+    ticket_id = ticket["ticket_id"]
+    client_tg_id = ticket["client_user_id"]
+
+    topic_task = asyncio.create_task(
+        bot.create_forum_topic(
+            chat_id=config.support_group_id,
+            name=f"Ticket #{ticket_id}",
+        )
+    )
+    try:
+        ct, username, msgs = await asyncio.gather(
+            get_user_client_type(client_tg_id),
+            get_client_username(client_tg_id),
+            get_ticket_messages(ticket_id, limit=1),
+        )
+    except BaseException:
+        topic_task.cancel()
+        raise
+
+    try:
+        topic = await topic_task
+    except Exception as e:
+        logger.warning(
+            "Не удалось создать тему для тикета #%s (включите «Темы» в настройках группы): %s",
+            ticket_id, e,
+        )
+        # Fallback: тикет взят, обновляем карточку в общем чате
+        await refresh_ticket_card(bot, ticket_id)
+        return None
+
+    thread_id = topic.message_thread_id
+    card_msg_id = await send_ticket_to_support_group(
+        bot=bot,
+        ticket_id=ticket_id,
+        client_tg_id=client_tg_id,
+        username=username or "—",
+        client_type_label=client_type_label(ct),
+        last_message=_last_message_text(msgs, "(тикет взят)"),
+        message_thread_id=thread_id,
+        ticket=ticket,
+    )
+
+    async def _delete_general_card() -> None:
+        general_card_id = ticket.get("ticket_card_message_id")
+        if not general_card_id:
+            return
+        try:
+            await bot.delete_message(config.support_group_id, general_card_id)
+        except Exception:
+            pass
+
+    await asyncio.gather(
+        set_ticket_topic(ticket_id, thread_id, card_msg_id),
+        _delete_general_card(),
+    )
+    thread_index.add(thread_id, ticket_id)
+    return thread_id
+
+
 async def send_warning_to_support(
     bot: Bot,
     ticket_id: int,
+    ticket=None,
 ) -> None:
     """
     30 минут без ответа — мягкое предупреждение саппорту.
-    Отправляется в тему тикета (если есть), иначе в общий чат.
+    Отправляется в тему тикета (если есть), иначе в общий чат, в темпе support_group_limiter.
+    ticket — уже прочитанная строка (SLA-выборка, с колонкой support_username).
     """
     if not config.support_group_id:
         logger.warning("SUPPORT_GROUP_ID не задан в .env")
         return
 
-    ticket = await get_ticket(ticket_id)
+    if ticket is None:
+        ticket = await get_ticket(ticket_id)
     if not ticket:
         return
 
     thread_id = ticket.get("support_thread_id")
     assigned_id = ticket.get("assigned_to_support_id")
 
-    support_username = None
-    if assigned_id:
-        support_username = await get_client_username(assigned_id)
+    # В SLA-выборке колонка уже есть; NULL там — у саппорта нет username, повторно не ищем
+    if "support_username" in ticket.keys():
+        support_username = ticket["support_username"]
+    else:
+        support_username = await get_client_username(assigned_id) if assigned_id else None
 
     text = f"""⚠️ SLA 30 минут
 Ticket #{ticket_id}
@@ -244,7 +375,8 @@ Ticket #{ticket_id}
         if thread_id:
             kwargs["message_thread_id"] = thread_id
 
-        await bot.send_message(**kwargs)
+        async with support_group_limiter:
+            await bot.send_message(**kwargs)
 
     except (TelegramBadRequest, TelegramAPIError) as e:
         logger.warning(
@@ -252,6 +384,36 @@ Ticket #{ticket_id}
         )
 
 
+def digest_pages(title: str, lines: list[str], limit: int = MAX_DIGEST_LENGTH) -> list[str]:
+    """Заголовок и строки сводки, разбитые на сообщения не длиннее limit символов."""
+    pages: list[str] = []
+    current = title
+    for line in lines:
+        if len(current) + 1 + len(line) > limit:
+            pages.append(current)
+            current = f"{title} (продолжение)"
+        current += "\n" + line
+    pages.append(current)
+    return pages
+
+
+async def send_escalation_digest(bot: Bot, title: str, lines: list[str]) -> None:
+    """Сводка эскалаций одного прохода SLA-воркера в Admin Chat: одно сообщение (или несколько, если длинная)."""
+    if not config.admin_chat_id:
+        logger.warning("ADMIN_CHAT_ID не задан в .env")
+        return
+
+    for page in digest_pages(title, lines):
+        try:
+            await bot.send_message(config.admin_chat_id, page)
+        except (TelegramBadRequest, TelegramAPIError) as e:
+            logger.error(
+                "Не удалось отправить сводку эскалаций в Admin Chat: %s. "
+                "Проверьте ADMIN_CHAT_ID и убедитесь, что бот добавлен в чат.", e,
+            )
+            return
+
+
 async def send_escalation_to_admin(
     bot: Bot,
     ticket_id: int,
@@ -0,0 +1,61 @@
+"""
+Индекс тем Support Group: message_thread_id → ticket_id незакрытых тикетов.
+
+Прогревается при старте из tickets.support_thread_id и дальше обновляется на месте:
+тема добавляется, когда тикет взят и перенесён в неё (open_ticket_topic), убирается
+при закрытии тикета и возвращается при повторном открытии. Темы, открытые другой
+репликой, индекс узнаёт при первом сообщении: промах один раз проверяется по БД,
+а тема без тикета запоминается на MISS_TTL секунд — обычные темы группы в БД не ходят.
+"""
+import time
+from typing import Optional
+
+from services.db.tickets import get_open_ticket_threads, get_ticket_by_thread_id
+from utils.lru_cache import LRUCache
+
+MISS_TTL = 60.0
+
+
+class ThreadIndex:
+    """{message_thread_id: ticket_id}; промахи — {message_thread_id: до какого момента (monotonic)}."""
+
+    def __init__(self):
+        self.tickets: dict[int, int] = {}
+        self.misses = LRUCache(maxsize=1024)
+
+    async def warm(self) -> int:
+        rows = await get_open_ticket_threads()
+        self.tickets = {r["support_thread_id"]: r["ticket_id"] for r in rows}
+        return len(self.tickets)
+
+    def get(self, thread_id: Optional[int]) -> Optional[int]:
+        return self.tickets.get(thread_id) if thread_id else None
+
+    async def resolve(self, thread_id: Optional[int]) -> Optional[int]:
+        """Как get, но промах индекса один раз проверяется по БД и результат кэшируется."""
+        if not thread_id:
+            return None
+        ticket_id = self.tickets.get(thread_id)
+        if ticket_id is not None:
+            return ticket_id
+        expires = self.misses.get(thread_id)
+        if expires is not None and expires > time.monotonic():
+            return None
+
+        ticket = await get_ticket_by_thread_id(thread_id)
+        if ticket is None or ticket.status == "CLOSED":
+            self.misses.set(thread_id, time.monotonic() + MISS_TTL)
+            return None
+        self.add(thread_id, ticket.ticket_id)
+        return ticket.ticket_id
+
+    def add(self, thread_id: Optional[int], ticket_id: int) -> None:
+        if thread_id:
+            self.tickets[thread_id] = ticket_id
+            self.misses.pop(thread_id)
+
+    def discard(self, thread_id: Optional[int]) -> None:
+        self.tickets.pop(thread_id, None)
+
+
+thread_index = ThreadIndex()
@@ -0,0 +1,55 @@
+"""
+Прогрев при старте: пулы БД до min_size, Bot API, кэши ролей, саппортов в сети,
+тем тикетов и версий клавиатуры. bot.py запускает воркеры и поллинг только после
+прогрева, поэтому /readyz до его окончания отвечает 503 («startup»), а первые
+апдейты после деплоя не платят за холодные кэши. Время шагов пишется в лог.
+"""
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+
+from database import warm_pools
+from services.assignment import load_index
+from services.db.users import warm_role_cache
+from services.menu import warm_keyboard_registry
+from services.thread_index import thread_index
+
+logger = logging.getLogger(__name__)
+
+
+async def _timed(name: str, coro, timings: dict[str, float]):
+    started = time.perf_counter()
+    result = await coro
+    timings[name] = time.perf_counter() - started
+    return result
+
+
+async def warm_up(bot: Bot) -> dict[str, float]:
+    """Выполнить прогрев; вернуть длительность шагов в секундах. Ошибка шага прерывает запуск."""
+    timings: dict[str, float] = {}
+    started = time.perf_counter()
+
+    # Сначала соединения: дальше кэши читаются уже по прогретым пулам
+    connections = await _timed("pools", warm_pools(), timings)
+    me, roles, _, threads, keyboards = await asyncio.gather(
+        _timed("bot_api", bot.get_me(), timings),
+        _timed("roles", warm_role_cache(), timings),
+        _timed("supports", load_index.refresh(force=True), timings),
+        _timed("threads", thread_index.warm(), timings),
+        _timed("keyboards", warm_keyboard_registry(), timings),
+    )
+    timings["total"] = time.perf_counter() - started
+
+    logger.info(
+        "Прогрев за %.0f мс: соединений %s, бот @%s, ролей %s, саппортов в сети %s, "
+        "тем тикетов %s, клавиатур %s",
+        timings["total"] * 1000, connections, me.username, roles, len(load_index.loads),
+        threads, keyboards,
+    )
+    logger.info(
+        "Шаги прогрева: %s",
+        ", ".join(f"{name} {seconds * 1000:.0f} мс" for name, seconds in timings.items()),
+    )
+    return timings
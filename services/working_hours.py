@@ -1,5 +1,9 @@
-"""Проверка рабочего времени (Europe/Moscow)."""
-from datetime import datetime, timedelta
+"""
+Проверка рабочего времени (Europe/Moscow).
+
+Длительность в рабочем времени считает БД: функция working_seconds() (database.py).
+"""
+from datetime import datetime
 import pytz
 from config import config
 
@@ -16,40 +20,3 @@ def is_working_hours() -> bool:
     end = datetime.strptime(f"{WORK_END}:00", "%H:%M").time()
     return start <= now < end
 
-
-def working_minutes_between(start: datetime, end: datetime) -> float:
-    """
-    Считает рабочие минуты между датами.
-    Учитывает только 10:00–22:00 МСК.
-    """
-
-    start = start.astimezone(tz)
-    end = end.astimezone(tz)
-
-    total_minutes = 0
-    current = start
-
-    while current < end:
-
-        work_start = current.replace(hour=WORK_START, minute=0, second=0, microsecond=0)
-        work_end = current.replace(hour=WORK_END, minute=0, second=0, microsecond=0)
-
-        if current < work_start:
-            current = work_start
-
-        if current >= work_end:
-            current = (current + timedelta(days=1)).replace(
-                hour=WORK_START,
-                minute=0,
-                second=0,
-                microsecond=0
-            )
-            continue
-
-        period_end = min(work_end, end)
-
-        total_minutes += (period_end - current).total_seconds() / 60
-        current = period_end
-
-    return total_minutes
-
@@ -0,0 +1,23 @@
+import pytest_asyncio
+
+from database import Database
+from services.db.instrumentation import InstrumentedPool
+from tests.benchmarks.harness import REPORTS, BenchHarness
+
+
+@pytest_asyncio.fixture
+async def bench(clean_db):
+    """
+    Стенд поверх очищенной БД: пул clean_db обёрнут в InstrumentedPool для подсчёта запросов.
+    Отчёты сценариев печатаются в конце прогона.
+    """
+    Database.pool = InstrumentedPool(clean_db)
+    yield BenchHarness()
+    Database.pool = clean_db
+
+
+def pytest_terminal_summary(terminalreporter):
+    if REPORTS:
+        terminalreporter.section("handler benchmarks")
+        for line in REPORTS:
+            terminalreporter.write_line(line)
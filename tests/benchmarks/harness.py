@@ -0,0 +1,223 @@
+"""
+Стенд для бенчмарков обработчиков: апдейты идут через Dispatcher.feed_update,
+Bot API подменён сессией-заглушкой, SQL-запросы считает InstrumentedPool.
+"""
+import itertools
+import statistics
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import CreateForumTopic
+from aiogram.types import (
+    CallbackQuery,
+    Chat,
+    ForumTopic,
+    Message,
+    Update,
+    User,
+)
+
+from config import config
+from services.db.instrumentation import query_scope
+
+BENCH_BOT_TOKEN = "42:BENCHMARK"
+BENCH_SUPPORT_GROUP_ID = -1001000000001
+
+# Роутер подключается к одному диспетчеру за процесс — диспетчер общий для всех сценариев
+_dispatcher = None
+
+# Строки отчёта, печатаются в конце прогона (tests/benchmarks/conftest.py)
+REPORTS: list[str] = []
+
+
+class MockSession(BaseSession):
+    """Сессия без сети: считает вызовы Bot API и возвращает правдоподобные ответы."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls: Counter[str] = Counter()
+        self._message_ids = itertools.count(100_000)
+        self._thread_ids = itertools.count(500)
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        returning = method.__returning__
+
+        if isinstance(method, CreateForumTopic):
+            return ForumTopic(
+                message_thread_id=next(self._thread_ids),
+                name=method.name,
+                icon_color=0x6FB9F0,
+            )
+        if returning is Message:
+            chat_id = getattr(method, "chat_id", 0)
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(timezone.utc),
+                chat=Chat(id=int(chat_id), type="private" if int(chat_id) > 0 else "supergroup"),
+                message_thread_id=getattr(method, "message_thread_id", None),
+            )
+        if returning is User:
+            return User(id=bot.id, is_bot=True, first_name="bench")
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+class UpdateFactory:
+    """Синтетические апдейты Telegram."""
+
+    def __init__(self, support_group_id: int):
+        self.support_group_id = support_group_id
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    @staticmethod
+    def user(tg_id: int) -> User:
+        return User(id=tg_id, is_bot=False, first_name=f"u{tg_id}", username=f"user{tg_id}")
+
+    def private_message(self, tg_id: int, text: str) -> Update:
+        return Update(
+            update_id=next(self._update_ids),
+            message=Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(timezone.utc),
+                chat=Chat(id=tg_id, type="private"),
+                from_user=self.user(tg_id),
+                text=text,
+            ),
+        )
+
+    def group_message(self, tg_id: int, text: str, thread_id: int | None = None) -> Update:
+        return Update(
+            update_id=next(self._update_ids),
+            message=Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(timezone.utc),
+                chat=Chat(id=self.support_group_id, type="supergroup", is_forum=True),
+                from_user=self.user(tg_id),
+                message_thread_id=thread_id,
+                is_topic_message=thread_id is not None or None,
+                text=text,
+            ),
+        )
+
+    def callback(self, tg_id: int, data: str, thread_id: int | None = None) -> Update:
+        update_id = next(self._update_ids)
+        return Update(
+            update_id=update_id,
+            callback_query=CallbackQuery(
+                id=str(update_id),
+                from_user=self.user(tg_id),
+                chat_instance="bench",
+                data=data,
+                message=Message(
+                    message_id=next(self._message_ids),
+                    date=datetime.now(timezone.utc),
+                    chat=Chat(id=self.support_group_id, type="supergroup", is_forum=True),
+                    message_thread_id=thread_id,
+                    text="card",
+                ),
+            ),
+        )
+
+
+@dataclass
+class Budget:
+    """Максимум SQL-запросов и вызовов Bot API на один апдейт."""
+    queries: int
+    api_calls: int
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    latencies: list[float] = field(default_factory=list)
+    queries: list[int] = field(default_factory=list)
+    api_calls: list[int] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def updates(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def throughput(self) -> float:
+        return self.updates / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, q: int) -> float:
+        if len(self.latencies) < 2:
+            return self.latencies[0] if self.latencies else 0.0
+        return statistics.quantiles(self.latencies, n=100, method="inclusive")[q - 1]
+
+    def report(self) -> str:
+        return (
+            f"{self.name:<24} {self.updates:>5} upd  {self.throughput:>8.1f} upd/s  "
+            f"p50 {self.percentile(50) * 1000:>7.2f} ms  p99 {self.percentile(99) * 1000:>7.2f} ms  "
+            f"sql/upd {statistics.mean(self.queries):>5.1f} (max {max(self.queries)})  "
+            f"api/upd {statistics.mean(self.api_calls):>4.1f} (max {max(self.api_calls)})"
+        )
+
+    def over_budget(self, budget: Budget) -> list[str]:
+        problems = []
+        if max(self.queries) > budget.queries:
+            problems.append(f"SQL-запросов на апдейт {max(self.queries)} > {budget.queries}")
+        if max(self.api_calls) > budget.api_calls:
+            problems.append(f"вызовов Bot API на апдейт {max(self.api_calls)} > {budget.api_calls}")
+        return problems
+
+
+class BenchHarness:
+    """Диспетчер бота, сессия-заглушка и счётчики для прогона сценариев."""
+
+    def __init__(self):
+        global _dispatcher
+        if _dispatcher is None:
+            # Фильтры support-роутера читают support_group_id при импорте — задаём до импорта bot
+            if not config.support_group_id:
+                config.support_group_id = BENCH_SUPPORT_GROUP_ID
+            from bot import build_dispatcher
+
+            _dispatcher = build_dispatcher()
+
+        self.dp = _dispatcher
+        self.session = MockSession()
+        self.bot = Bot(token=BENCH_BOT_TOKEN, session=self.session)
+        self.updates = UpdateFactory(config.support_group_id)
+
+    async def feed(self, update: Update) -> None:
+        await self.dp.feed_update(self.bot, update)
+
+    async def run(self, name: str, updates) -> ScenarioResult:
+        """Прогнать апдейты последовательно, замеряя каждый."""
+        result = ScenarioResult(name)
+        started = time.perf_counter()
+        for update in updates:
+            calls_before = self.session.total_calls
+            t0 = time.perf_counter()
+            with query_scope("benchmark") as scope:
+                await self.feed(update)
+            result.latencies.append(time.perf_counter() - t0)
+            result.queries.append(scope.count)
+            result.api_calls.append(self.session.total_calls - calls_before)
+        result.elapsed = time.perf_counter() - started
+        return result
+
+
+def check_budget(result: ScenarioResult, budget: Budget) -> None:
+    """Записать отчёт сценария и упасть, если путь вышел за бюджет."""
+    REPORTS.append(result.report())
+    problems = result.over_budget(budget)
+    assert not problems, f"{result.name}: " + "; ".join(problems)
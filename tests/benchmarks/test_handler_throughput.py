@@ -0,0 +1,122 @@
+"""
+Пропускная способность основных путей бота. Бюджеты — максимум на один апдейт;
+при их превышении тест падает, отчёт печатается в конце прогона pytest.
+"""
+import pytest
+
+from constants import ClientType, ONBOARDING_QUESTIONS
+from database import get_pool
+from services.db.tickets import set_role, upsert_user_with_client_type
+from services.db.users import get_or_create_user
+from tests.benchmarks.harness import Budget, check_budget
+
+CLIENTS = 20
+
+# Замеренный максимум на апдейт плюс запас в пару запросов: лишний запрос на пути
+# должен ронять бенчмарк, а не теряться в бюджете
+BUDGETS = {
+    "onboarding step": Budget(queries=18, api_calls=3),   # замер: 16 / 3
+    "client message": Budget(queries=13, api_calls=1),    # 11 / 1
+    "take": Budget(queries=8, api_calls=4),               # 6 / 4
+    "reply": Budget(queries=8, api_calls=2),              # 6 / 2
+    "history": Budget(queries=5, api_calls=2),            # 3 / 2
+    "/statistik": Budget(queries=55, api_calls=1),        # 52 / 1
+}
+
+
+async def _open_tickets(bench, client_ids: list[int]) -> dict[int, int]:
+    """Действующие клиенты с открытыми тикетами: {client_tg_id: ticket_id}."""
+    for tg_id in client_ids:
+        await upsert_user_with_client_type(tg_id, f"user{tg_id}", ClientType.EXISTING)
+        await bench.feed(bench.updates.private_message(tg_id, "Здравствуйте, вопрос по выплатам"))
+
+    rows = await get_pool().fetch(
+        "SELECT client_user_id, ticket_id FROM tickets WHERE client_user_id = ANY($1::bigint[])",
+        client_ids,
+    )
+    return {r["client_user_id"]: r["ticket_id"] for r in rows}
+
+
+@pytest.mark.asyncio
+async def test_onboarding_steps(bench):
+    clients = list(range(8001, 8001 + CLIENTS))
+    for tg_id in clients:
+        await bench.feed(bench.updates.private_message(tg_id, "/start"))
+
+    # Первое сообщение запускает онбординг, дальше — ответы на все вопросы
+    updates = [
+        bench.updates.private_message(tg_id, f"ответ {step}")
+        for step in range(len(ONBOARDING_QUESTIONS) + 1)
+        for tg_id in clients
+    ]
+    result = await bench.run("onboarding step", updates)
+
+    check_budget(result, BUDGETS["onboarding step"])
+
+
+@pytest.mark.asyncio
+async def test_client_messages_to_open_tickets(bench):
+    clients = list(range(8101, 8101 + CLIENTS))
+    await _open_tickets(bench, clients)
+
+    updates = [
+        bench.updates.private_message(tg_id, f"уточнение {i}")
+        for i in range(5)
+        for tg_id in clients
+    ]
+    result = await bench.run("client message", updates)
+
+    check_budget(result, BUDGETS["client message"])
+
+
+@pytest.mark.asyncio
+async def test_take_reply_history(bench):
+    support_id = 8200
+    await set_role(support_id, "support")
+    tickets = await _open_tickets(bench, list(range(8201, 8201 + CLIENTS)))
+
+    take = await bench.run(
+        "take",
+        [bench.updates.callback(support_id, f"ticket:take:{t}") for t in tickets.values()],
+    )
+    check_budget(take, BUDGETS["take"])
+
+    threads = {
+        r["ticket_id"]: r["support_thread_id"]
+        for r in await get_pool().fetch(
+            "SELECT ticket_id, support_thread_id FROM tickets WHERE ticket_id = ANY($1::bigint[])",
+            list(tickets.values()),
+        )
+    }
+
+    # Сообщение в теме взятого тикета сразу уходит клиенту
+    reply = await bench.run(
+        "reply",
+        [bench.updates.group_message(support_id, "Добрый день!", thread_id) for thread_id in threads.values()],
+    )
+    check_budget(reply, BUDGETS["reply"])
+
+    history = await bench.run(
+        "history",
+        [
+            bench.updates.callback(support_id, f"ticket:history:{ticket_id}", thread_id)
+            for ticket_id, thread_id in threads.items()
+        ],
+    )
+    check_budget(history, BUDGETS["history"])
+
+
+@pytest.mark.asyncio
+async def test_statistik(bench):
+    admin_id = 8300
+    await set_role(admin_id, "admin")
+    for tg_id in (8301, 8302, 8303):
+        await get_or_create_user(tg_id, username=f"support{tg_id}")
+        await set_role(tg_id, "support")
+
+    result = await bench.run(
+        "/statistik",
+        [bench.updates.private_message(admin_id, "/statistik") for _ in range(CLIENTS)],
+    )
+
+    check_budget(result, BUDGETS["/statistik"])
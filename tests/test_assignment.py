@@ -0,0 +1,40 @@
+import pytest
+
+from config import config
+from services.assignment import LoadIndex
+from services.db.tickets import claim_ticket, get_or_create_active_ticket, set_role
+from services.db.users import get_online_support_loads, set_support_online
+
+
+def test_pick_least_loaded_below_limit(monkeypatch):
+    monkeypatch.setattr(config, "auto_assign_max_tickets", 3)
+    index = LoadIndex()
+    index.loads = {1: 2, 2: 0, 3: 3}
+
+    assert index.pick() == 2
+    index.reserve(2)
+    index.reserve(2)
+    # 1 и 2 равны по нагрузке — выбирается тот, кому дольше не назначали
+    assert index.pick() == 1
+    index.reserve(1)
+    index.reserve(2)
+    assert index.pick() is None
+
+    index.release(2)
+    assert index.pick() == 2
+
+
+@pytest.mark.asyncio
+async def test_online_support_loads(clean_db):
+    await set_role(9501, "support")
+    await set_role(9502, "support")
+    await set_support_online(9501, True)
+
+    ticket_id, _ = await get_or_create_active_ticket(9510)
+    await claim_ticket(ticket_id, 9501)
+
+    loads = {r["tg_id"]: r["load"] for r in await get_online_support_loads()}
+    assert loads == {9501: 1}
+
+    await set_support_online(9501, False)
+    assert await get_online_support_loads() == []
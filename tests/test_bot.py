@@ -1,5 +1,4 @@
 import pytest
-import json
 from database import get_pool
 
 
@@ -45,8 +44,6 @@ async def test_onboarding_flow(clean_db):
     async with pool.acquire() as conn:
         row = await conn.fetchrow("SELECT answers FROM onboarding_state WHERE tg_id = $1", tg_id)
         answers = row["answers"]
-        if isinstance(answers, str):
-            answers = json.loads(answers)
         assert answers["1"] == {"q1": "answer1"}
 
 @pytest.mark.asyncio
@@ -60,7 +57,7 @@ async def test_complete_onboarding_creates_lead(clean_db):
         row = await conn.fetchrow("SELECT * FROM leads WHERE lead_id = $1", lead_id)
         assert row is not None
         assert row["tg_id"] == tg_id
-        assert json.loads(row["answers"]) == answers
+        assert row["answers"] == answers
 
 @pytest.mark.asyncio
 async def test_active_ticket_creation(clean_db):
@@ -110,8 +107,6 @@ async def test_user_lifecycle(clean_db):
     async with get_pool().acquire() as conn:
         row = await conn.fetchrow("SELECT answers FROM onboarding_state WHERE tg_id = $1", tg_id)
         answers = row["answers"]
-        if isinstance(answers, str):
-            answers = json.loads(answers)
         assert answers["1"] == "answer1"
         assert answers["2"] == "answer2"
 
@@ -121,7 +116,7 @@ async def test_user_lifecycle(clean_db):
     async with get_pool().acquire() as conn:
         row = await conn.fetchrow("SELECT * FROM leads WHERE lead_id = $1", lead_id)
         assert row["tg_id"] == tg_id
-        assert json.loads(row["answers"]) == answers
+        assert row["answers"] == answers
 
     # 5️⃣ Создаём активный тикет
     ticket_id, is_new = await get_or_create_active_ticket(tg_id)
@@ -0,0 +1,95 @@
+import aiohttp
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from config import config
+from database import get_pool
+from services import crm
+from services.db.onboarding import complete_onboarding
+
+
+@pytest_asyncio.fixture
+async def webhook():
+    """Локальная подмена CRM webhook: копит тела запросов, код ответа настраивается."""
+    state = {"received": [], "status": 200}
+
+    async def handler(request: web.Request) -> web.Response:
+        state["received"].append(await request.json())
+        return web.Response(status=state["status"])
+
+    app = web.Application()
+    app.router.add_post("/hook", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    state["url"] = f"http://{host}:{port}/hook"
+
+    yield state
+
+    await crm.close_http_session()
+    await runner.cleanup()
+
+
+@pytest.fixture
+def crm_webhook_config(monkeypatch, webhook):
+    monkeypatch.setattr(config, "crm_enabled", True)
+    monkeypatch.setattr(config, "crm_webhook_url", webhook["url"])
+    monkeypatch.setattr(config, "google_sheets_enabled", False)
+    return webhook
+
+
+@pytest.mark.asyncio
+async def test_post_to_webhook_batches_payloads(monkeypatch, webhook):
+    monkeypatch.setattr(config, "crm_batch_size", 10)
+    async with aiohttp.ClientSession() as session:
+        await crm.post_to_webhook(session, webhook["url"], [{"lead_id": 1}, {"lead_id": 2}])
+    assert webhook["received"] == [[{"lead_id": 1}, {"lead_id": 2}]]
+
+
+@pytest.mark.asyncio
+async def test_post_to_webhook_raises_on_error_status(monkeypatch, webhook):
+    monkeypatch.setattr(config, "crm_batch_size", 1)
+    webhook["status"] = 500
+    async with aiohttp.ClientSession() as session:
+        with pytest.raises(RuntimeError):
+            await crm.post_to_webhook(session, webhook["url"], [{"lead_id": 1}])
+
+
+@pytest.mark.asyncio
+async def test_lead_delivered_from_outbox(clean_db, crm_webhook_config):
+    tg_id = 7001
+    lead_id = await complete_onboarding(tg_id, {"1": {"text": "канал"}}, username="client7001")
+
+    delivered = await crm.deliver_crm_outbox_once()
+
+    assert delivered == 1
+    [payload] = crm_webhook_config["received"]
+    assert payload["lead_id"] == lead_id
+    assert payload["username"] == "client7001"
+    async with get_pool().acquire() as conn:
+        row = await conn.fetchrow("SELECT delivered_at FROM crm_outbox WHERE sink = 'webhook'")
+    assert row["delivered_at"] is not None
+
+
+@pytest.mark.asyncio
+async def test_failed_delivery_is_retried_with_backoff(clean_db, crm_webhook_config):
+    crm_webhook_config["status"] = 503
+    await complete_onboarding(7002, {"1": {"text": "канал"}})
+
+    assert await crm.deliver_crm_outbox_once() == 0
+
+    async with get_pool().acquire() as conn:
+        row = await conn.fetchrow(
+            """SELECT attempts, delivered_at, next_attempt_at > NOW() AS postponed
+               FROM crm_outbox WHERE sink = 'webhook'"""
+        )
+    assert row["attempts"] == 1
+    assert row["delivered_at"] is None
+    assert row["postponed"] is True
+
+    # Событие отложено — повторный проход ничего не отправляет
+    assert await crm.deliver_crm_outbox_once() == 0
+    assert len(crm_webhook_config["received"]) == 1
@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import pytest
+
+from config import config
+from services import support_chat
+from services.auto_escalation import sla_sweep
+from services.db.sla import get_tickets_for_sla_check, set_ticket_sla_stages
+from services.db.tickets import get_or_create_active_ticket, update_ticket_status
+from services.db.users import get_or_create_user
+from services.support_chat import digest_pages
+from utils.rate_limit import RateLimiter
+
+
+def test_digest_pages_split_long_digest():
+    lines = [f"#{i} · OPEN · саппорт @— · клиент @client{i}" for i in range(200)]
+    pages = digest_pages("⛔ Эскалация SLA", lines, limit=1000)
+
+    assert len(pages) > 1
+    assert all(len(p) <= 1000 for p in pages)
+    assert pages[0].startswith("⛔ Эскалация SLA\n")
+    assert pages[1].startswith("⛔ Эскалация SLA (продолжение)\n")
+    # Ни одна строка не потерялась и не разорвана
+    assert [l for p in pages for l in p.split("\n")[1:]] == lines
+
+    assert digest_pages("Заголовок", ["одна строка"]) == ["Заголовок\nодна строка"]
+
+
+@pytest.mark.asyncio
+async def test_sla_stages_advance_in_bulk(clean_db):
+    ticket_a, _ = await get_or_create_active_ticket(9741)
+    ticket_b, _ = await get_or_create_active_ticket(9742)
+    for ticket_id in (ticket_a, ticket_b):
+        await update_ticket_status(ticket_id, "OPEN")
+    await clean_db.execute(
+        "UPDATE tickets SET created_at = NOW() - interval '3 days' WHERE ticket_id = ANY($1::int[])",
+        [ticket_a, ticket_b],
+    )
+
+    due = await get_tickets_for_sla_check(0, 0, 0)
+    assert {t["ticket_id"] for t in due} == {ticket_a, ticket_b}
+
+    await set_ticket_sla_stages([ticket_a, ticket_b], [3, 1])
+    due = await get_tickets_for_sla_check(0, 0, 0)
+    assert [t["ticket_id"] for t in due] == [ticket_b]
+
+
+@pytest.mark.asyncio
+async def test_sla_sweep_makes_no_per_ticket_username_lookups(clean_db, monkeypatch):
+    # Саппорт без username: NULL в support_username — не повод идти в БД ещё раз
+    support_id = 9750
+    await get_or_create_user(support_id)
+    tickets = []
+    for tg_id in (9751, 9752, 9753):
+        ticket_id, _ = await get_or_create_active_ticket(tg_id)
+        tickets.append(ticket_id)
+    await clean_db.execute(
+        """
+        UPDATE tickets
+        SET status = 'WAITING', assigned_to_support_id = $2,
+            taken_at = NOW() - interval '3 days', sla_started_at = NOW() - interval '3 days'
+        WHERE ticket_id = ANY($1::int[])
+        """,
+        tickets, support_id,
+    )
+
+    lookups = []
+
+    async def get_client_username(tg_id):
+        lookups.append(tg_id)
+        return None
+
+    sent = []
+
+    async def send_message(**kwargs):
+        sent.append(kwargs)
+
+    monkeypatch.setattr(support_chat, "get_client_username", get_client_username)
+    monkeypatch.setattr(support_chat, "support_group_limiter", RateLimiter(1000))
+    monkeypatch.setattr(config, "sla_warning_minutes", 1)
+    monkeypatch.setattr(config, "sla_admin_minutes", 10**6)
+    monkeypatch.setattr(config, "sla_critical_minutes", 10**6)
+
+    await sla_sweep(SimpleNamespace(send_message=send_message))
+
+    assert len(sent) == len(tickets)
+    assert lookups == []
+    stages = await clean_db.fetch(
+        "SELECT sla_stage FROM tickets WHERE ticket_id = ANY($1::int[])", tickets
+    )
+    assert [r["sla_stage"] for r in stages] == [1, 1, 1]
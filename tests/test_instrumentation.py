@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from services.metrics import DB_POOL_ACQUIRE_TIMEOUTS
+from services.db.instrumentation import (
+    InstrumentedPool,
+    fingerprint,
+    get_fingerprint_stats,
+    query_scope,
+    reset_fingerprint_stats,
+)
+
+
+def test_fingerprint_normalizes_whitespace_and_literals():
+    assert fingerprint("SELECT *\n   FROM t  WHERE id = $1 LIMIT 10") == "SELECT * FROM t WHERE id = $n LIMIT ?"
+
+
+@pytest.mark.asyncio
+async def test_queries_are_counted_per_scope(clean_db):
+    reset_fingerprint_stats()
+    pool = InstrumentedPool(clean_db)
+
+    with query_scope("outer") as outer:
+        await pool.fetchval("SELECT 1")
+        with query_scope("handler") as inner:
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.execute("SELECT pg_sleep(0.01)")
+                    await conn.fetchrow("SELECT $1::int AS n", 7)
+            # gather копирует контекст — запросы задач попадают в тот же scope
+            await asyncio.gather(*(pool.fetchval("SELECT $1::int", i) for i in range(3)))
+
+    assert inner.count == 5
+    assert inner.slowest_query == "SELECT pg_sleep(0.01)"
+    assert outer.count == 6
+    assert outer.total_time >= inner.total_time
+
+    stats = {(name, fp): s for name, fp, s in get_fingerprint_stats(limit=10)}
+    assert stats[("handler", "SELECT $n::int")].calls == 3
+    assert stats[("outer", "SELECT ?")].calls == 1
+
+
+@pytest.mark.asyncio
+async def test_named_pool_acquire_timeout_is_counted(clean_db):
+    pool = InstrumentedPool(clean_db, "test", acquire_timeout=0.05, count_queries=False)
+    before = DB_POOL_ACQUIRE_TIMEOUTS.value(pool="test")
+
+    held = [await clean_db.acquire() for _ in range(clean_db.get_max_size())]
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            async with pool.acquire():
+                pass
+    finally:
+        for conn in held:
+            await clean_db.release(conn)
+
+    assert DB_POOL_ACQUIRE_TIMEOUTS.value(pool="test") == before + 1
@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from config import config
+from database import Database
+from tests.conftest import TEST_DB_URL
+
+
+@pytest.mark.asyncio
+async def test_only_one_contender_runs_worker(clean_db, monkeypatch):
+    monkeypatch.setattr(config, "database_url", TEST_DB_URL)
+    monkeypatch.setattr(config, "leader_retry_seconds", 0.05)
+    monkeypatch.setattr(config, "leader_heartbeat_seconds", 0.05)
+    running = []
+    started = asyncio.Event()
+
+    async def worker():
+        running.append(object())
+        started.set()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            running.pop()
+
+    first = asyncio.create_task(Database.run_as_leader("test_leader", worker))
+    await asyncio.wait_for(started.wait(), timeout=5)
+    second = asyncio.create_task(Database.run_as_leader("test_leader", worker))
+    await asyncio.sleep(0.3)
+    assert len(running) == 1
+
+    # Лидер пропал — воркер остановлен до снятия лока, работу подхватывает второй
+    started.clear()
+    first.cancel()
+    await asyncio.gather(first, return_exceptions=True)
+    await asyncio.wait_for(started.wait(), timeout=5)
+    assert len(running) == 1
+
+    second.cancel()
+    await asyncio.gather(second, return_exceptions=True)
+    assert running == []
@@ -0,0 +1,59 @@
+import pytest
+
+from database import get_pool
+from services import menu
+from services.db.users import get_or_create_user
+from utils.lru_cache import LRUCache
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent: list[int] = []
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        self.sent.append(chat_id)
+
+
+@pytest.mark.asyncio
+async def test_migrate_keyboards_in_batches(clean_db, monkeypatch):
+    users = list(range(9801, 9806))
+    for tg_id in users:
+        await get_or_create_user(tg_id)
+    async with get_pool().acquire() as conn:
+        await conn.execute("UPDATE users SET keyboard_version = 0")
+        await conn.execute(
+            "UPDATE users SET keyboard_version = $1 WHERE tg_id = 9803", menu.KEYBOARD_VERSION
+        )
+
+    pauses = []
+
+    async def sleep(seconds):
+        pauses.append(seconds)
+
+    monkeypatch.setattr(menu.config, "keyboard_migration_batch_size", 2)
+    monkeypatch.setattr(menu.asyncio, "sleep", sleep)
+    monkeypatch.setattr(menu, "_actual_keyboard", LRUCache(16))
+    bot = FakeBot()
+
+    outdated = [9801, 9802, 9804, 9805]
+    assert await menu.migrate_keyboards(bot) == len(outdated)
+    assert bot.sent == outdated
+    # Две пачки по два пользователя — пауза после каждой
+    assert pauses == [1.0, 1.0]
+    async with get_pool().acquire() as conn:
+        versions = await conn.fetch(
+            "SELECT DISTINCT keyboard_version FROM users WHERE tg_id = ANY($1::bigint[])", users
+        )
+    assert [r["keyboard_version"] for r in versions] == [menu.KEYBOARD_VERSION]
+    assert all(tg_id in menu._actual_keyboard for tg_id in outdated)
+
+    # Повторный проход — рассылать некому
+    assert await menu.migrate_keyboards(bot) == 0
+    assert len(bot.sent) == len(outdated)
+
+
+def test_keyboard_registry_is_bounded(monkeypatch):
+    monkeypatch.setattr(menu, "_actual_keyboard", LRUCache(2))
+    menu._mark_actual([1, 2, 3])
+    assert len(menu._actual_keyboard) == 2
+    assert 1 not in menu._actual_keyboard
@@ -0,0 +1,57 @@
+import aiohttp
+import pytest
+
+from services import metrics
+from services.metrics import Counter, Gauge, Histogram
+
+
+def test_prometheus_text_format(monkeypatch):
+    # Тестовые метрики — во временном реестре, в /metrics остальных тестов они не попадут
+    monkeypatch.setattr(metrics, "_metrics", list(metrics._metrics))
+    requests = Counter("test_requests_total", "Запросы", ["method"])
+    depth = Gauge("test_queue_depth", "Очередь")
+    latency = Histogram("test_latency_seconds", "Задержка", ["method"], buckets=(0.1, 1.0))
+
+    requests.inc(method="SendMessage")
+    requests.inc(2, method="SendMessage")
+    depth.set(7)
+    latency.observe(0.05, method="SendMessage")
+    latency.observe(0.5, method="SendMessage")
+    latency.observe(5, method="SendMessage")
+
+    lines = requests.render() + depth.render() + latency.render()
+    assert "# TYPE test_requests_total counter" in lines
+    assert 'test_requests_total{method="SendMessage"} 3' in lines
+    assert "test_queue_depth 7" in lines
+    assert 'test_latency_seconds_bucket{method="SendMessage",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{method="SendMessage",le="1"} 2' in lines
+    assert 'test_latency_seconds_bucket{method="SendMessage",le="+Inf"} 3' in lines
+    assert 'test_latency_seconds_count{method="SendMessage"} 3' in lines
+
+
+@pytest.mark.asyncio
+async def test_metrics_server_endpoints():
+    metrics.set_ready(False)
+    runner = await metrics.start_metrics_server("127.0.0.1", 0)
+    host, port = runner.addresses[0][:2]
+    base = f"http://{host}:{port}"
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{base}/healthz") as resp:
+                assert resp.status == 200
+            async with session.get(f"{base}/readyz") as resp:
+                assert resp.status == 503
+
+            metrics.set_ready(True)
+            async with session.get(f"{base}/readyz") as resp:
+                assert resp.status == 200
+
+            metrics.WORKER_SWEEP.observe(0.2, worker="sla_watcher")
+            async with session.get(f"{base}/metrics") as resp:
+                body = await resp.text()
+            assert 'worker_sweep_seconds_count{worker="sla_watcher"}' in body
+            assert "# TYPE bot_api_request_seconds histogram" in body
+            assert "test_requests_total" not in body
+    finally:
+        metrics.set_ready(False)
+        await runner.cleanup()
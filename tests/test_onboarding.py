@@ -0,0 +1,43 @@
+import pytest
+
+from database import get_pool
+from services.db.onboarding import advance_onboarding, finish_onboarding, start_onboarding
+from services.db.tickets import get_or_create_active_ticket
+
+
+@pytest.mark.asyncio
+async def test_advance_onboarding_appends_answer_and_returns_next_step(clean_db):
+    tg_id = 8001
+
+    assert await advance_onboarding(tg_id, {"text": "до старта"}) is None
+
+    await start_onboarding(tg_id)
+    step, answers = await advance_onboarding(tg_id, {"text": "канал"})
+    assert step == 2
+    step, answers = await advance_onboarding(tg_id, {"text": "да"})
+    assert step == 3
+    assert answers == {"1": {"text": "канал"}, "2": {"text": "да"}}
+
+
+@pytest.mark.asyncio
+async def test_finish_onboarding_opens_ticket_in_one_transaction(clean_db):
+    tg_id = 8002
+    await start_onboarding(tg_id)
+    ticket_id, _ = await get_or_create_active_ticket(tg_id)
+    _, answers = await advance_onboarding(tg_id, {"text": "канал"})
+
+    lead_id, ticket = await finish_onboarding(tg_id, ticket_id, answers, username="client8002")
+
+    assert ticket["ticket_id"] == ticket_id
+    assert ticket["status"] == "OPEN"
+    assert ticket["sla_started_at"] is not None
+    async with get_pool().acquire() as conn:
+        user = await conn.fetchrow(
+            "SELECT client_type, onboarding_completed_at FROM users WHERE tg_id = $1", tg_id
+        )
+        lead_owner = await conn.fetchval("SELECT tg_id FROM leads WHERE lead_id = $1", lead_id)
+        state = await conn.fetchrow("SELECT 1 FROM onboarding_state WHERE tg_id = $1", tg_id)
+    assert user["client_type"] == "lead"
+    assert user["onboarding_completed_at"] is not None
+    assert lead_owner == tg_id
+    assert state is None
@@ -0,0 +1,75 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+from database import _month_start, ensure_message_partitions
+from services.db.tickets import (
+    add_message,
+    get_history_messages_full,
+    get_or_create_active_ticket,
+    get_ticket_messages,
+)
+
+
+def test_month_start_crosses_year():
+    assert _month_start(date(2026, 11, 19)) == date(2026, 11, 1)
+    assert _month_start(date(2026, 11, 19), 2) == date(2027, 1, 1)
+    assert _month_start(date(2026, 12, 31), 1) == date(2027, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_messages_land_in_current_month_partition(clean_db):
+    async with clean_db.acquire() as conn:
+        assert await conn.fetchval(
+            "SELECT relkind::text FROM pg_class WHERE oid = 'messages'::regclass"
+        ) == "p"
+        # Секции на будущие месяцы уже есть — повторный вызов ничего не создаёт
+        assert await ensure_message_partitions(conn, 2) == []
+
+    ticket_id, _ = await get_or_create_active_ticket(9301)
+    await add_message(ticket_id, "IN", 9301, "привет")
+
+    async with clean_db.acquire() as conn:
+        partition = await conn.fetchval(
+            "SELECT tableoid::regclass::text FROM messages WHERE ticket_id = $1", ticket_id
+        )
+    assert partition == f"messages_p{datetime.now(timezone.utc):%Y%m}"
+    assert [m["text"] for m in await get_ticket_messages(ticket_id)] == ["привет"]
+
+
+@pytest.mark.asyncio
+async def test_messages_indexes_are_valid_on_parent(clean_db):
+    async with clean_db.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT indexrelid::regclass::text AS name, indisvalid FROM pg_index
+            WHERE indexrelid IN ('messages_ticket_created_idx'::regclass, 'messages_text_fts_idx'::regclass)
+            """
+        )
+    assert {r["name"]: r["indisvalid"] for r in rows} == {
+        "messages_ticket_created_idx": True,
+        "messages_text_fts_idx": True,
+    }
+
+
+@pytest.mark.asyncio
+async def test_legacy_epoch_messages_stay_visible(clean_db):
+    # Сообщения с NULL created_at при переводе на секции получили 'epoch'
+    client_id = 9311
+    ticket_id, _ = await get_or_create_active_ticket(client_id)
+    async with clean_db.acquire() as conn:
+        await conn.execute(
+            "CREATE TABLE messages_test_old PARTITION OF messages FOR VALUES FROM (MINVALUE) TO ('2000-01-01')"
+        )
+        try:
+            await conn.execute(
+                "INSERT INTO messages (ticket_id, direction, author_user_id, text, created_at) "
+                "VALUES ($1, 'IN', $2, 'старое', 'epoch')",
+                ticket_id, client_id,
+            )
+            await add_message(ticket_id, "IN", client_id, "новое")
+
+            assert [m["text"] for m in await get_ticket_messages(ticket_id)] == ["старое", "новое"]
+            assert [m["text"] for m in await get_history_messages_full(client_id)] == ["старое", "новое"]
+        finally:
+            await conn.execute("DROP TABLE messages_test_old")
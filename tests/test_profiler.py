@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+import pytest
+
+from services.profiler import dump_tasks, profile_event_loop
+
+
+def _busy_loop_step(seconds: float) -> None:
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+@pytest.mark.asyncio
+async def test_profiler_sees_blocking_code_in_event_loop():
+    async def hog():
+        for _ in range(20):
+            _busy_loop_step(0.05)
+            await asyncio.sleep(0)
+
+    hog_task = asyncio.create_task(hog())
+    collapsed, samples = await profile_event_loop(1, interval=0.002)
+    await hog_task
+
+    assert samples > 0
+    hot = [line for line in collapsed.splitlines() if "_busy_loop_step" in line]
+    assert hot
+    stack, count = hot[0].rsplit(" ", 1)
+    assert "hog" in stack and int(count) > 0
+
+
+@pytest.mark.asyncio
+async def test_task_dump_lists_pending_tasks():
+    async def parked():
+        await asyncio.sleep(60)
+
+    task = asyncio.create_task(parked(), name="parked-worker")
+    await asyncio.sleep(0)
+    try:
+        dump = dump_tasks()
+    finally:
+        task.cancel()
+
+    assert "parked-worker" in dump
+    assert "parked" in dump and "[pending]" in dump
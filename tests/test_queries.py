@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.db import queries
+from services.db.onboarding import advance_onboarding, start_onboarding
+from services.db.queries import QUERIES, CatalogConnection
+from services.db.records import Ticket
+from services.db.statistik import get_leads_count, get_sla_violations
+from services.db.tickets import get_or_create_active_ticket, claim_ticket, get_ticket
+
+
+@pytest.mark.asyncio
+async def test_pool_connections_have_catalog_prepared(clean_db):
+    async with clean_db.acquire() as conn:
+        assert isinstance(conn._con, CatalogConnection)
+        for name in QUERIES:
+            assert conn.catalog_prepared(name), name
+
+    assert await queries.fetchval("user_role", 1) is None
+
+
+@pytest.mark.asyncio
+async def test_catalog_survives_pool_release(clean_db):
+    # Каждый вызов берёт соединение из пула и возвращает его: второй вызов идёт
+    # по уже «отпущенному» соединению и должен исполнить тот же statement
+    assert await queries.fetchval("user_role", 1) is None
+    assert await queries.fetchval("user_role", 1) is None
+
+    async with clean_db.acquire() as conn:
+        assert conn.catalog_prepared("user_role")
+        assert await queries.fetchval("user_role", 1, conn=conn) is None
+
+
+@pytest.mark.asyncio
+async def test_statistik_optional_support_filter(clean_db):
+    support_id = 9001
+    ticket_a, _ = await get_or_create_active_ticket(9101)
+    await get_or_create_active_ticket(9102)
+    await claim_ticket(ticket_a, support_id)
+
+    now = datetime.now(timezone.utc)
+    date_from, date_to = now - timedelta(hours=1), now + timedelta(hours=1)
+
+    assert await get_leads_count(date_from, date_to) == 2
+    assert await get_leads_count(date_from, date_to, support_id) == 1
+    assert await get_sla_violations(date_from, date_to, support_id) == 0
+
+
+@pytest.mark.asyncio
+async def test_typed_records_and_jsonb_codec(clean_db):
+    ticket_id, _ = await get_or_create_active_ticket(9201)
+    ticket = await get_ticket(ticket_id)
+    assert isinstance(ticket, Ticket)
+    assert ticket.client_user_id == ticket["client_user_id"] == 9201
+
+    await start_onboarding(9202)
+    step, answers = await advance_onboarding(9202, {"text": "ответ"})
+    assert step == 2
+    assert answers == {"1": {"text": "ответ"}}
+
+
+@pytest.mark.asyncio
+async def test_working_seconds_function(clean_db):
+    msk = timezone(timedelta(hours=3))
+    start = datetime(2026, 3, 2, 9, 0, tzinfo=msk)
+    end = datetime(2026, 3, 3, 11, 0, tzinfo=msk)
+
+    # Календарь по умолчанию: 10:00–22:00 Europe/Moscow
+    assert await clean_db.fetchval("SELECT working_seconds($1, $2)", start, end) == 13 * 3600
+    assert await clean_db.fetchval(
+        "SELECT working_seconds($1, $2)", start.replace(hour=22, minute=30), end.replace(hour=9)
+    ) == 0
+    assert await clean_db.fetchval("SELECT working_seconds($1, $2)", end, start) == 0
+    assert await clean_db.fetchval("SELECT working_seconds(NULL, $1)", end) is None
@@ -0,0 +1,26 @@
+import asyncio
+
+import pytest
+
+from utils.rate_limit import RateLimiter
+
+
+@pytest.mark.asyncio
+async def test_calls_are_spread_by_interval():
+    calls = 5
+    limiter = RateLimiter(rate=20, period=1.0)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    moments = []
+
+    async def call():
+        async with limiter:
+            moments.append(loop.time() - started)
+
+    await asyncio.gather(*(call() for _ in range(calls)))
+
+    moments.sort()
+    # Первый вызов сразу, каждый следующий — на interval позже предыдущего
+    assert moments[0] < limiter.interval / 2
+    assert all(b - a >= limiter.interval * 0.9 for a, b in zip(moments, moments[1:]))
+    assert (calls - 1) * limiter.interval * 0.95 <= moments[-1] < (calls - 1) * limiter.interval + 0.1
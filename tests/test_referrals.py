@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+
+from database import _ensure_referral_owner_unique, get_pool
+from services.db import referals
+from services.db.referals import (
+    create_referral_usage,
+    get_or_create_referral,
+    get_owner_referral_stats,
+    get_referral_by_code,
+    get_top_referral_stats,
+)
+from handlers.command.referals import REF_STATS_DEFAULT_TOP, REF_STATS_MAX_TOP, parse_ref_stats_args
+from services.db.users import get_or_create_user, mark_user_as_paid
+
+
+def test_ref_stats_args_are_explicit():
+    assert parse_ref_stats_args(None) == ("top", REF_STATS_DEFAULT_TOP)
+    assert parse_ref_stats_args("top") == ("top", REF_STATS_DEFAULT_TOP)
+    assert parse_ref_stats_args("top 20") == ("top", 20)
+    assert parse_ref_stats_args("top 500") == ("top", REF_STATS_MAX_TOP)
+    assert parse_ref_stats_args("id 123") == ("id", 123)
+    assert parse_ref_stats_args("@owner") == ("username", "owner")
+    # Голое число больше не угадывается: топ это или tg_id
+    assert parse_ref_stats_args("1234") is None
+    assert parse_ref_stats_args("id abc") is None
+    assert parse_ref_stats_args("@") is None
+
+
+@pytest.mark.asyncio
+async def test_referral_codes_are_unique_and_stable(clean_db):
+    owners = list(range(6001, 6041))
+    for tg_id in owners:
+        await get_or_create_user(tg_id)
+
+    first = await asyncio.gather(*(get_or_create_referral(tg_id) for tg_id in owners))
+    again = await asyncio.gather(*(get_or_create_referral(tg_id) for tg_id in owners))
+
+    codes = [r["code"] for r in first]
+    assert len(set(codes)) == len(owners)
+    assert all(len(c) == 8 for c in codes)
+    assert codes == [r["code"] for r in again]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_creation_yields_one_referral_per_owner(clean_db):
+    tg_id = 6101
+    await get_or_create_user(tg_id)
+
+    results = await asyncio.gather(*(get_or_create_referral(tg_id) for _ in range(10)))
+
+    assert len({r["code"] for r in results}) == 1
+    async with get_pool().acquire() as conn:
+        count = await conn.fetchval("SELECT COUNT(*) FROM referrals WHERE owner_client_id = $1", tg_id)
+    assert count == 1
+
+
+@pytest.mark.asyncio
+async def test_referral_lookup_is_served_from_cache(clean_db):
+    referals._referral_cache.clear()
+    tg_id = 6201
+    await get_or_create_user(tg_id, username="owner6201")
+    code = (await get_or_create_referral(tg_id))["code"]
+
+    referral = await get_referral_by_code(code)
+    assert referral["owner_username"] == "owner6201"
+
+    # Строка в БД больше не нужна — повторный lookup идёт из кэша
+    async with get_pool().acquire() as conn:
+        await conn.execute("DELETE FROM referrals WHERE code = $1", code)
+    assert await get_referral_by_code(code) == referral
+    assert await get_referral_by_code("missing0") is None
+
+
+@pytest.mark.asyncio
+async def test_referral_miss_is_cached_until_created(clean_db, monkeypatch):
+    referals._referral_cache.clear()
+    assert await get_referral_by_code("missing1") is None
+
+    async def no_db(*args, **kwargs):
+        raise AssertionError("промах должен отдаваться из кэша")
+
+    monkeypatch.setattr(referals.queries, "fetchrow", no_db)
+    assert await get_referral_by_code("missing1") is None
+    monkeypatch.undo()
+
+    # Созданная в этом процессе ссылка снимает промах со своего кода
+    tg_id = 6211
+    await get_or_create_user(tg_id)
+    code = (await get_or_create_referral(tg_id))["code"]
+    referals._referral_cache.set(code, 0.0)
+    await get_or_create_referral(tg_id)
+    assert code not in referals._referral_cache
+    assert (await get_referral_by_code(code))["owner_client_id"] == tg_id
+
+
+@pytest.mark.asyncio
+async def test_owner_unique_migration_keeps_used_links(clean_db):
+    owner = 6221
+    await get_or_create_user(owner)
+    async with get_pool().acquire() as conn:
+        await conn.execute("DROP INDEX referrals_owner_uniq")
+        ids = [
+            await conn.fetchval(
+                "INSERT INTO referrals (code, owner_client_id, created_by) VALUES ($1, $2, $2) "
+                "RETURNING referral_id",
+                code, owner,
+            )
+            for code in ("dupe0001", "dupe0002", "dupe0003")
+        ]
+        await conn.execute("INSERT INTO referral_usage (referral_id) VALUES ($1)", ids[1])
+
+        with pytest.raises(RuntimeError):
+            await _ensure_referral_owner_unique(conn)
+        # Миграция откатилась целиком: ни одна ссылка не удалена
+        assert await conn.fetchval("SELECT COUNT(*) FROM referrals WHERE owner_client_id = $1", owner) == 3
+
+        await conn.execute("DELETE FROM referrals WHERE referral_id = $1", ids[1])
+        await _ensure_referral_owner_unique(conn)
+        assert await conn.fetchval(
+            "SELECT array_agg(code) FROM referrals WHERE owner_client_id = $1", owner
+        ) == ["dupe0001"]
+        assert await conn.fetchval("SELECT to_regclass('referrals_owner_uniq') IS NOT NULL")
+
+
+@pytest.mark.asyncio
+async def test_referral_stats_are_maintained_incrementally(clean_db):
+    owner = 6301
+    await get_or_create_user(owner, username="owner6301")
+    code = (await get_or_create_referral(owner))["code"]
+    referral_id = (await get_referral_by_code(code))["referral_id"]
+
+    for visitor in (6311, 6312):
+        await get_or_create_user(visitor)
+    await create_referral_usage(referral_id, 6311)
+    await create_referral_usage(referral_id, 6311, converted=True)
+    await create_referral_usage(referral_id, 6311, converted=True)
+    await create_referral_usage(referral_id, 6312)
+
+    await mark_user_as_paid(6311)
+    await mark_user_as_paid(6311)
+
+    [stats] = await get_owner_referral_stats(owner)
+    assert stats["visits"] == 4
+    assert stats["unique_visitors"] == 2
+    assert stats["conversions"] == 1
+    assert stats["paid_conversions"] == 1
+    assert stats["owner_username"] == "owner6301"
+
+    top = await get_top_referral_stats(5)
+    assert [r["referral_id"] for r in top] == [referral_id]
@@ -0,0 +1,55 @@
+import pytest
+
+from services.db import search
+from services.db.search import create_search, get_search, search_messages
+from services.db.tickets import add_message, get_or_create_active_ticket
+
+
+@pytest.mark.asyncio
+async def test_search_ranks_and_paginates(clean_db):
+    ticket_id, _ = await get_or_create_active_ticket(9401)
+    await add_message(ticket_id, "IN", 9401, "Когда придут выплаты за монетизацию?")
+    await add_message(ticket_id, "IN", 9401, "Выплаты и ещё раз выплаты")
+    await add_message(ticket_id, "OUT", 9400, "Добрый день")
+
+    # Морфология: «выплата» находит «выплаты»
+    hits = await search_messages("выплата")
+    assert [h["ticket_id"] for h in hits] == [ticket_id, ticket_id]
+    assert hits[0]["rank"] >= hits[1]["rank"]
+    assert hits[0]["client_user_id"] == 9401
+
+    first = await search_messages("выплата", limit=1)
+    rest = await search_messages("выплата", limit=1, after=(first[0]["rank"], first[0]["message_id"]))
+    assert [r["message_id"] for r in first + rest] == [h["message_id"] for h in hits]
+
+    # Ранг зависит от запроса — сравниваем только сами сообщения
+    excluded = await search_messages("выплата -монетизацию")
+    assert [h["message_id"] for h in excluded] == [
+        h["message_id"] for h in hits if "монетизацию" not in h["snippet"]
+    ]
+
+
+@pytest.mark.asyncio
+async def test_search_ranks_only_newest_candidates(clean_db, monkeypatch):
+    ticket_id, _ = await get_or_create_active_ticket(9411)
+    await add_message(ticket_id, "IN", 9411, "выплаты выплаты выплаты")
+    await add_message(ticket_id, "IN", 9411, "где выплата")
+
+    monkeypatch.setattr(search, "SEARCH_CANDIDATES", 1)
+    assert [h["snippet"] for h in await search_messages("выплата")] == ["где выплата"]
+
+
+@pytest.mark.asyncio
+async def test_saved_search_pages_ignore_new_messages(clean_db):
+    ticket_id, _ = await get_or_create_active_ticket(9421)
+    await add_message(ticket_id, "IN", 9421, "выплата первая")
+
+    saved = await create_search("выплата")
+    assert await get_search(saved["search_id"]) == {
+        "query": "выплата", "max_message_id": saved["max_message_id"],
+    }
+
+    await add_message(ticket_id, "IN", 9421, "выплата вторая")
+    hits = await search_messages(saved["query"], max_message_id=saved["max_message_id"])
+    assert [h["snippet"] for h in hits] == ["выплата первая"]
+    assert await get_search(saved["search_id"] + 1) is None
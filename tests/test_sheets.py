@@ -0,0 +1,104 @@
+import pytest
+
+from services.sheets import SheetsSink, client_row, lead_row
+
+
+class FakeWorksheet:
+    def __init__(self, backend, name):
+        self.backend = backend
+        self.name = name
+
+    def append_rows(self, rows, value_input_option=None):
+        if self.backend.fail_next:
+            self.backend.fail_next = False
+            raise RuntimeError("quota exceeded")
+        self.backend.append_calls.append((self.name, rows, value_input_option))
+
+
+class FakeSpreadsheet:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def worksheet(self, name):
+        self.backend.worksheet_opens += 1
+        return FakeWorksheet(self.backend, name)
+
+
+class FakeGspread:
+    """Подмена gspread: считает авторизации, открытия листов и вызовы append_rows."""
+
+    def __init__(self):
+        self.authorizations = 0
+        self.worksheet_opens = 0
+        self.append_calls = []
+        self.fail_next = False
+
+    def authorize(self):
+        self.authorizations += 1
+        return self
+
+    def open_by_key(self, key):
+        return FakeSpreadsheet(self)
+
+
+@pytest.fixture
+def backend():
+    return FakeGspread()
+
+
+@pytest.fixture
+def sink(backend):
+    s = SheetsSink("spreadsheet", client_factory=backend.authorize)
+    yield s
+    s.close()
+
+
+@pytest.mark.asyncio
+async def test_rows_are_appended_in_one_call_per_flush(sink, backend):
+    rows = [[1, 100, "a"], [2, 200, "b"], [3, 300, "c"]]
+
+    await sink.append_rows("Лиды", rows)
+
+    assert backend.append_calls == [("Лиды", rows, "USER_ENTERED")]
+
+
+@pytest.mark.asyncio
+async def test_client_and_worksheet_are_cached(sink, backend):
+    for i in range(5):
+        await sink.append_rows("Лиды", [[i]])
+    await sink.append_rows("Клиенты", [[99]])
+
+    assert backend.authorizations == 1
+    assert backend.worksheet_opens == 2
+    assert len(backend.append_calls) == 6
+
+
+@pytest.mark.asyncio
+async def test_error_resets_cache_and_reauthorizes(sink, backend):
+    await sink.append_rows("Лиды", [[1]])
+    backend.fail_next = True
+
+    with pytest.raises(RuntimeError):
+        await sink.append_rows("Лиды", [[2]])
+    await sink.append_rows("Лиды", [[3]])
+
+    assert backend.authorizations == 2
+    assert [rows for _, rows, _ in backend.append_calls] == [[[1]], [[3]]]
+
+
+def test_lead_row_layout():
+    payload = {
+        "lead_id": 7,
+        "tg_id": 42,
+        "username": None,
+        "created_at": "2026-02-01T10:30:00Z",
+        "answers": {"1": {"text": "канал"}, "4": {"text": "", "media_type": "photo"}},
+    }
+
+    row = lead_row(payload)
+
+    assert row[:5] == [7, 42, "", "2026-02-01 10:30:00", "NEW_LEAD"]
+    assert row[5] == "канал"
+    assert row[8] == "(медиа)"
+    assert len(row) == 14
+    assert client_row(payload)[4] == "Client"
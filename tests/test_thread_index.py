@@ -0,0 +1,68 @@
+import pytest
+from aiogram.types import Message
+
+from handlers.support import _ticket_thread
+from services.db.tickets import get_or_create_active_ticket, set_ticket_topic, update_ticket_status
+from services import thread_index as thread_index_module
+from services.thread_index import ThreadIndex, thread_index
+from utils.lru_cache import LRUCache
+
+
+@pytest.mark.asyncio
+async def test_ticket_thread_filter_uses_index(monkeypatch):
+    monkeypatch.setattr(thread_index, "tickets", {501: 42})
+    monkeypatch.setattr(thread_index, "misses", LRUCache(maxsize=16))
+    lookups = []
+
+    async def get_ticket_by_thread_id(thread_id):
+        lookups.append(thread_id)
+        return None
+
+    monkeypatch.setattr(thread_index_module, "get_ticket_by_thread_id", get_ticket_by_thread_id)
+
+    def message(thread_id):
+        return Message.model_validate({
+            "message_id": 1,
+            "date": 0,
+            "chat": {"id": -100, "type": "supergroup"},
+            "message_thread_id": thread_id,
+            "text": "Добрый день",
+        })
+
+    assert await _ticket_thread(message(501)) == {"ticket_id": 42}
+    # Обычная переписка в группе — без запросов к БД, чужая тема — один запрос на MISS_TTL
+    assert await _ticket_thread(message(None)) is False
+    assert await _ticket_thread(message(502)) is False
+    assert await _ticket_thread(message(502)) is False
+    assert lookups == [502]
+
+    thread_index.discard(501)
+    assert await _ticket_thread(message(501)) is False
+
+
+@pytest.mark.asyncio
+async def test_resolve_picks_up_topic_opened_elsewhere(clean_db):
+    ticket_id, _ = await get_or_create_active_ticket(9741)
+    index = ThreadIndex()
+    assert await index.resolve(7101) is None
+
+    # Тему открыла другая реплика: промах ещё в кэше, после MISS_TTL — найдена в БД
+    await set_ticket_topic(ticket_id, 7101, None)
+    assert await index.resolve(7101) is None
+    index.misses.set(7101, 0.0)
+    assert await index.resolve(7101) == ticket_id
+    assert index.get(7101) == ticket_id
+
+
+@pytest.mark.asyncio
+async def test_warm_skips_closed_tickets(clean_db):
+    open_id, _ = await get_or_create_active_ticket(9731)
+    closed_id, _ = await get_or_create_active_ticket(9732)
+    await set_ticket_topic(open_id, 7001, None)
+    await set_ticket_topic(closed_id, 7002, None)
+    await update_ticket_status(closed_id, "CLOSED")
+
+    index = ThreadIndex()
+    assert await index.warm() == 1
+    assert index.get(7001) == open_id
+    assert index.get(7002) is None
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from database import get_pool
+from services.db.tickets import (
+    claim_ticket,
+    decode_ticket_cursor,
+    encode_ticket_cursor,
+    get_or_create_active_ticket,
+    get_tickets_by_status,
+    take_ticket,
+    transfer_tickets,
+    update_ticket_status,
+)
+from services.db.users import get_or_create_user
+
+
+@pytest.mark.asyncio
+async def test_take_ticket_concurrent_takers(clean_db):
+    tg_id = 9701
+    supports = list(range(9800, 9850))
+
+    await get_or_create_user(tg_id)
+    ticket_id, _ = await get_or_create_active_ticket(tg_id)
+
+    # 50 операторов одновременно жмут «Взять»
+    results = await asyncio.gather(*(take_ticket(ticket_id, s) for s in supports))
+
+    assert results.count(True) == 1
+    winner = supports[results.index(True)]
+    async with get_pool().acquire() as conn:
+        row = await conn.fetchrow(
+            "SELECT assigned_to_support_id, status, taken_at FROM tickets WHERE ticket_id = $1",
+            ticket_id,
+        )
+    assert row["assigned_to_support_id"] == winner
+    assert row["status"] == "WAITING"
+    assert row["taken_at"] is not None
+
+
+@pytest.mark.asyncio
+async def test_claim_ticket_returns_updated_row(clean_db):
+    tg_id = 9702
+    support = 9901
+
+    await get_or_create_user(tg_id)
+    ticket_id, _ = await get_or_create_active_ticket(tg_id)
+
+    ticket = await claim_ticket(ticket_id, support)
+    assert ticket["ticket_id"] == ticket_id
+    assert ticket["assigned_to_support_id"] == support
+    assert ticket["status"] == "WAITING"
+
+    assert await claim_ticket(ticket_id, support + 1) is None
+
+
+@pytest.mark.asyncio
+async def test_ticket_created_at_is_not_null(clean_db):
+    # Ключ страниц (created_at, ticket_id): строка с NULL выпала бы из всех страниц
+    async with clean_db.acquire() as conn:
+        assert await conn.fetchval("""
+            SELECT is_nullable FROM information_schema.columns
+            WHERE table_name = 'tickets' AND column_name = 'created_at'
+        """) == "NO"
+
+
+@pytest.mark.asyncio
+async def test_tickets_by_status_keyset_pages(clean_db):
+    ticket_ids = []
+    for tg_id in range(9711, 9716):
+        ticket_id, _ = await get_or_create_active_ticket(tg_id)
+        await update_ticket_status(ticket_id, "OPEN")
+        ticket_ids.append(ticket_id)
+
+    first, has_prev, has_next = await get_tickets_by_status("OPEN", limit=2)
+    assert [t["ticket_id"] for t in first] == ticket_ids[:2]
+    assert (has_prev, has_next) == (False, True)
+
+    cursor = decode_ticket_cursor(encode_ticket_cursor(first[-1]))
+    assert cursor == (first[-1]["created_at"], first[-1]["ticket_id"])
+    second, has_prev, has_next = await get_tickets_by_status("OPEN", limit=2, after=cursor)
+    assert [t["ticket_id"] for t in second] == ticket_ids[2:4]
+    assert (has_prev, has_next) == (True, True)
+
+    after = (second[-1]["created_at"], second[-1]["ticket_id"])
+    last, _, has_next = await get_tickets_by_status("OPEN", limit=2, after=after)
+    assert [t["ticket_id"] for t in last] == ticket_ids[4:]
+    assert not has_next
+
+    # Назад от второй страницы — снова первая
+    before = (second[0]["created_at"], second[0]["ticket_id"])
+    back, has_prev, has_next = await get_tickets_by_status("OPEN", limit=2, before=before)
+    assert back == first
+    assert (has_prev, has_next) == (False, True)
+
+
+@pytest.mark.asyncio
+async def test_transfer_tickets_single_update_with_filters(clean_db):
+    old_support, new_support = 9910, 9911
+    ticket_ids = []
+    for tg_id in range(9721, 9724):
+        ticket_id, _ = await get_or_create_active_ticket(tg_id)
+        await claim_ticket(ticket_id, old_support)
+        ticket_ids.append(ticket_id)
+    await update_ticket_status(ticket_ids[2], "CLOSED")
+
+    moved = await transfer_tickets(old_support, new_support, ticket_ids=[ticket_ids[0]])
+    assert [t["ticket_id"] for t in moved] == [ticket_ids[0]]
+    assert moved[0]["assigned_to_support_id"] == new_support
+
+    # Закрытые не передаются
+    moved = await transfer_tickets(old_support, new_support, statuses=["WAITING"])
+    assert [t["ticket_id"] for t in moved] == [ticket_ids[1]]
+    assert await transfer_tickets(old_support, new_support) == []
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+
+from config import config
+from database import warm_pools
+from services import warmup
+from services.db import queries, users
+from services.db.users import cache_role, clear_role_cache, get_user_role
+
+
+@pytest.mark.asyncio
+async def test_cached_role_skips_database(monkeypatch):
+    lookups = []
+
+    async def fetchrow(name, tg_id, **kwargs):
+        lookups.append(tg_id)
+        return {"role": "client"}
+
+    monkeypatch.setattr(users.queries, "fetchrow", fetchrow)
+    clear_role_cache()
+    cache_role(9601, "support")
+    assert await get_user_role(9601) == "support"
+
+    cache_role(9602, None)
+    assert await get_user_role(9602, admin_ids=[9602]) == "admin"
+    assert lookups == []
+
+    # Истёкшая запись — снова запрос к БД
+    monkeypatch.setattr(config, "role_cache_ttl_seconds", -1)
+    cache_role(9603, "admin")
+    assert await get_user_role(9603) == "client"
+    assert lookups == [9603]
+    clear_role_cache()
+
+
+@pytest.mark.asyncio
+async def test_warm_up_runs_all_steps(monkeypatch):
+    calls = []
+
+    def step(name, result):
+        async def run(*args, **kwargs):
+            calls.append(name)
+            return result
+        return run
+
+    monkeypatch.setattr(warmup, "warm_pools", step("pools", 3))
+    monkeypatch.setattr(warmup, "warm_role_cache", step("roles", 2))
+    monkeypatch.setattr(warmup, "warm_keyboard_registry", step("keyboards", 5))
+    monkeypatch.setattr(warmup.load_index, "refresh", step("supports", None))
+    monkeypatch.setattr(warmup.thread_index, "warm", step("threads", 1))
+    bot = SimpleNamespace(get_me=step("bot_api", SimpleNamespace(username="test_bot")))
+
+    timings = await warmup.warm_up(bot)
+
+    # Пулы прогреваются первыми, остальное — после них
+    assert calls[0] == "pools"
+    assert sorted(calls) == sorted(["pools", "roles", "keyboards", "supports", "threads", "bot_api"])
+    assert set(timings) == {"pools", "bot_api", "roles", "supports", "threads", "keyboards", "total"}
+
+
+@pytest.mark.asyncio
+async def test_catalog_works_after_warm_pools(clean_db):
+    # Прогрев возвращает соединения в пул — запросы каталога на них должны исполняться
+    assert await warm_pools() == clean_db.get_min_size()
+    assert await queries.fetchval("user_role", 1) is None
+    assert await queries.fetchval("user_role", 1) is None
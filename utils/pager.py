@@ -0,0 +1,18 @@
+import logging
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup
+
+logger = logging.getLogger(__name__)
+
+
+async def show_page(cb: CallbackQuery, text: str, reply_markup: InlineKeyboardMarkup | None) -> None:
+    """
+    Показать страницу списка в том же сообщении, что и кнопки листания.
+    Повторное нажатие на ту же страницу («message is not modified») — не ошибка.
+    """
+    try:
+        await cb.message.edit_text(text, reply_markup=reply_markup)
+    except TelegramBadRequest as e:
+        logger.debug("Страница не обновлена: %s", e)
+    await cb.answer()
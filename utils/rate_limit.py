@@ -0,0 +1,25 @@
+import asyncio
+
+
+class RateLimiter:
+    """
+    Не больше rate вызовов за period секунд: каждый вызов wait() занимает следующий
+    свободный слот и ждёт его. Сами вызовы после ожидания идут параллельно.
+    """
+
+    def __init__(self, rate: float, period: float = 1.0):
+        self.interval = period / rate
+        self._next_slot = 0.0
+
+    async def wait(self) -> None:
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def __aenter__(self) -> None:
+        await self.wait()
+
+    async def __aexit__(self, *exc) -> None:
+        return None